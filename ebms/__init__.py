@@ -0,0 +1,4 @@
+"""Python tooling for the EBMS database: data generation, loading and analysis.
+
+Run the modules from the repository root, e.g. ``python -m ebms.generator``.
+"""
@@ -0,0 +1,286 @@
+"""Incremental build of the generated dataset: only the tables whose inputs changed are regenerated.
+
+``generator.ipynb`` (and ``ebms.generator``) write every table on every run,
+and the notebook's review cells overwrite the very CSVs they read their texts
+from.  Here each table group is a node of ``NODES`` with declared inputs:
+
+* the generator parameters it depends on (every node depends on the seed,
+  the scale factor, which fixes all row counts, and the shard size)
+* the vocabulary pools it samples from, read from the seed CSVs
+  (``product`` only uses the product names and descriptions, the people tables
+  the name, surname and domain pools, ...)
+* the nodes whose output it reads: the reviews are drawn from the delivered
+  order lines, which the ``orders`` node keeps as ``review candidates``
+
+A node's key is the SHA-256 of its inputs and of the generator code.  A node
+whose key and outputs are those of the previous run is skipped; the others are
+generated shard by shard like ``Generator.write_csv`` does (the output is the
+same) and swapped into place.  Since the reviews are keyed on the content of
+the candidates, not on whether ``orders`` ran, a rebuild that reproduces the
+same orders stops there.  Outputs never go to the seed directory.
+
+    python -m ebms.build --scale-factor 100 --out generated/sf-100
+    python -m ebms.build --scale-factor 100 --out generated/sf-100 --vocabulary my-seed-data --dry-run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from . import population
+from .generator import ADMINS, Generator, Vocabulary, _init_worker, _merge, _ranges, _run_task, _write_part
+from .tables import DATA_DIR, TABLES
+
+COMMON_PARAMS = ("seed", "scale_factor", "chunk_rows")
+PEOPLE = ("first_names", "last_names", "handles", "domains")
+CODE = [Path(__file__).with_name(name) for name in ("generator.py", "derived.py", "csvio.py", "population.py")]
+
+
+@dataclass(frozen=True)
+class Node:
+    """A group of tables generated together."""
+
+    name: str
+    tables: tuple
+    shard: str = None  # ``Generator`` method producing the shards; None for the review tables
+    params: tuple = ()
+    vocabulary: tuple = ()
+    reads: tuple = ()  # outputs of other nodes that are read, relative to the output directory
+
+
+CANDIDATE_COLUMNS = ("customer", "key", "date")
+
+
+def candidate_files(table):
+    """The ``orders`` node's review candidates for ``table``, relative to the output directory."""
+    return tuple(f".build/review-candidates/{table}.{column}.npy" for column in CANDIDATE_COLUMNS)
+
+
+NODES = [
+    Node("admin", ("admin",), "admin_shard"),
+    Node("phone_number", ("phone_number",), "phone_number_shard"),
+    Node("address", ("address",), "address_shard", vocabulary=("streets", "cities", "states", "countries")),
+    Node("supplier", ("supplier",), "supplier_shard", vocabulary=PEOPLE),
+    Node("customer", ("customer", "wallet"), "customer_shard", vocabulary=PEOPLE),
+    Node("delivery_agent", ("delivery_agent",), "delivery_agent_shard", vocabulary=PEOPLE),
+    Node("product", ("product",), "product_shard", vocabulary=("product_names", "descriptions")),
+    Node("orders", ("orders", "order_product"), "order_shard", params=("start", "end", "zipf", "delivered")),
+    Node("cart", ("cart",), "cart_shard", params=("zipf",)),
+    Node("product_review", ("product_review",), vocabulary=("reviews",), reads=candidate_files("product_review")),
+    Node("da_review", ("da_review",), vocabulary=("reviews",), reads=candidate_files("da_review")),
+]
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            h.update(block)
+    return h.hexdigest()
+
+
+def pool_digest(values):
+    return hashlib.sha256("\n".join(map(str, values.tolist())).encode()).hexdigest()
+
+
+def code_digest():
+    h = hashlib.sha256()
+    for path in CODE:
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+class Build:
+    """Build state of one output directory, kept in ``<out>/.build/state.json``.
+
+    The state holds each node's key and the SHA-256, size and mtime of each of
+    its outputs.  An output whose size and mtime are unchanged is taken to be
+    unchanged, anything else is hashed again.
+    """
+
+    def __init__(self, out_dir, vocabulary_dir=DATA_DIR, sql=None, batch_size=1000, **params):
+        self.out_dir = Path(out_dir)
+        if self.out_dir.resolve() == Path(vocabulary_dir).resolve():
+            raise ValueError(f"{out_dir} holds the seed CSVs the build reads; write the build elsewhere")
+        self.state_dir = self.out_dir / ".build"
+        self.state_path = self.state_dir / "state.json"
+        self.state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+        self.sql, self.batch_size = sql, batch_size
+        self.generator = Generator(vocabulary=Vocabulary(vocabulary_dir), **params)
+        self.code = code_digest()
+
+    def outputs(self, node):
+        paths = [self.out_dir / f"{table}.csv" for table in node.tables]
+        if self.sql:
+            paths += [self.out_dir / "Data-Population" / f"{table}.sql" for table in node.tables]
+        if node.name == "orders":
+            paths += [self.out_dir / path for table in ("product_review", "da_review") for path in candidate_files(table)]
+        return paths
+
+    def producer(self, path):
+        """The node writing ``path`` (relative to the output directory)."""
+        return next(node for node in NODES if self.out_dir / path in self.outputs(node))
+
+    def key(self, node):
+        params = self.generator.params
+        inputs = {
+            "node": node.name, "code": self.code, "sql": [self.sql, self.batch_size],
+            "params": {p: params[p] for p in COMMON_PARAMS + node.params},
+            "vocabulary": {pool: pool_digest(getattr(self.generator.vocab, pool)) for pool in node.vocabulary},
+            "reads": {path: self.state.get(self.producer(path).name, {}).get("outputs", {}).get(path, {}).get("sha256")
+                      for path in node.reads},
+        }
+        if node.name == "admin":
+            inputs["rows"] = ADMINS
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _stamp(self, path, digest=None):
+        stat = path.stat()
+        return {"sha256": digest or file_digest(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def up_to_date(self, node, key):
+        entry = self.state.get(node.name)
+        if not entry or entry["key"] != key:
+            return False
+        for path in self.outputs(node):
+            rel = str(path.relative_to(self.out_dir))
+            if not path.exists() or rel not in entry["outputs"]:
+                return False
+            recorded = entry["outputs"][rel]
+            stat = path.stat()
+            if (stat.st_size, stat.st_mtime_ns) != (recorded["size"], recorded["mtime_ns"]):
+                if file_digest(path) != recorded["sha256"]:
+                    return False
+                entry["outputs"][rel] = self._stamp(path, recorded["sha256"])
+        return True
+
+    def plan(self):
+        """``[(node, key, up to date)]`` in build order; keys of nodes after a stale one are not final yet."""
+        return [(node, key, self.up_to_date(node, key)) for node in NODES for key in [self.key(node)]]
+
+    def run_node(self, node, workers=1):
+        """Generate one node's tables into ``.build/parts`` and move them into place."""
+        g = self.generator
+        parts_dir = self.state_dir / "parts"
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        options = (str(parts_dir), self.sql, self.batch_size)
+        parts = {table: [] for table in node.tables}
+        if node.shard:
+            rows = {fn.__name__: rows for fn, rows in g.shard_groups()}[node.shard]
+            tasks = [(node.shard, shard, start, stop) + options
+                     for shard, (start, stop) in enumerate(_ranges(rows, g.chunk_rows))]
+            if workers > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(g.params, g)) as pool:
+                    results = list(pool.map(_run_task, tasks))
+            else:
+                _init_worker(g.params, g)
+                results = [_run_task(task) for task in tasks]
+            candidates = {"product_review": [], "da_review": []}
+            for shard_parts, shard_candidates in results:
+                for table, part in shard_parts.items():
+                    parts[table].append(part)
+                for table, columns in (shard_candidates or {}).items():
+                    candidates[table].append(columns)
+            if node.name == "orders":
+                for table, shards in candidates.items():
+                    for column, values in zip(CANDIDATE_COLUMNS, zip(*shards)):
+                        path = self.out_dir / f".build/review-candidates/{table}.{column}.npy"
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        np.save(path, np.concatenate(values))
+        else:
+            (table,) = node.tables
+            candidates = [tuple(np.load(self.out_dir / path) for path in node.reads)]
+            parts[table] = [_write_part(parts_dir / f"{table}-000000", table, g.review_table(table, candidates),
+                                        self.sql, self.batch_size)]
+
+        written = {}
+        for table, table_parts in parts.items():
+            stems = [stem for stem, _ in table_parts]
+            written[table] = sum(rows for _, rows in table_parts)
+            targets = [(".csv", self.out_dir / f"{table}.csv", ",".join(TABLES[table]) + "\r\n")]
+            if self.sql:
+                targets.append((".sql", self.out_dir / "Data-Population" / f"{table}.sql", "USE EBMS;\n\n"))
+            for suffix, path, header in targets:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = parts_dir / f"{table}{suffix}"
+                _merge(stems, tmp, suffix, header)
+                os.replace(tmp, path)
+        return written
+
+    def run(self, workers=1, force=False, log=print):
+        """Bring every node up to date; returns the names of the nodes that were built."""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        built = []
+        for node in NODES:
+            key = self.key(node)  # only now, after the nodes it reads from have been brought up to date
+            if not force and self.up_to_date(node, key):
+                log(f"{node.name:<16} up to date")
+                continue
+            t0 = time.perf_counter()
+            written = self.run_node(node, workers)
+            self.state[node.name] = {"key": key, "outputs": {
+                str(path.relative_to(self.out_dir)): self._stamp(path) for path in self.outputs(node)}}
+            self._save()
+            built.append(node.name)
+            log(f"{node.name:<16} built in {time.perf_counter() - t0:.2f} s "
+                f"({', '.join(f'{t} {n} rows' for t, n in written.items())})")
+        if self.sql and (built or not (self.out_dir / "data-population.sql").exists()):
+            population.combine(self.out_dir / "Data-Population", self.out_dir / "data-population.sql")
+        shutil.rmtree(self.state_dir / "parts", ignore_errors=True)
+        self._save()
+        return built
+
+    def _save(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.state, indent=1, sort_keys=True))
+        os.replace(tmp, self.state_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale-factor", type=float, default=1.0, help="1 = 200 customers and 1,000 orders")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="output directory (default: generated/sf-<scale>)")
+    parser.add_argument("--vocabulary", default=str(DATA_DIR), help="directory with the seed CSVs")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="rows per shard")
+    parser.add_argument("--workers", type=int, default=1, help="generator processes per node")
+    parser.add_argument("--sql", choices=("rows", "multirow"), default=None,
+                        help="also write Data-Population/*.sql and data-population.sql")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT for --sql multirow")
+    parser.add_argument("--start", default="2020-01-01", help="first order date")
+    parser.add_argument("--end", default="2022-12-31", help="last order date")
+    parser.add_argument("--zipf", type=float, default=0.8, help="product popularity exponent")
+    parser.add_argument("--delivered", type=float, default=0.5, help="share of delivered orders")
+    parser.add_argument("--force", action="store_true", help="rebuild every node")
+    parser.add_argument("--dry-run", action="store_true", help="only list the nodes that are out of date")
+    args = parser.parse_args(argv)
+
+    build = Build(args.out or f"generated/sf-{args.scale_factor:g}", args.vocabulary, args.sql, args.batch_size,
+                  scale_factor=args.scale_factor, seed=args.seed, chunk_rows=args.chunk_rows, start=args.start,
+                  end=args.end, zipf=args.zipf, delivered=args.delivered)
+    if args.dry_run:
+        stale = set()
+        for node, _, fresh in build.plan():
+            # a node reading a stale node's output only rebuilds if that output changes
+            state = "out of date" if not fresh else \
+                "reads a rebuilt output" if stale & {build.producer(p).name for p in node.reads} else "up to date"
+            if not fresh:
+                stale.add(node.name)
+            print(f"{node.name:<16} {state}")
+        return
+    t0 = time.perf_counter()
+    built = build.run(args.workers, args.force)
+    print(f"{len(built)} of {len(NODES)} nodes built in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
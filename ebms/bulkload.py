@@ -0,0 +1,191 @@
+"""Parallel bulk load of the table CSVs in foreign-key order, with the indexes built last.
+
+``generator.ipynb`` loads the 13 tables one after another in
+``order_of_execution``, into tables whose indexes already exist.  Here the
+order comes from the schema instead: ``levels`` groups the tables by the
+depth of their ``FOREIGN KEY`` references, so that every table comes after
+the tables it references::
+
+    0  address, phone_number, admin, delivery_agent
+    1  supplier, customer
+    2  product, orders, wallet, da_review
+    3  product_review, cart, order_product
+
+(``delivery_agent`` references no table, since its ``phoneID`` is not a
+foreign key, so it is in the first level.)
+
+SQLite has a single writer per database, so the tables are staged
+concurrently instead.  Worker processes parse the CSVs and bulk-insert each
+one with ``executemany`` into a database file of its own, the largest tables
+of the lowest levels first.  The main process then copies each staged table
+into the target with one ``INSERT ... SELECT``, as soon as the tables it
+references are in.  The secondary indexes of ``database-schema.sql`` are
+created once everything is loaded, and ``PRAGMA foreign_key_check`` confirms
+that the result is consistent.
+
+The sequential baseline is the stand-in's usual path: indexes first, then
+``load_csv_dir`` in ``LOAD_ORDER``.  The report gives per-table times for
+both.
+
+    python -m ebms.bulkload --scale-factor 10 --workers 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+from . import standin
+from .generator import Generator
+from .schema import load_schema
+from .tables import LOAD_ORDER, SCHEMA_PATH
+
+
+def dependencies(schema_path=SCHEMA_PATH):
+    """``{table: set of the tables it references}``, in schema order."""
+    tables, _ = load_schema(schema_path)
+    return {name: {ref for _, ref, _ in t.foreign_keys if ref != name} for name, t in tables.items()}
+
+
+def levels(depends):
+    """Lists of tables, each referencing only tables of the lists before it."""
+    placed, result = set(), []
+    remaining = dict(depends)
+    while remaining:
+        level = [t for t, refs in remaining.items() if refs <= placed]
+        if not level:
+            raise ValueError(f"foreign key cycle among {', '.join(sorted(remaining))}")
+        result.append(level)
+        placed.update(level)
+        for t in level:
+            del remaining[t]
+    return result
+
+
+def _stage(csv_path, table, part_path):
+    """Worker: bulk-insert one CSV into a database of its own; returns ``(table, rows, seconds)``."""
+    t0 = time.perf_counter()
+    conn = standin.connect(str(part_path), indexes=False)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    standin.load_csv_file(conn, csv_path, table)
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return table, rows, time.perf_counter() - t0
+
+
+def load_sequential(data_dir, db_path):
+    """The baseline: indexes created up front, then the tables in ``LOAD_ORDER``; ``{table: seconds}``."""
+    conn = standin.connect(str(db_path))
+    times = {}
+    for table in LOAD_ORDER:
+        path = Path(data_dir) / f"{table}.csv"
+        if path.exists():
+            t0 = time.perf_counter()
+            standin.load_csv_file(conn, path, table)
+            times[table] = time.perf_counter() - t0
+    conn.close()
+    return times
+
+
+def load_parallel(data_dir, db_path, work_dir, workers=None):
+    """Stage the tables concurrently, copy them in in foreign-key order, then build the indexes.
+
+    Returns ``{"tables": {table: {level, rows, stage_s, merge_s}}, "index_s": ..., "violations": ...}``.
+    """
+    depends = {t: refs for t, refs in dependencies().items() if (Path(data_dir) / f"{t}.csv").exists()}
+    depends = {t: refs & set(depends) for t, refs in depends.items()}
+    level_of = {t: i for i, level in enumerate(levels(depends)) for t in level}
+    conn = standin.connect(str(db_path), indexes=False)
+    conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA synchronous = OFF")
+    _, index_statements = standin.schema_statements()
+    report = {t: {"level": level_of[t]} for t in depends}
+
+    def merge(table):
+        t0 = time.perf_counter()
+        conn.execute("ATTACH DATABASE ? AS part", [str(Path(work_dir) / f"{table}.db")])
+        with conn:
+            conn.execute(f"INSERT INTO main.{table} SELECT * FROM part.{table}")
+        conn.execute("DETACH DATABASE part")
+        report[table]["merge_s"] = time.perf_counter() - t0
+
+    # lowest level first, then the biggest files, so the long stagings start early
+    queue = sorted(depends, key=lambda t: (level_of[t], -(Path(data_dir) / f"{t}.csv").stat().st_size))
+    staged, merged = set(), set()
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        pending = {pool.submit(_stage, Path(data_dir) / f"{t}.csv", t, Path(work_dir) / f"{t}.db") for t in queue}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for job in done:
+                table, rows, seconds = job.result()
+                report[table].update(rows=rows, stage_s=seconds)
+                staged.add(table)
+            ready = True
+            while ready:
+                ready = [t for t in queue if t in staged and t not in merged and depends[t] <= merged]
+                for table in ready:
+                    merge(table)
+                    merged.add(table)
+
+    t0 = time.perf_counter()
+    standin.create_indexes(conn, index_statements)
+    conn.commit()
+    index_s = time.perf_counter() - t0
+    violations = len(conn.execute("PRAGMA foreign_key_check").fetchall())
+    conn.close()
+    return {"tables": report, "index_s": index_s, "violations": violations}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="keep the loaded database at this path")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the sequential load")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        baseline, sequential_s = {}, None
+        if not args.no_baseline:
+            t0 = time.perf_counter()
+            baseline = load_sequential(data_dir, Path(work_dir) / "sequential.db")
+            sequential_s = time.perf_counter() - t0
+        db_path = Path(args.out) if args.out else Path(work_dir) / "bulk.db"
+        db_path.unlink(missing_ok=True)
+        staging = Path(work_dir) / "staging"
+        staging.mkdir()
+        t0 = time.perf_counter()
+        result = load_parallel(data_dir, db_path, staging, args.workers)
+        parallel_s = time.perf_counter() - t0
+
+    tables = result["tables"]
+    print(f"{'table':<16}{'level':>6}{'rows':>10}{'sequential s':>14}{'staged s':>10}{'copied s':>10}")
+    for table in sorted(tables, key=lambda t: (tables[t]["level"], LOAD_ORDER.index(t))):
+        r = tables[table]
+        before = f"{baseline[table]:>14.2f}" if table in baseline else f"{'-':>14}"
+        print(f"{table:<16}{r['level']:>6}{r['rows']:>10}{before}{r['stage_s']:>10.2f}{r['merge_s']:>10.2f}")
+    print(f"secondary indexes built after the load in {result['index_s']:.2f} s; "
+          f"{result['violations']} foreign key violations")
+    if sequential_s is not None:
+        print(f"sequential {sequential_s:.2f} s, parallel {parallel_s:.2f} s ({sequential_s / parallel_s:.2f}x)")
+    else:
+        print(f"parallel {parallel_s:.2f} s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"sequential_s": sequential_s, "parallel_s": parallel_s, "baseline": baseline, **result},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
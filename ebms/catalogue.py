@@ -0,0 +1,238 @@
+"""Read-through cache for the catalogue pages of Embedded Query-01.
+
+Every catalogue page re-runs ``LEFT JOIN product_review ... AVG(pr.rating)
+GROUP BY p.productID`` over all products.  ``CatalogueCache`` instead keeps,
+per product, its name, price, stock and the running sum and count of its
+review ratings, loaded with one pass at start-up and then kept current by the
+writes that change them:
+
+* ``review_added``: a new ``product_review`` row;
+* ``restocked``: Simple Query-16's ``UPDATE product SET quantity = quantity + n``;
+* ``orders_placed``: the stock taken by new orders (``ebms.checkout``);
+* ``product_changed``: a product added, renamed or repriced.
+
+Pages, keyed by search term and page number, hold the rows in Query-01's
+order and shape ``(productID, name, price, avg_rating, quantity)``.  A miss
+reads only the page's product IDs from the database (``name LIKE`` and
+``ORDER BY name``, without the join) and fills the rows from the per-product
+state.  Pages are evicted least recently used beyond ``max_pages`` and expire
+after ``ttl`` seconds; a write drops just the pages showing that product (for
+``product_changed``, the pages of every search its name matches).
+
+``stats`` reports hits, misses, the hit ratio, evictions and invalidations,
+and how old the pages served from the cache were.  ``stale_rows`` compares
+cached pages with the database, to catch writes the cache was not told about.
+
+    python -m ebms.catalogue --data generated/sf-10 --requests 20000 --write-ratio 0.05
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import OrderedDict, deque, namedtuple
+
+import numpy as np
+
+from . import standin
+
+Product = namedtuple("Product", "name price quantity rating_sum rating_count")
+
+CATALOGUE = ("SELECT p.productID, p.name, p.price, p.quantity, COALESCE(SUM(pr.rating), 0), COUNT(pr.rating) "
+             "FROM product p LEFT JOIN product_review pr ON p.productID = pr.productID")
+
+
+def _same(cached, fresh):
+    if fresh is None or cached[:3] + cached[4:] != fresh[:3] + fresh[4:]:
+        return False
+    return cached[3] == fresh[3] or None not in (cached[3], fresh[3]) and abs(cached[3] - fresh[3]) < 1e-9
+
+
+class CatalogueCache:
+    def __init__(self, conn, page_size=50, max_pages=1024, ttl=60.0, clock=time.monotonic):
+        self.conn = conn
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.ttl = ttl
+        self.clock = clock
+        self.products = {}
+        self.pages = OrderedDict()  # (search, page) -> (built at, rows)
+        self._pages_of = {}  # productID -> keys of the cached pages showing it
+        self.hits = self.misses = self.evicted = self.expired = self.invalidated = 0
+        self.ages = deque(maxlen=10_000)  # age in seconds of the latest pages served from the cache
+        for product, *values in conn.execute(CATALOGUE + " GROUP BY p.productID"):
+            self.products[product] = Product(*values)
+
+    def _row(self, product):
+        p = self.products[product]
+        return product, p.name, p.price, p.rating_sum / p.rating_count if p.rating_count else None, p.quantity
+
+    def page(self, search=None, number=0):
+        """One page of the catalogue (of the products whose name contains ``search``)."""
+        key = (search.lower() if search else None, number)
+        now = self.clock()
+        cached = self.pages.get(key)
+        if cached is not None and now - cached[0] > self.ttl:
+            self._drop(key)
+            self.expired += 1
+            cached = None
+        if cached is not None:
+            self.pages.move_to_end(key)
+            self.hits += 1
+            self.ages.append(now - cached[0])
+            return cached[1]
+        self.misses += 1
+        where, args = ("WHERE name LIKE ? ", [f"%{search}%"]) if search else ("", [])
+        ids = [p for p, in self.conn.execute(
+            f"SELECT productID FROM product {where}ORDER BY name, productID LIMIT ? OFFSET ?",
+            args + [self.page_size, number * self.page_size])]
+        rows = [self._row(p) for p in ids if p in self.products]
+        self.pages[key] = (now, rows)
+        for product in ids:
+            self._pages_of.setdefault(product, set()).add(key)
+        while len(self.pages) > self.max_pages:
+            self._drop(next(iter(self.pages)))
+            self.evicted += 1
+        return rows
+
+    def _drop(self, key):
+        _, rows = self.pages.pop(key)
+        for row in rows:
+            keys = self._pages_of.get(row[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._pages_of[row[0]]
+
+    def invalidate(self, product):
+        """Drop the cached pages showing ``product``."""
+        for key in list(self._pages_of.get(product, ())):
+            self._drop(key)
+            self.invalidated += 1
+
+    def review_added(self, product, rating):
+        p = self.products[product]
+        self.products[product] = p._replace(rating_sum=p.rating_sum + rating, rating_count=p.rating_count + 1)
+        self.invalidate(product)
+
+    def restocked(self, product, amount):
+        p = self.products[product]
+        self.products[product] = p._replace(quantity=p.quantity + amount)
+        self.invalidate(product)
+
+    def orders_placed(self, order_ids):
+        """Take the stock of the lines of the new ``order_ids`` (read back from ``order_product``)."""
+        for product, quantity in self.conn.execute(
+                "SELECT productID, SUM(quantity) FROM order_product WHERE orderID IN "
+                "(SELECT value FROM json_each(?)) GROUP BY productID", [json.dumps(list(order_ids))]):
+            self.restocked(product, -quantity)
+
+    def product_changed(self, product):
+        """Re-read a new or edited product; pages of every search matching its old or new name go."""
+        old = self.products.get(product)
+        row = self.conn.execute(CATALOGUE + " WHERE p.productID = ? GROUP BY p.productID", [product]).fetchone()
+        if row is None:
+            self.products.pop(product, None)
+        else:
+            self.products[product] = Product(*row[1:])
+        names = [p.name.lower() for p in (old, self.products.get(product)) if p is not None]
+        for key in [k for k in self.pages if k[0] is None or any(k[0] in name for name in names)]:
+            self._drop(key)
+            self.invalidated += 1
+
+    def stale_rows(self):
+        """Cached rows that differ from what Embedded Query-01 returns now."""
+        stale = 0
+        for _, rows in self.pages.values():
+            ids = json.dumps([r[0] for r in rows])
+            fresh = {r[0]: r for r in self.conn.execute(
+                "SELECT p.productID, p.name, p.price, AVG(pr.rating), p.quantity FROM product p "
+                "LEFT JOIN product_review pr ON p.productID = pr.productID "
+                "WHERE p.productID IN (SELECT value FROM json_each(?)) GROUP BY p.productID", [ids])}
+            stale += sum(not _same(r, fresh.get(r[0])) for r in rows)
+        return stale
+
+    def stats(self):
+        requests = self.hits + self.misses
+        ages = np.array(self.ages) if self.ages else np.zeros(1)
+        return {
+            "requests": requests, "hits": self.hits, "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "pages": len(self.pages), "evicted": self.evicted, "expired": self.expired,
+            "invalidated": self.invalidated,
+            "age_p50_s": float(np.percentile(ages, 50)), "age_max_s": float(ages.max()),
+        }
+
+
+def _requests(conn, n, write_ratio, pages, seed):
+    """A request mix: catalogue and search pages (popular ones more often), reviews and restocks."""
+    rng = random.Random(seed)
+    words = sorted({w for name, in conn.execute("SELECT name FROM product") for w in name.split() if len(w) > 2})
+    products = [p for p, in conn.execute("SELECT productID FROM product")]
+    customers = [c for c, in conn.execute("SELECT customerID FROM customer")]
+    reviewed = set(conn.execute("SELECT customerID, productID FROM product_review"))  # the primary key
+    searches = [None] + rng.sample(words, min(len(words), 200))
+    weights = [1 / (i + 1) for i in range(len(searches))]
+    for _ in range(n):
+        if rng.random() < write_ratio:
+            product = rng.choice(products)
+            # a customer who has not reviewed the product yet; a restock if a few draws find none
+            reviewer = next((c for c in (rng.choice(customers) for _ in range(10)) if (c, product) not in reviewed),
+                            None) if rng.random() < 0.5 else None
+            if reviewer is not None:
+                reviewed.add((reviewer, product))
+                yield "review", (reviewer, product, rng.randint(1, 5))
+            else:
+                yield "restock", (product, 100)
+        else:
+            yield "page", (rng.choices(searches, weights)[0], min(int(rng.expovariate(1.0)), pages - 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", required=True, help="directory with <table>.csv files")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--max-pages", type=int, default=1024)
+    parser.add_argument("--ttl", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    conn = standin.connect()
+    standin.load_csv_dir(conn, args.data)
+    t0 = time.perf_counter()
+    cache = CatalogueCache(conn, args.page_size, args.max_pages, args.ttl)
+    print(f"{len(cache.products)} products loaded in {time.perf_counter() - t0:.2f} s")
+    query = ("SELECT p.productID, p.name, p.price, AVG(pr.rating) AS avg_rating, p.quantity FROM product p "
+             "LEFT JOIN product_review pr ON p.productID = pr.productID {where}GROUP BY p.productID "
+             "ORDER BY p.name ASC LIMIT ? OFFSET ?")
+    cached, direct = [], []
+    for kind, request in _requests(conn, args.requests, args.write_ratio, 5, args.seed):
+        if kind == "review":
+            conn.execute("INSERT INTO product_review VALUES (?, ?, ?, NULL, '2024-01-01')", request)
+            cache.review_added(*request[1:])
+        elif kind == "restock":
+            conn.execute("UPDATE product SET quantity = quantity + ? WHERE productID = ?", request[::-1])
+            cache.restocked(*request)
+        else:
+            search, number = request
+            t1 = time.perf_counter()
+            cache.page(search, number)
+            t2 = time.perf_counter()
+            if len(direct) < 500:
+                where, params = ("WHERE p.name LIKE ? ", [f"%{search}%"]) if search else ("", [])
+                conn.execute(query.format(where=where), params + [args.page_size, number * args.page_size]).fetchall()
+                direct.append(time.perf_counter() - t2)
+            cached.append(t2 - t1)
+    stats = cache.stats()
+    print(f"hit ratio {stats['hit_ratio']:.3f} ({stats['hits']} hits, {stats['misses']} misses), "
+          f"{stats['invalidated']} invalidated, {stats['evicted']} evicted, {stats['expired']} expired; "
+          f"stale rows {cache.stale_rows()}")
+    for label, times in (("Query-01 page", direct), ("cached page", cached)):
+        ms = 1000 * np.array(times)
+        print(f"{label:<14}{len(ms):>7} runs  p50 {np.percentile(ms, 50):.3f} ms  p99 {np.percentile(ms, 99):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""Append-only change log of row inserts, updates and deletes, in rotated segments.
+
+Writers (``ebms.checkout`` and the generator's ``--changelog``) append one
+record per changed row of ``orders``, ``order_product``, ``product_review``,
+``da_review``, ``cart`` and ``wallet``; updates carry the old row as well.
+Records get consecutive offsets and are stored as JSON lines in segment files
+named after their first offset, Kafka style::
+
+    00000000000000000000.log
+    00000000000000131072.log
+    consumers/dashboard.json
+
+A new segment starts once the current one reaches ``segment_bytes``, and
+``retain`` deletes segments that every consumer has moved past.
+
+A ``Consumer`` reads from its committed offset onwards, so counters and
+aggregates can follow the log instead of re-reading tables: ``poll`` returns
+the next records and ``commit`` stores the offset together with any state
+derived from the records, in one atomic file write.  Appends from several
+processes are serialized with a lock file, taken per batch of ``batch_rows``
+records, so logging a whole table neither holds it in memory nor keeps other
+writers waiting for all of it (their records may land between two batches).
+Rows keep the types the stand-in returns, whichever writer logged them: the
+generator's CSV values are converted with the schema's column types.
+``ebms.checkout`` appends while it still holds the database's write lock, just
+before committing, so records are in commit order; a commit that fails after
+that leaves records of changes that never happened, and consumers that must be
+exact re-seed from the tables.
+
+    python -m ebms.changelog --log generated/sf-10/changelog --count admin-overview
+"""
+
+import argparse
+import bisect
+import fcntl
+import json
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+
+from .schema import load_schema
+from .standin import csv_rows
+
+Change = namedtuple("Change", "offset table op row old")
+
+LOGGED = ("orders", "order_product", "product_review", "da_review", "cart", "wallet")
+OPS = ("insert", "update", "delete")
+
+_NAME = "{:020d}.log"
+_TAIL = 1 << 16  # bytes read back to find the last record
+
+
+def _numeric(v):
+    # SQLite's NUMERIC affinity: a DECIMAL such as 100.00 comes back as the integer 100
+    f = float(v)
+    return int(f) if f.is_integer() else f
+
+
+def _converters(table):
+    """Per column of ``table``, CSV text to the value the stand-in returns for it."""
+    kinds = {"int": int, "bool": int, "fixed": _numeric}
+    return [kinds.get(c.kind, str) for c in load_schema()[0][table].columns]
+
+
+def signed(change):
+    """``(table, row, +1 / -1)`` pairs for a change: an update is its old row out, then the new one in."""
+    if change.op == "update":
+        return [(change.table, change.old, -1), (change.table, change.row, 1)]
+    return [(change.table, change.row, 1 if change.op == "insert" else -1)]
+
+
+class ChangeLog:
+    def __init__(self, directory, segment_bytes=64 << 20, fsync=False):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        (self.directory / "consumers").mkdir(parents=True, exist_ok=True)
+        self._lock = open(self.directory / ".lock", "a")
+        self._tail = None
+        with self._locked():
+            self._refresh()
+
+    def segment_path(self, base):
+        return self.directory / _NAME.format(base)
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+
+    def _refresh(self, cached=True):
+        """Pick up the segments and offsets other writers appended; a torn last record is cut off.
+
+        Unless the last segment has changed size or a segment was started after
+        it since this writer's last append, the cached offsets are kept.
+        """
+        if cached and self._tail is not None:
+            base, size = self._tail
+            path = self.segment_path(base)
+            if (path.exists() and path.stat().st_size == size
+                    and (base == self.next_offset or not self.segment_path(self.next_offset).exists())):
+                return
+        self.bases = sorted(int(p.stem) for p in self.directory.glob("*.log"))
+        if not self.bases:
+            self.bases = [0]
+            self.segment_path(0).touch()
+        path = self.segment_path(self.bases[-1])
+        with open(path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - _TAIL, 0))
+            tail = f.read()
+            end = tail.rfind(b"\n") + 1
+            if end < len(tail):
+                f.truncate(size - len(tail) + end)
+        self._tail = (self.bases[-1], size - len(tail) + end)
+        if end == 0:
+            self.next_offset = self.bases[-1]
+        else:
+            self.next_offset = json.loads(tail[tail.rfind(b"\n", 0, end - 1) + 1:end])["offset"] + 1
+
+    def append(self, changes, batch_rows=10_000):
+        """Append ``(table, op, row[, old])`` changes; returns the offset after the last one.
+
+        Each batch of ``batch_rows`` changes is written under one lock.
+        """
+        changes = iter(changes)
+        while batch := list(islice(changes, batch_rows)):
+            with self._locked():
+                self._refresh()
+                self._write(batch)
+        return self.next_offset
+
+    def _write(self, changes):
+        f = open(self.segment_path(self.bases[-1]), "ab")
+        size = f.tell()
+        try:
+            for table, op, row, *old in changes:
+                if op not in OPS:
+                    raise ValueError(f"unknown change {op!r}")
+                record = {"offset": self.next_offset, "table": table, "op": op, "row": list(row)}
+                if old and old[0] is not None:
+                    record["old"] = list(old[0])
+                line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+                if size and size + len(line) > self.segment_bytes:
+                    self._sync(f)
+                    f.close()
+                    self.bases.append(self.next_offset)
+                    f = open(self.segment_path(self.next_offset), "ab")
+                    size = 0
+                f.write(line)
+                size += len(line)
+                self.next_offset += 1
+            self._sync(f)
+        finally:
+            f.close()
+            self._tail = (self.bases[-1], size)  # lets the next append skip re-reading the tail
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def append_csv(self, table, path):
+        """Log every row of a table CSV as an insert, typed as the stand-in returns it."""
+        converters = _converters(table)
+        return self.append((table, "insert", [v if v is None else convert(v) for convert, v in zip(converters, row)])
+                           for row in csv_rows(path))
+
+    def consumer(self, name):
+        return Consumer(self, name)
+
+    def consumers(self):
+        """``{name: committed offset}``."""
+        return {p.stem: json.loads(p.read_text())["offset"] for p in (self.directory / "consumers").glob("*.json")}
+
+    def retain(self):
+        """Delete the segments every consumer has read past; returns how many went."""
+        keep_from = min(self.consumers().values(), default=0)
+        removed = 0
+        with self._locked():
+            self._refresh(cached=False)
+            while len(self.bases) > 1 and self.bases[1] <= keep_from:
+                self.segment_path(self.bases.pop(0)).unlink()
+                removed += 1
+        return removed
+
+    def close(self):
+        self._lock.close()
+
+
+class Consumer:
+    """Reads the log from its committed offset; ``commit`` saves the position (and state)."""
+
+    def __init__(self, log, name):
+        self.log = log
+        self.path = log.directory / "consumers" / f"{name}.json"
+        saved = json.loads(self.path.read_text()) if self.path.exists() else {}
+        self.offset = saved.get("offset", 0)
+        self.state = saved.get("state")
+        self._file = None
+        self._base = None
+
+    def _open(self):
+        """Open the segment holding ``self.offset`` and skip to it."""
+        bases = sorted(int(p.stem) for p in self.log.directory.glob("*.log"))
+        if not bases or self.offset < bases[0]:
+            raise ValueError(f"offset {self.offset} is no longer in the log")
+        self._base = bases[bisect.bisect_right(bases, self.offset) - 1]
+        self._file = open(self.log.segment_path(self._base), "rb")
+        while True:
+            position = self._file.tell()
+            line = self._file.readline()
+            if not line.endswith(b"\n") or json.loads(line)["offset"] >= self.offset:
+                self._file.seek(position)
+                return
+
+    def _next_segment(self):
+        """Move on to the following segment, if the writer has started one."""
+        following = sorted(b for b in (int(p.stem) for p in self.log.directory.glob("*.log")) if b > self._base)
+        if not following:
+            return False
+        self._file.close()
+        self._base = following[0]
+        self._file = open(self.log.segment_path(self._base), "rb")
+        return True
+
+    def poll(self, max_records=10_000):
+        """The next (up to) ``max_records`` changes; an empty list when caught up."""
+        if self._file is None:
+            self._open()
+        changes = []
+        while len(changes) < max_records:
+            position = self._file.tell()
+            line = self._file.readline()
+            if not line.endswith(b"\n"):
+                self._file.seek(position)  # the end, or a record still being written
+                if self._next_segment():
+                    continue
+                break
+            r = json.loads(line)
+            changes.append(Change(r["offset"], r["table"], r["op"], r["row"], r.get("old")))
+            self.offset = r["offset"] + 1
+        return changes
+
+    def commit(self, state=None):
+        """Store the offset read up to, with ``state`` derived from the records before it."""
+        self.state = state
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"offset": self.offset, "state": state}))
+        os.replace(tmp, self.path)
+
+    def lag(self):
+        return self.log.next_offset - self.offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def count_rows(consumer, counts=None):
+    """Keep ``{table: rows}`` up to date from the log, as Embedded Query-03's ``COUNT(*)``s."""
+    counts = dict(counts or consumer.state or {})
+    while True:
+        changes = consumer.poll()
+        if not changes:
+            return counts
+        for change in changes:
+            if change.op != "update":
+                counts[change.table] = counts.get(change.table, 0) + (1 if change.op == "insert" else -1)
+        consumer.commit(counts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--log", required=True, help="change log directory")
+    parser.add_argument("--count", metavar="CONSUMER", help="bring this consumer's row counts up to date")
+    parser.add_argument("--retain", action="store_true", help="delete segments every consumer has read")
+    args = parser.parse_args(argv)
+
+    log = ChangeLog(args.log)
+    if args.count:
+        consumer = log.consumer(args.count)
+        counts = count_rows(consumer)
+        consumer.close()
+        for table, rows in sorted(counts.items()):
+            print(f"{table:<16}{rows:>12}")
+    if args.retain:
+        print(f"{log.retain()} segments deleted")
+    print(f"{len(log.bases)} segments, next offset {log.next_offset}")
+    for name, offset in sorted(log.consumers().items()):
+        print(f"consumer {name}: offset {offset}, lag {log.next_offset - offset}")
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
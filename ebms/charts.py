@@ -0,0 +1,179 @@
+"""Chart rendering: batched traces, a content-addressed image cache, parallel rendering.
+
+A chart is a plain JSON-able spec, ``{"data": [...], "layout": {...},
+"width": ..., "height": ..., "scale": ...}``, so it can be hashed, stored and
+shipped to worker processes; plotly (and kaleido, for images) is only imported
+where a chart is actually drawn.  ``line_traces`` and ``point_traces`` turn
+many small pieces into a few traces: line segments with the same style become
+one ``None``-separated trace, and points with the same marker shape, text
+placement and legend entry become one trace with per-point colours, text and
+hover text.
+
+``render`` keys every image by the SHA-256 of its spec, output format and
+plotly/kaleido versions, and copies it from ``cache_dir`` when it has been
+drawn before.  ``render_all`` serves cache hits directly and draws the rest on
+a process pool, so each worker starts kaleido once for all of its charts.
+
+    python -m ebms.charts --out exported-assets --workers 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from pathlib import Path
+
+CACHE_DIR = Path(".chart-cache")
+
+
+def line_traces(segments):
+    """One scatter trace per line style for ``(xs, ys, line, opacity)`` segments."""
+    traces = {}
+    for xs, ys, line, opacity in segments:
+        key = json.dumps([line, opacity], sort_keys=True)
+        trace = traces.setdefault(key, {"type": "scatter", "mode": "lines", "x": [], "y": [], "line": line,
+                                        "opacity": opacity, "hoverinfo": "skip", "showlegend": False})
+        if trace["x"]:
+            trace["x"].append(None)
+            trace["y"].append(None)
+        trace["x"].extend(float(x) for x in xs)
+        trace["y"].extend(float(y) for y in ys)
+    return list(traces.values())
+
+
+def point_traces(points):
+    """Batched scatter traces for point dicts.
+
+    A point has ``x``, ``y`` and optionally ``text``, ``hover``, ``color``,
+    ``marker`` (without its colour; no marker draws text only),
+    ``textposition``, ``textfont`` (without its colour) and ``name`` (a legend
+    entry).  Points agreeing on everything but position, colour, text and
+    hover share a trace.
+    """
+    traces = {}
+    for p in points:
+        marker, font = p.get("marker"), dict(p.get("textfont", {}))
+        style = [marker, p.get("textposition", "middle center"), font, p.get("name")]
+        trace = traces.get(json.dumps(style, sort_keys=True))
+        if trace is None:
+            mode = "markers+text" if marker and "text" in p else "markers" if marker else "text"
+            trace = traces[json.dumps(style, sort_keys=True)] = {
+                "type": "scatter", "mode": mode, "x": [], "y": [], "text": [], "hovertext": [],
+                "textposition": style[1], "textfont": dict(font, color=[]),
+                "hovertemplate": "%{hovertext}<extra></extra>",
+                "name": p.get("name"), "showlegend": p.get("name") is not None,
+            }
+            if marker:
+                trace["marker"] = dict(marker, color=[])
+        trace["x"].append(float(p["x"]))
+        trace["y"].append(float(p["y"]))
+        trace["text"].append(p.get("text", ""))
+        trace["hovertext"].append(p.get("hover", ""))
+        trace["textfont"]["color"].append(p.get("textcolor", p.get("color")))
+        if marker:
+            trace["marker"]["color"].append(p.get("color"))
+    for trace in traces.values():
+        if not any(trace["hovertext"]):
+            del trace["hovertext"], trace["hovertemplate"]
+            trace["hoverinfo"] = "skip"
+    return list(traces.values())
+
+
+def chart(data, layout, width, height, scale=2):
+    return {"data": data, "layout": layout, "width": width, "height": height, "scale": scale}
+
+
+def _versions():
+    found = []
+    for package in ("plotly", "kaleido"):
+        try:
+            found.append(metadata.version(package))
+        except metadata.PackageNotFoundError:
+            found.append(None)
+    return found
+
+
+def digest(spec, fmt="png"):
+    """The cache key of a chart: its spec, the image format and the renderer versions."""
+    payload = json.dumps([spec, fmt, _versions()], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _draw(spec, path, fmt):
+    import plotly.graph_objects as go
+
+    fig = go.Figure(data=spec["data"], layout=spec["layout"])
+    fig.write_image(str(path), format=fmt, width=spec["width"], height=spec["height"], scale=spec["scale"])
+
+
+def cached_path(spec, path, cache_dir=CACHE_DIR):
+    """Where the image of ``spec`` for ``path`` (format from its suffix) is kept in the cache."""
+    fmt = Path(path).suffix.lstrip(".") or "png"
+    return Path(cache_dir) / f"{digest(spec, fmt)}.{fmt}"
+
+
+def render(spec, path, cache_dir=CACHE_DIR):
+    """Write the chart to ``path``; returns True if it came from the cache."""
+    path = Path(path)
+    cached = cached_path(spec, path, cache_dir)
+    fmt = cached.suffix.lstrip(".")
+    hit = cached.exists()
+    if not hit:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_name(f"{cached.stem}.{os.getpid()}.tmp.{fmt}")
+        _draw(spec, tmp, fmt)
+        os.replace(tmp, cached)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(cached, path)
+    return hit
+
+
+def _render_job(job):
+    spec, path, cache_dir = job
+    t0 = time.perf_counter()
+    hit = render(spec, path, cache_dir)
+    return path, hit, time.perf_counter() - t0
+
+
+def render_all(charts, cache_dir=CACHE_DIR, workers=None):
+    """Render ``{path: spec}``; returns ``[(path, from cache, seconds)]``."""
+    jobs = [(spec, str(path), str(cache_dir)) for path, spec in charts.items()]
+    cached = [cached_path(spec, path, cache_dir).exists() for spec, path, _ in jobs]
+    hits = [job for job, hit in zip(jobs, cached) if hit]
+    misses = [job for job, hit in zip(jobs, cached) if not hit]
+    results = [_render_job(job) for job in hits]
+    if len(misses) > 1 and workers != 1:
+        with ProcessPoolExecutor(min(workers or os.cpu_count(), len(misses))) as pool:
+            results += pool.map(_render_job, misses)
+    else:
+        results += [_render_job(job) for job in misses]
+    return results
+
+
+def main(argv=None):
+    from . import reportcharts
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("specs", nargs="*", help="chart spec JSON files (rendered next to them as .png)")
+    parser.add_argument("--out", default="exported-assets", help="directory for the report charts")
+    parser.add_argument("--cache", default=str(CACHE_DIR))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--only", help="comma-separated report chart file names")
+    args = parser.parse_args(argv)
+
+    charts = {Path(args.out) / name: build() for name, build in reportcharts.CHARTS.items()
+              if not args.only or name in args.only.split(",")}
+    for spec_path in map(Path, args.specs):
+        charts[spec_path.with_suffix(".png")] = json.loads(spec_path.read_text())
+    t0 = time.perf_counter()
+    for path, hit, seconds in render_all(charts, args.cache, args.workers):
+        print(f"{'cached' if hit else 'rendered':<9}{seconds:>7.2f} s  {path}")
+    print(f"{len(charts)} charts in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Batched order placement: check out many carts in one transaction.
+
+Simple Query-01 places one order with a statement per step: it picks an agent,
+inserts the order, finds it again through ``MAX(orderID)``, copies the cart,
+decrements stock, empties the cart and updates the wallet through a join over
+every order the customer has placed (charging all of them again), before the
+``da_unavailable`` trigger fires for the new row.  ``checkout`` does the same
+work for a whole batch of customers with a fixed number of set-based statements:
+
+* one read of the batch's carts with product stock and wallet balance;
+* order IDs assigned up front from ``MAX(orderID)``, one available agent each;
+* one ``INSERT ... SELECT`` each for ``orders`` and ``order_product``, one
+  ``UPDATE`` each for stock, wallets and agents, one ``DELETE`` for the carts.
+
+Carts that cannot be placed stay as they are and are returned with a reason.
+The transaction starts with ``BEGIN IMMEDIATE`` so the reads and the writes
+see the same data (``SELECT ... FOR UPDATE`` on MySQL); the time spent waiting
+for that lock is returned too.  ``deliver`` completes orders and frees their
+agents as the ``da_available`` trigger does.  Given an ``ebms.dispatch``
+``Dispatcher``, both pick and free agents through it instead of the
+lowest-ID query and the ``NOT EXISTS`` scan over ``orders``.  Given an
+``ebms.changelog`` ``ChangeLog``, both record the rows they changed in it.  With
+``ledger=True`` ``checkout`` also appends each order's debit to the
+``ebms.ledger`` wallet ledger.
+
+    python -m ebms.checkout --db ebms.db --customers 1,2,3
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from collections import Counter, namedtuple
+from datetime import date
+from decimal import Decimal
+
+Checkout = namedtuple("Checkout", "orders rejected lock_wait")
+
+CENT = Decimal("0.01")
+
+
+def begin(conn, timeout=30.0, pause=0.0005):
+    """Take the write lock; returns the seconds spent waiting for it.
+
+    SQLite's own busy handler backs off to sleeps of up to 100 ms, which lets
+    busy writers starve a waiting one, so the retries are done here instead.
+    """
+    if conn.in_transaction:
+        raise ValueError("checkout needs a connection outside any transaction")
+    t0 = time.perf_counter()
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return time.perf_counter() - t0
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) or time.perf_counter() - t0 > timeout:
+                raise
+            time.sleep(pause)
+
+
+def _carts(conn, customers):
+    """``{customerID: [(productID, quantity, price, stock), ...]}`` and ``{customerID: balance}``."""
+    carts, balances = {}, {}
+    for customer, product, quantity, price, stock, balance in conn.execute(
+            "SELECT c.customerID, c.productID, c.quantity, p.price, p.quantity, w.balance "
+            "FROM cart c JOIN product p ON p.productID = c.productID "
+            "LEFT JOIN wallet w ON w.customerID = c.customerID "
+            "WHERE c.customerID IN (SELECT value FROM json_each(?)) ORDER BY c.customerID, c.productID",
+            [json.dumps(list(customers))]):
+        carts.setdefault(customer, []).append((product, quantity, Decimal(str(price)), stock))
+        balances[customer] = Decimal(str(balance or 0))
+    return carts, balances
+
+
+def _accept(customers, carts, balances, pick):
+    """``(accepted, rejected)``: ``[(customerID, daID, total)]`` and ``{customerID: reason}``.
+
+    ``pick(customerID, n)`` returns the agent of the ``n``-th accepted cart, or None.
+    """
+    stock = {}
+    accepted, rejected = [], {}
+    for customer in dict.fromkeys(customers):
+        lines = carts.get(customer)
+        if not lines:
+            rejected[customer] = "empty cart"
+            continue
+        for product, _, _, on_hand in lines:
+            stock.setdefault(product, on_hand)
+        total = sum(price * quantity for _, quantity, price, _ in lines).quantize(CENT)
+        if any(stock[product] < quantity for product, quantity, _, _ in lines):
+            rejected[customer] = "out of stock"
+        elif balances[customer] < total:
+            rejected[customer] = "insufficient balance"
+        else:
+            agent = pick(customer, len(accepted))
+            if agent is None:
+                rejected[customer] = "no delivery agent"
+                continue
+            for product, quantity, _, _ in lines:
+                stock[product] -= quantity
+            accepted.append((customer, agent, total))
+    return accepted, rejected
+
+
+def _rows(conn, table, where, args=()):
+    return conn.execute(f"SELECT * FROM {table} WHERE {where} ORDER BY 1, 2", args).fetchall()
+
+
+def checkout(conn, customers, order_date=None, dispatcher=None, log=None, ledger=False):
+    """Place the carts of ``customers`` as one order each, in one transaction."""
+    order_date = (order_date or date.today()).isoformat()
+    lock_wait = begin(conn)
+    assigned = []  # order IDs the dispatcher has handed an agent, to release if this fails
+    try:
+        carts, balances = _carts(conn, customers)
+        first_id = conn.execute("SELECT COALESCE(MAX(orderID), 0) + 1 FROM orders").fetchone()[0]
+        if dispatcher is None:
+            agents = iter([a for a, in conn.execute(
+                "SELECT daID FROM delivery_agent WHERE availability = 1 ORDER BY daID LIMIT ?", [len(carts)])])
+            pick = lambda customer, n: next(agents, None)
+        else:
+            cities = dict(conn.execute(
+                "SELECT c.customerID, a.city FROM customer c JOIN address a ON a.addressID = c.addressID "
+                "WHERE c.customerID IN (SELECT value FROM json_each(?))", [json.dumps(list(carts))]))
+
+            def pick(customer, n):
+                agent = dispatcher.assign(first_id + n, cities.get(customer))
+                if agent is not None:
+                    assigned.append(first_id + n)
+                return agent
+        accepted, rejected = _accept(customers, carts, balances, pick)
+        batch = [(customer, first_id + i, agent, str(total)) for i, (customer, agent, total) in enumerate(accepted)]
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS checkout_batch "
+                     "(customerID INTEGER PRIMARY KEY, orderID INT, daID INT, total NUMERIC)")
+        conn.execute("DELETE FROM checkout_batch")
+        conn.executemany("INSERT INTO checkout_batch VALUES (?, ?, ?, ?)", batch)
+        conn.execute("INSERT INTO orders (orderID, customerID, daID, order_date) "
+                     "SELECT orderID, customerID, daID, ? FROM checkout_batch", [order_date])
+        conn.execute("INSERT INTO order_product (orderID, productID, quantity) "
+                     "SELECT b.orderID, c.productID, c.quantity FROM checkout_batch b "
+                     "JOIN cart c ON c.customerID = b.customerID")
+        conn.execute("UPDATE product SET quantity = quantity - t.n FROM "
+                     "(SELECT c.productID, SUM(c.quantity) AS n FROM checkout_batch b "
+                     "JOIN cart c ON c.customerID = b.customerID GROUP BY c.productID) t "
+                     "WHERE product.productID = t.productID")
+        in_batch = "customerID IN (SELECT customerID FROM checkout_batch)"
+        if log is not None:
+            wallets, carts = _rows(conn, "wallet", in_batch), _rows(conn, "cart", in_batch)
+        conn.execute("UPDATE wallet SET balance = ROUND(balance - b.total, 2) FROM checkout_batch b "
+                     "WHERE wallet.customerID = b.customerID")
+        if ledger:
+            from .ledger import post_checkout
+            post_checkout(conn, order_date)
+        conn.execute("UPDATE delivery_agent SET availability = 0 WHERE daID IN (SELECT daID FROM checkout_batch)")
+        conn.execute(f"DELETE FROM cart WHERE {in_batch}")
+        if log is not None:
+            changes = [(table, "insert", row) for table in ("orders", "order_product")
+                       for row in _rows(conn, table, "orderID >= ?", [first_id])]
+            changes += [("wallet", "update", new, old) for old, new in zip(wallets, _rows(conn, "wallet", in_batch))]
+            changes += [("cart", "delete", row) for row in carts]
+            log.append(changes)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        for order_id in assigned:
+            dispatcher.release(order_id)
+        raise
+    return Checkout({customer: order_id for customer, order_id, _, _ in batch}, rejected, lock_wait)
+
+
+def deliver(conn, limit=None, on_date=None, dispatcher=None, log=None):
+    """Deliver the oldest undelivered orders; returns ``(orders delivered, lock wait)``.
+
+    Agents left with no undelivered order become available again; with a
+    ``dispatcher`` (kept in sync with ``orders``) that is read from its counts.
+    """
+    on_date = (on_date or date.today()).isoformat()
+    lock_wait = begin(conn)
+    try:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS delivered (orderID INTEGER PRIMARY KEY, daID INT)")
+        conn.execute("DELETE FROM delivered")
+        conn.execute("INSERT INTO delivered SELECT orderID, daID FROM orders WHERE delivery_date IS NULL "
+                     "ORDER BY orderID LIMIT ?", [-1 if limit is None else limit])
+        in_delivered = "orderID IN (SELECT orderID FROM delivered)"
+        if log is not None:
+            before = _rows(conn, "orders", in_delivered)
+        conn.execute(f"UPDATE orders SET delivery_date = MAX(order_date, ?) WHERE {in_delivered}", [on_date])
+        if log is not None:
+            log.append(("orders", "update", new, old) for old, new in zip(before, _rows(conn, "orders", in_delivered)))
+        delivered = [o for o, in conn.execute("SELECT orderID FROM delivered")]
+        if dispatcher is None:
+            conn.execute("UPDATE delivery_agent SET availability = 1 "
+                         "WHERE daID IN (SELECT daID FROM delivered) AND NOT EXISTS "
+                         "(SELECT 1 FROM orders o WHERE o.daID = delivery_agent.daID AND o.delivery_date IS NULL)")
+        else:
+            done = Counter(dispatcher.orders[o] for o in delivered if o in dispatcher.orders)
+            freed = [agent for agent, n in done.items() if dispatcher.open[agent] == n]
+            conn.execute("UPDATE delivery_agent SET availability = 1 WHERE daID IN (SELECT value FROM json_each(?))",
+                         [json.dumps(freed)])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if dispatcher is not None:
+        for order_id in delivered:
+            dispatcher.release(order_id)
+    return len(delivered), lock_wait
+
+
+def connect(path):
+    """Open a stand-in database file for concurrent writers (WAL; ``begin`` waits for the lock)."""
+    conn = sqlite3.connect(path, timeout=0)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", required=True, help="SQLite stand-in database file")
+    parser.add_argument("--customers", required=True, help="comma-separated customerIDs")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    result = checkout(conn, [int(c) for c in args.customers.split(",")])
+    conn.close()
+    for customer, order_id in result.orders.items():
+        print(f"customer {customer}: order {order_id}")
+    for customer, reason in result.rejected.items():
+        print(f"customer {customer}: not placed ({reason})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Sustained order placement on the SQLite stand-in: orders per second and lock waits.
+
+A dataset is generated and loaded once, then every batch size runs on a fresh
+copy of it for ``--seconds``.  ``--workers`` processes each own a slice of the
+customers and loop over it: fill the carts of the next batch of customers with a
+few random products (topping up their wallets and the stock to match, as shoppers
+and suppliers would), then place them with ``ebms.checkout``.  A courier process
+delivers every outstanding order each ``--courier-ms``, which frees the agents.
+All of them contend for SQLite's single write lock, and the time spent waiting
+for it is reported next to the throughput.  The database gets the
+``orders(daID, delivery_date)`` index that ``ebms.indexadvisor`` recommends for
+the courier's availability check.
+
+    python -m ebms.checkoutbench --scale-factor 10 --workers 4 --batch-sizes 1,16,128
+"""
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from . import checkout, standin
+from .generator import Generator
+
+WAITED = 0.001  # lock waits shorter than this count as uncontended
+
+
+def prepare(data_dir, db_path):
+    conn = standin.connect(str(db_path))
+    standin.load_csv_dir(conn, data_dir)
+    conn.execute("CREATE INDEX orders_daID_delivery_date ON orders(daID, delivery_date)")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.close()
+
+
+def shop(conn, customers, products, rng):
+    """Replace the carts of ``customers``; wallets and stock are topped up to cover them."""
+    lines = [(c, p, rng.randint(1, 3)) for c in customers for p in rng.sample(products, rng.randint(1, 4))]
+    wait = checkout.begin(conn)
+    ids = json.dumps(customers)
+    conn.execute("DELETE FROM cart WHERE customerID IN (SELECT value FROM json_each(?))", [ids])
+    conn.executemany("INSERT INTO cart VALUES (?, ?, ?)", lines)
+    conn.execute("UPDATE wallet SET balance = balance + (SELECT SUM(c.quantity * p.price) FROM cart c "
+                 "JOIN product p ON p.productID = c.productID WHERE c.customerID = wallet.customerID) "
+                 "WHERE customerID IN (SELECT value FROM json_each(?))", [ids])
+    conn.execute("UPDATE product SET quantity = quantity + t.n FROM (SELECT productID, SUM(quantity) AS n "
+                 "FROM cart WHERE customerID IN (SELECT value FROM json_each(?)) GROUP BY productID) t "
+                 "WHERE product.productID = t.productID", [ids])
+    conn.commit()
+    return wait
+
+
+def _worker(db_path, customers, batch_size, start, seconds, seed):
+    conn = checkout.connect(db_path)
+    rng = random.Random(seed)
+    products = [p for p, in conn.execute("SELECT productID FROM product")]
+    placed, rejected, lock_waits, shop_waits, latencies = 0, Counter(), [], [], []
+    time.sleep(max(start - time.time(), 0))
+    position = 0
+    while time.time() < start + seconds:
+        batch = [customers[(position + i) % len(customers)] for i in range(batch_size)]
+        position += batch_size
+        shop_waits.append(shop(conn, batch, products, rng))
+        t0 = time.perf_counter()
+        result = checkout.checkout(conn, batch)
+        latencies.append(time.perf_counter() - t0)
+        lock_waits.append(result.lock_wait)
+        placed += len(result.orders)
+        rejected.update(result.rejected.values())
+    conn.close()
+    return {"orders": placed, "rejected": dict(rejected), "lock_waits": lock_waits,
+            "shop_waits": shop_waits, "latencies": latencies}
+
+
+def _courier(db_path, start, seconds, interval):
+    conn = checkout.connect(db_path)
+    delivered, waits = 0, []
+    time.sleep(max(start - time.time(), 0))
+    while time.time() < start + seconds:
+        time.sleep(interval)
+        count, wait = checkout.deliver(conn)
+        delivered += count
+        waits.append(wait)
+    conn.close()
+    return {"delivered": delivered, "lock_waits": waits}
+
+
+def _ms(values, q):
+    return float(1000 * np.percentile(values, q)) if len(values) else 0.0
+
+
+def run(db_path, batch_size, workers=4, seconds=10.0, courier_ms=20, seed=42):
+    """Run the load for one batch size on ``db_path``; returns the summary."""
+    conn = checkout.connect(str(db_path))
+    customers = [c for c, in conn.execute("SELECT customerID FROM customer ORDER BY customerID")]
+    conn.close()
+    start = time.time() + 1.0
+    with ProcessPoolExecutor(workers + 1) as pool:
+        jobs = [pool.submit(_worker, str(db_path), customers[w::workers], batch_size, start, seconds, seed + w)
+                for w in range(workers)]
+        courier = pool.submit(_courier, str(db_path), start, seconds, courier_ms / 1000)
+        results = [job.result() for job in jobs]
+        deliveries = courier.result()
+    orders = sum(r["orders"] for r in results)
+    rejected = sum((Counter(r["rejected"]) for r in results), Counter())
+    waits = [w for r in results for w in r["lock_waits"]]
+    all_waits = waits + [w for r in results for w in r["shop_waits"]] + deliveries["lock_waits"]
+    latencies = [t for r in results for t in r["latencies"]]
+    return {
+        "batch_size": batch_size, "workers": workers, "seconds": seconds,
+        "orders": orders, "orders_per_sec": orders / seconds, "rejected": dict(rejected),
+        "delivered": deliveries["delivered"], "transactions": len(all_waits),
+        "lock_waits": sum(w > WAITED for w in all_waits),
+        "lock_wait_p50_ms": _ms(waits, 50), "lock_wait_p99_ms": _ms(waits, 99),
+        "lock_wait_share": sum(all_waits) / ((workers + 1) * seconds),
+        "checkout_p50_ms": _ms(latencies, 50), "checkout_p99_ms": _ms(latencies, 99),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-sizes", default="1,16,128")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--courier-ms", type=float, default=20)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        base = Path(work_dir) / "base.db"
+        prepare(data_dir, base)
+        print(f"{'batch':>6}{'orders':>9}{'orders/s':>10}{'rejected':>10}{'waits':>8}"
+              f"{'wait p50':>10}{'wait p99':>10}{'wait %':>8}{'p50 ms':>9}{'p99 ms':>9}")
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            db_path = Path(work_dir) / f"batch-{batch_size}.db"
+            shutil.copy(base, db_path)
+            r = run(db_path, batch_size, args.workers, args.seconds, args.courier_ms, args.seed)
+            report.append(r)
+            print(f"{batch_size:>6}{r['orders']:>9}{r['orders_per_sec']:>10.0f}{sum(r['rejected'].values()):>10}"
+                  f"{r['lock_waits']:>8}{r['lock_wait_p50_ms']:>10.2f}{r['lock_wait_p99_ms']:>10.2f}"
+                  f"{100 * r['lock_wait_share']:>7.1f}%{r['checkout_p50_ms']:>9.2f}{r['checkout_p99_ms']:>9.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
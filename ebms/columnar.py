@@ -0,0 +1,315 @@
+"""Columnar on-disk snapshots of the table CSVs.
+
+Every column is written as its own ``.npy`` file next to a ``manifest.json``:
+
+* ``INT`` columns as ``int32`` (or ``int64`` when needed)
+* ``DECIMAL(p, s)`` columns as fixed-point ``int64`` (price 123.45 is stored as 12345)
+* ``DATE`` columns as ``datetime64[D]`` (NULL is NaT) and ``BOOLEAN`` as ``bool``
+* low-cardinality strings (country, state, city, names, ...) as dictionary
+  codes plus a ``<column>.dict.npy`` dictionary
+* other strings as UTF-8 bytes plus ``int64`` offsets
+
+The exporter streams each CSV in chunks.  ``Snapshot`` opens only the manifest;
+columns are memory-mapped the first time they are used, so a script that reads
+``orders.order_date`` never touches the other files.
+
+    python -m ebms.columnar --data generated/sf-100 --out generated/sf-100/columnar
+
+    snap = Snapshot("generated/sf-100/columnar")
+    dates = snap["orders"]["order_date"]
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+from .schema import load_schema
+from .tables import LOAD_ORDER, sql_columns
+
+CHUNK_ROWS = 200_000
+DICT_RATIO = 0.5  # dictionary-encode strings whose first chunk has fewer distinct values than this share
+
+
+def _finalize(stage_path, stage_dtype, out_path, out_dtype):
+    """Copy a raw staging file into an ``.npy`` file of the final dtype, chunk by chunk."""
+    n = os.path.getsize(stage_path) // np.dtype(stage_dtype).itemsize
+    out = np.lib.format.open_memmap(out_path, mode="w+", dtype=out_dtype, shape=(n,))
+    if n:
+        staged = np.memmap(stage_path, dtype=stage_dtype, mode="r")
+        for lo in range(0, n, CHUNK_ROWS * 10):
+            out[lo:lo + CHUNK_ROWS * 10] = staged[lo:lo + CHUNK_ROWS * 10].astype(out_dtype)
+        del staged
+    out.flush()
+    del out
+    os.remove(stage_path)
+
+
+def _smallest_int(lo, hi, dtypes=(np.int32, np.int64)):
+    for dtype in dtypes:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+
+class _ColumnWriter:
+    def __init__(self, out_dir, table, column):
+        self.stem = Path(out_dir) / f"{table}.{column.name}"
+        self.column = column
+        self.kind = column.kind
+        self.rows = 0
+        self.lo, self.hi = 0, 0
+        self.dictionary = None
+        self.stage = None
+
+    def _open(self, values):
+        if self.kind == "str":
+            distinct = len(set(values))
+            if distinct < max(1, len(values)) * DICT_RATIO or distinct <= 256:
+                self.kind = "dict"
+                self.dictionary = {}
+            else:
+                self.kind = "utf8"
+                self.data = open(f"{self.stem}.data.stage", "wb")
+                self.offset = 0
+                self.offsets = open(f"{self.stem}.offsets.stage", "wb")
+                self.offsets.write(np.zeros(1, dtype=np.int64).tobytes())
+        self.stage = open(f"{self.stem}.stage", "wb")
+
+    def append(self, values):
+        if self.stage is None:
+            self._open(values)
+        if self.kind in {"int", "fixed"}:
+            if self.kind == "int":
+                arr = np.asarray(values).astype(np.int64)
+            else:
+                arr = np.round(np.asarray(values).astype(np.float64) * 10 ** self.column.scale).astype(np.int64)
+            if len(arr):
+                self.lo, self.hi = min(self.lo, arr.min()), max(self.hi, arr.max())
+        elif self.kind == "date":
+            arr = np.asarray(values, dtype="U10").astype("datetime64[D]").view(np.int64)
+        elif self.kind == "bool":
+            arr = np.isin(np.char.lower(np.asarray(values, dtype="U5")), ["true", "1"]).astype(np.uint8)
+        elif self.kind == "dict":
+            uniques, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+            codes = np.array([self.dictionary.setdefault(u, len(self.dictionary)) for u in uniques], dtype=np.int64)
+            arr = codes[inverse].astype(np.uint32)
+        else:
+            encoded = [v.encode() for v in values]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            self.offsets.write((self.offset + np.cumsum(lengths)).tobytes())
+            self.offset += int(lengths.sum())
+            self.data.write(b"".join(encoded))
+            self.rows += len(values)
+            return
+        self.stage.write(arr.tobytes())
+        self.rows += len(values)
+
+    def finish(self):
+        if self.stage is None:
+            self._open([])
+        self.stage.close()
+        entry = {"kind": self.kind, "rows": self.rows}
+        if self.kind == "int":
+            dtype = _smallest_int(self.lo, self.hi)
+            _finalize(f"{self.stem}.stage", np.int64, f"{self.stem}.npy", dtype)
+        elif self.kind == "fixed":
+            dtype = np.int64
+            entry["scale"] = self.column.scale
+            _finalize(f"{self.stem}.stage", np.int64, f"{self.stem}.npy", dtype)
+        elif self.kind == "date":
+            dtype = np.dtype("datetime64[D]")
+            _finalize(f"{self.stem}.stage", np.int64, f"{self.stem}.npy", dtype)
+        elif self.kind == "bool":
+            dtype = np.bool_
+            _finalize(f"{self.stem}.stage", np.uint8, f"{self.stem}.npy", dtype)
+        elif self.kind == "dict":
+            dtype = np.uint8 if len(self.dictionary) <= 1 << 8 else np.uint16 if len(self.dictionary) <= 1 << 16 else np.uint32
+            _finalize(f"{self.stem}.stage", np.uint32, f"{self.stem}.npy", dtype)
+            np.save(f"{self.stem}.dict.npy", np.array(list(self.dictionary), dtype=str))
+            entry["dictionary"] = len(self.dictionary)
+        else:
+            os.remove(f"{self.stem}.stage")
+            self.data.close()
+            self.offsets.close()
+            dtype = np.int64
+            _finalize(f"{self.stem}.offsets.stage", np.int64, f"{self.stem}.offsets.npy", np.int64)
+            _finalize(f"{self.stem}.data.stage", np.uint8, f"{self.stem}.data.npy", np.uint8)
+        entry["dtype"] = np.dtype(dtype).str
+        return entry
+
+
+class TableWriter:
+    """Column files of one table, fed chunks of rows whose fields are CSV-formatted strings."""
+
+    def __init__(self, out_dir, table, schema_table, names=None):
+        names = sql_columns(table) if names is None else names
+        self.writers = [_ColumnWriter(out_dir, table, schema_table.column(name)) for name in names]
+
+    def append(self, rows):
+        for writer, values in zip(self.writers, zip(*rows)):
+            writer.append(list(values))
+
+    def finish(self):
+        """Finalize every column file; returns the table's manifest entry."""
+        columns = {writer.column.name: writer.finish() for writer in self.writers}
+        return {"rows": next(iter(columns.values()))["rows"], "columns": columns}
+
+
+def export_table(csv_path, out_dir, table, schema_table):
+    """Stream one CSV into column files; returns the table's manifest entry."""
+    writer = TableWriter(out_dir, table, schema_table)
+    with open(csv_path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        while True:
+            chunk = list(islice(reader, CHUNK_ROWS))
+            if not chunk:
+                break
+            writer.append(chunk)
+    return writer.finish()
+
+
+def write_manifest(out_dir, tables):
+    """Write ``manifest.json`` for ``{table: entry}``; returns the manifest."""
+    manifest = {"tables": tables}
+    with open(Path(out_dir) / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def export(data_dir, out_dir, tables=LOAD_ORDER):
+    """Export every table CSV in ``data_dir`` and write ``manifest.json``; returns the manifest."""
+    data_dir, out_dir = Path(data_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    schema, _ = load_schema()
+    entries = {}
+    for table in tables:
+        csv_path = data_dir / f"{table}.csv"
+        if csv_path.exists():
+            entries[table] = export_table(csv_path, out_dir, table, schema[table])
+    return write_manifest(out_dir, entries)
+
+
+class DictColumn:
+    """Dictionary-encoded strings: ``codes`` index into ``dictionary``."""
+
+    def __init__(self, stem):
+        self.stem = stem
+        self.codes = np.load(f"{stem}.npy", mmap_mode="r")
+        self._dictionary = None
+
+    @property
+    def dictionary(self):
+        if self._dictionary is None:
+            self._dictionary = np.load(f"{self.stem}.dict.npy")
+        return self._dictionary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.dictionary[self.codes[index]]
+
+    def decode(self):
+        return self.dictionary[self.codes]
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings stored as one byte array plus offsets."""
+
+    def __init__(self, stem):
+        self.offsets = np.load(f"{stem}.offsets.npy", mmap_mode="r")
+        self.data = np.load(f"{stem}.data.npy", mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def decode(self):
+        return np.array([self[i] for i in range(len(self))], dtype=object)
+
+
+class SnapshotTable:
+    def __init__(self, root, name, entry):
+        self.root = root
+        self.name = name
+        self.entry = entry
+        self._columns = {}
+
+    def __len__(self):
+        return self.entry["rows"]
+
+    @property
+    def columns(self):
+        return list(self.entry["columns"])
+
+    def scale(self, column):
+        return self.entry["columns"][column].get("scale", 0)
+
+    def __getitem__(self, column):
+        if column not in self._columns:
+            kind = self.entry["columns"][column]["kind"]
+            stem = self.root / f"{self.name}.{column}"
+            if kind == "dict":
+                self._columns[column] = DictColumn(stem)
+            elif kind == "utf8":
+                self._columns[column] = StringColumn(stem)
+            else:
+                self._columns[column] = np.load(f"{stem}.npy", mmap_mode="r")
+        return self._columns[column]
+
+
+class Snapshot:
+    """Lazily memory-mapped view of an exported snapshot directory."""
+
+    def __init__(self, path):
+        self.root = Path(path)
+        with open(self.root / "manifest.json") as f:
+            self.manifest = json.load(f)
+        self._tables = {}
+
+    @property
+    def tables(self):
+        return list(self.manifest["tables"])
+
+    def __contains__(self, table):
+        return table in self.manifest["tables"]
+
+    def __getitem__(self, table):
+        if table not in self._tables:
+            self._tables[table] = SnapshotTable(self.root, table, self.manifest["tables"][table])
+        return self._tables[table]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", required=True, help="directory with <table>.csv files")
+    parser.add_argument("--out", default=None, help="snapshot directory (default: <data>/columnar)")
+    args = parser.parse_args(argv)
+
+    out = args.out or Path(args.data) / "columnar"
+    t0 = time.perf_counter()
+    manifest = export(args.data, out)
+    for table, entry in manifest["tables"].items():
+        kinds = ", ".join(f"{c}:{e['kind']}" for c, e in entry["columns"].items())
+        print(f"Exported {table} ({entry['rows']} rows; {kinds})")
+    print(f"Exported in {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    snap = Snapshot(out)
+    if "orders" in snap and "order_product" in snap:
+        snap["orders"]["order_date"], snap["order_product"]["quantity"]
+        print(f"Opened orders.order_date and order_product.quantity in {1000 * (time.perf_counter() - t0):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Reading and writing table CSVs as NumPy columns."""
+
+import csv
+
+import numpy as np
+
+from .tables import TABLES
+
+
+def header(path):
+    with open(path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def read_columns(path, columns, dtype=np.int64):
+    """Read the named columns of a table CSV in one pass; returns a list of arrays."""
+    names = header(path)
+    usecols = [names.index(c) for c in columns]
+    data = np.loadtxt(path, delimiter=",", quotechar='"', skiprows=1, usecols=usecols,
+                      dtype=dtype, ndmin=2, encoding="utf-8")
+    return [data[:, i] for i in range(len(columns))]
+
+
+def read_dates(path, columns):
+    """Read date columns as ``datetime64[D]``; empty fields become NaT."""
+    return [col.astype("datetime64[D]") for col in read_columns(path, columns, dtype=str)]
+
+
+def to_lists(columns):
+    return [col.tolist() if isinstance(col, np.ndarray) else list(col) for col in columns]
+
+
+def write_table(path, table, columns):
+    """Write ``columns`` (one array per column of ``table``) as a CSV with the table's header."""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(TABLES[table])
+        writer.writerows(zip(*to_lists(columns)))
+    return len(columns[0])
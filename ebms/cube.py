@@ -0,0 +1,263 @@
+"""Incrementally maintained revenue cube over the order lines.
+
+Cells are keyed by (month, customer country and state, supplierID) and hold:
+
+* ``lines``: order lines (what Query-01 counts as ``order_count``)
+* ``orders``: distinct orders, each counted once in the cell of its lowest
+  supplierID, so the measure stays exact when suppliers are rolled up
+* ``supplier_orders``: distinct orders with at least one line of the supplier
+  (summed over suppliers it counts (order, supplier) pairs)
+* ``revenue``: ``SUM(price * quantity)`` in cents, priced when the line is applied
+* ``units``: ``SUM(quantity)``
+
+Alongside the per-supplier cells the cube keeps supplier 0 cells summed over
+all suppliers, so month and geography views read a few thousand cells at
+most, whatever the order volume.
+
+The cube remembers how many ``orders`` and ``order_product`` rows it has
+folded in, and ``refresh`` applies only the rows appended since.  Appends must
+bring whole orders: an order row and all of its lines arrive in the same refresh.
+
+    python -m ebms.cube --snapshot generated/sf-100/columnar --cube generated/sf-100/cube.npz --check
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import olap
+from .columnar import Snapshot
+
+MEASURES = ("lines", "orders", "supplier_orders", "revenue", "units")
+DIMENSIONS = ("year", "quarter", "month", "country", "state")
+
+# The olap-queries.sql reports the cube can answer: (dimensions, measures, supplier-specific).
+REPORTS = {
+    1: (("year", "quarter", "month"), ("lines", "revenue"), False),
+    2: (("country",), ("orders", "revenue"), False),
+    5: (("year", "month", "country"), ("supplier_orders", "revenue"), True),
+}
+
+
+GEO_BITS, MONTH_BITS = 20, 20
+ALL_SUPPLIERS = 0
+
+
+def pack(supplier, month, geo):
+    """One sortable int64 per cell: supplier, then month, then geo code."""
+    return (supplier << (MONTH_BITS + GEO_BITS)) | (month << GEO_BITS) | geo
+
+
+def _reduce(keys, measures):
+    """Sum ``measures`` over equal ``keys``; returns the sorted distinct keys and their totals."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], [np.add.reduceat(m[order], starts) for m in measures]
+
+
+class Cube:
+    def __init__(self):
+        self.key = np.empty(0, dtype=np.int64)  # sorted ``pack``-ed cell keys
+        self.measures = {name: np.empty(0, dtype=np.int64) for name in MEASURES}
+        self.places = []  # (country, state) per geo code
+        self._place_codes = {}
+        self.order_rows = 0
+        self.line_rows = 0
+        self.scale = 2
+
+    def __len__(self):
+        return len(self.key)
+
+    @property
+    def supplier(self):
+        return self.key >> (MONTH_BITS + GEO_BITS)
+
+    @property
+    def month(self):
+        """Months since 1970-01."""
+        return (self.key >> GEO_BITS) & ((1 << MONTH_BITS) - 1)
+
+    @property
+    def geo(self):
+        return self.key & ((1 << GEO_BITS) - 1)
+
+    def _geo_codes(self, snap, customer_id):
+        """Geo code of every customer, adding unseen (country, state) pairs; -1 when unknown."""
+        customer, address = snap["customer"], snap["address"]
+        geo = np.full(len(customer_id), -1, dtype=np.int64)
+        kept, customer_rows = olap.join(customer_id, customer["customerID"])
+        kept2, address_rows = olap.join(np.asarray(customer["addressID"])[customer_rows], address["addressID"])
+        countries, country_codes = olap.factorize(address["country"], address_rows)
+        states, state_codes = olap.factorize(address["state"], address_rows)
+        pairs, inverse = np.unique(country_codes * len(states) + state_codes, return_inverse=True)
+        codes = np.array([self._place_codes.setdefault((countries[p // len(states)].item(), states[p % len(states)].item()),
+                                                       len(self._place_codes)) for p in pairs], dtype=np.int64)
+        self.places = list(self._place_codes)
+        geo[kept[kept2]] = codes[inverse]
+        return geo
+
+    def apply(self, snap, orders, lines):
+        """Fold a batch of new ``orders`` and ``lines`` (dicts of columns) into the cube.
+
+        Products, customers and addresses are looked up in ``snap``; like the
+        SQL joins, lines whose product or customer address is missing are skipped.
+        """
+        kept, order_rows = olap.join(lines["orderID"], orders["orderID"])
+        if len(kept) != len(lines["orderID"]):
+            raise ValueError("order lines reference orders outside the batch")
+        product = snap["product"]
+        kept, product_rows = olap.join(lines["productID"], product["productID"])
+        order_rows = order_rows[kept]
+        geo = self._geo_codes(snap, np.asarray(orders["customerID"]))[order_rows]
+        known = geo >= 0
+        kept, order_rows, product_rows, geo = kept[known], order_rows[known], product_rows[known], geo[known]
+        if not len(kept):
+            return
+        self.scale = product.scale("price")
+        quantity = np.asarray(lines["quantity"], dtype=np.int64)[kept]
+        month = np.asarray(orders["order_date"]).astype("datetime64[M]").astype(np.int64)[order_rows]
+        supplier = np.asarray(product["supplierID"], dtype=np.int64)[product_rows]
+        revenue = np.asarray(product["price"])[product_rows] * quantity
+
+        # Each line adds to lines/revenue/units, the first line of each distinct
+        # (order, supplier) to supplier_orders, and the first line of an order's
+        # lowest supplier to orders.
+        pair_key = order_rows * (int(supplier.max()) + 1) + supplier
+        order = np.argsort(pair_key, kind="stable")
+        pair_line = order[np.r_[True, pair_key[order][1:] != pair_key[order][:-1]]]
+        pair_order = order_rows[pair_line]
+        lowest = pair_line[np.r_[True, pair_order[1:] != pair_order[:-1]]]
+        groups = [(np.arange(len(kept)), {"lines": 1, "revenue": revenue, "units": quantity}),
+                  (pair_line, {"supplier_orders": 1}),
+                  (lowest, {"orders": 1})]
+        take = np.concatenate([rows for rows, _ in groups])
+        contributions = {
+            m: np.concatenate([np.broadcast_to(np.asarray(values.get(m, 0), dtype=np.int64), len(rows))
+                               for rows, values in groups])
+            for m in MEASURES
+        }
+        keys = pack(supplier[take], month[take], geo[take])
+        self._merge(np.r_[keys, pack(ALL_SUPPLIERS, month[take], geo[take])],
+                    {m: np.r_[c, c] for m, c in contributions.items()})
+
+    def _merge(self, keys, contributions):
+        """Add reduced contributions into the sorted cells, inserting the keys not seen before."""
+        keys, totals = _reduce(keys, [contributions[m] for m in MEASURES])
+        at = np.searchsorted(self.key, keys)
+        found = at < len(self.key)
+        found[found] = self.key[at[found]] == keys[found]
+        for name, total in zip(MEASURES, totals):
+            np.add.at(self.measures[name], at[found], total[found])
+        new = ~found
+        self.key = np.insert(self.key, at[new], keys[new])
+        for name, total in zip(MEASURES, totals):
+            self.measures[name] = np.insert(self.measures[name], at[new], total[new])
+
+    def refresh(self, snap, order_rows=None, line_rows=None):
+        """Apply the ``orders`` and ``order_product`` rows appended to ``snap`` since the last refresh.
+
+        ``order_rows`` and ``line_rows`` stop the refresh early (for staged appends).
+        Returns the number of orders and lines applied.
+        """
+        orders, lines = snap["orders"], snap["order_product"]
+        order_stop = len(orders) if order_rows is None else order_rows
+        line_stop = len(lines) if line_rows is None else line_rows
+        new_orders = {c: np.asarray(orders[c][self.order_rows:order_stop]) for c in ("orderID", "customerID", "order_date")}
+        new_lines = {c: np.asarray(lines[c][self.line_rows:line_stop]) for c in ("orderID", "productID", "quantity")}
+        self.apply(snap, new_orders, new_lines)
+        applied = (order_stop - self.order_rows, line_stop - self.line_rows)
+        self.order_rows, self.line_rows = order_stop, line_stop
+        return applied
+
+    def dimension(self, name):
+        """Per-cell values of one dimension as ``(uniques, codes)``."""
+        if name in {"year", "quarter", "month"}:
+            year, quarter, month = olap.date_parts(self.month.astype("datetime64[M]"))
+            return olap.factorize({"year": year, "quarter": quarter, "month": month}[name])
+        names = np.array([place[0 if name == "country" else 1] for place in self.places], dtype=str)
+        uniques, codes = np.unique(names, return_inverse=True)
+        return uniques, codes[self.geo]
+
+    def rollup(self, dimensions, measures=MEASURES, supplier_id=None):
+        """Rows of ``dimensions + measures`` grouped ``WITH ROLLUP``, in rollup order.
+
+        Reads the all-supplier cells, or one supplier's cells for ``supplier_id``.
+        """
+        supplier = ALL_SUPPLIERS if supplier_id is None else supplier_id
+        lo, hi = np.searchsorted(self.key, [pack(supplier, 0, 0), pack(supplier + 1, 0, 0)])
+        cells = np.arange(lo, hi)
+        keys = [(uniques, codes[cells]) for uniques, codes in map(self.dimension, dimensions)]
+        key_codes, _, totals, _ = olap.rollup(keys, sums=[self.measures[m][cells] for m in measures]) \
+            if len(cells) else ([], [], [], [])
+        rows = []
+        for i in range(len(totals[0]) if len(cells) else 0):
+            values = tuple(None if codes[i] < 0 else uniques[codes[i]].item()
+                           for (uniques, _), codes in zip(keys, key_codes))
+            rows.append(values + tuple(olap.decimal(t[i], self.scale) if m == "revenue" else int(t[i])
+                                       for m, t in zip(measures, totals)))
+        return olap.rollup_order(rows, len(dimensions))
+
+    def report(self, number, supplier_id=1):
+        """Query-01, -02 or -05 of ``olap-queries.sql`` answered from the cube, ordered as the SQL orders it."""
+        dimensions, measures, per_supplier = REPORTS[number]
+        rows = self.rollup(dimensions, measures, supplier_id if per_supplier else None)
+        if number == 1:
+            rows = olap.order_rows(rows, [(0, True), (2, True)])
+        elif number == 2:
+            rows = olap.order_rows(rows, [(2, True)])
+        return olap.Result(list(dimensions + measures), rows)
+
+    def save(self, path):
+        countries, states = zip(*self.places) if self.places else ((), ())
+        np.savez(path, key=self.key,
+                 countries=np.array(countries, dtype=str), states=np.array(states, dtype=str),
+                 watermarks=np.array([self.order_rows, self.line_rows, self.scale]),
+                 **self.measures)
+
+    @classmethod
+    def load(cls, path):
+        cube = cls()
+        with np.load(path) as data:
+            cube.key = data["key"]
+            cube.measures = {name: data[name] for name in MEASURES}
+            cube.places = list(zip(data["countries"].tolist(), data["states"].tolist()))
+            cube.order_rows, cube.line_rows, cube.scale = (int(v) for v in data["watermarks"])
+        cube._place_codes = {place: i for i, place in enumerate(cube.places)}
+        return cube
+
+
+def check(cube, snap, supplier_id=1):
+    """Compare the cube's reports with the OLAP engine; returns the numbers of the reports that differ."""
+    return [number for number in REPORTS
+            if cube.report(number, supplier_id).rows != olap.run(snap, number, supplier_id).rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snapshot", required=True, help="columnar snapshot directory")
+    parser.add_argument("--cube", required=True, help="cube file (.npz); created if missing, else refreshed")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the existing cube file")
+    parser.add_argument("--check", action="store_true", help="compare with the OLAP engine afterwards")
+    parser.add_argument("--supplier", type=int, default=1, help="s_id for the Query-05 check")
+    args = parser.parse_args(argv)
+
+    path = Path(args.cube)
+    cube = Cube.load(path) if path.exists() and not args.rebuild else Cube()
+    snap = Snapshot(args.snapshot)
+    t0 = time.perf_counter()
+    orders, lines = cube.refresh(snap)
+    elapsed = time.perf_counter() - t0
+    cube.save(path)
+    print(f"Applied {orders} orders and {lines} order lines in {1000 * elapsed:.1f} ms; {len(cube)} cells")
+    if args.check:
+        differ = check(cube, snap, args.supplier)
+        if differ:
+            raise SystemExit(f"cube differs from the OLAP engine on Query-{', Query-'.join(f'{n:02d}' for n in differ)}")
+        print("Query-01, Query-02 and Query-05 match the OLAP engine")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Precomputed JSON snapshots for the dashboard charts, rebuilt month by month.
+
+The admin dashboard's revenue line and category doughnut, and the role
+summary cards, read small JSON files instead of running the OLAP joins:
+
+* ``revenue.json``: the last 12 months' revenue and orders, and the daily
+  revenue over all history downsampled to ``points`` points with LTTB
+  (largest-triangle-three-buckets), which keeps the peaks and dips a plain
+  stride would drop;
+* ``categories.json``: revenue by product line (the schema has no product
+  category, so a product's line is its catalogue name without the generator's
+  ``Model N`` suffix), the top lines and the rest as "Other";
+* ``roles.json``: admin, supplier, customer and delivery summaries.
+
+Each file has a fixed size whatever the length of the history, so the
+dashboard loads in the same time at any scale.  ``--gzip`` also writes
+``.json.gz`` copies for servers that send precompressed files.
+
+The build reads a columnar snapshot (``ebms.columnar``) and keeps additive
+per-month partials in ``<out>/months/YYYY-MM.json``: daily revenue, orders
+and lines, and revenue per product line and per supplier.  Like
+``ebms.cube``, it remembers how many ``orders`` and ``order_product`` rows it
+has folded in; a rebuild adds only the rows appended since, rewrites just the
+months they fall in and assembles the outputs from the partials.  Appends
+must bring whole orders, an order with all of its lines.  Deliveries are not
+appends (``ebms.checkout.deliver`` sets ``delivery_date`` on existing
+orders), so the delivery figures are recomputed from the snapshot's
+``orders.delivery_date`` on every build, in one vectorized pass.
+
+    python -m ebms.dashboard --snapshot generated/sf-100/columnar --out exported-assets/ebms-dashboard/snapshots --gzip
+"""
+
+import argparse
+import gzip
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import olap
+from .columnar import Snapshot
+
+POINTS = 240
+TOP_LINES = 5
+TOP_SUPPLIERS = 10
+
+
+def lttb(x, y, n):
+    """Indices of ``n`` points of the series ``(x, y)`` chosen by largest-triangle-three-buckets.
+
+    The first and last points are kept; every bucket in between keeps the point
+    forming the largest triangle with the point kept before it and the average
+    of the next bucket.
+    """
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1][:n])
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    edges = np.r_[(np.arange(n - 2) * (size - 2) / (n - 2)).astype(np.int64) + 1, size - 1]
+    chosen = np.empty(n, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, size - 1
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        following = slice(hi, edges[i + 2]) if i + 2 < len(edges) else slice(size - 1, size)
+        ax, ay = x[chosen[i]], y[chosen[i]]
+        bx, by = x[following].mean(), y[following].mean()
+        area = np.abs((ax - bx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (by - ay))
+        chosen[i + 1] = lo + int(np.argmax(area))
+    return chosen
+
+
+def product_line(name):
+    return name.split(" Model ")[0]
+
+
+def _month_name(month):
+    return str(np.datetime64(int(month), "M"))
+
+
+def _empty_month(month):
+    start, stop = (np.datetime64(int(m), "M").astype("datetime64[D]") for m in (month, month + 1))
+    days = int((stop - start).astype(np.int64))
+    return {"month": _month_name(month), "revenue": [0] * days, "orders": [0] * days, "lines": [0] * days,
+            "product_lines": {}, "suppliers": {}}
+
+
+def _add(counts, keys, values):
+    for key, value in zip(keys, values):
+        counts[key] = counts.get(key, 0) + value
+
+
+class DashboardBuilder:
+    def __init__(self, out):
+        self.out = Path(out)
+        self.months_dir = self.out / "months"
+        state = self.out / "build.json"
+        saved = json.loads(state.read_text()) if state.exists() else {}
+        self.order_rows = saved.get("order_rows", 0)
+        self.line_rows = saved.get("line_rows", 0)
+        self.scale = saved.get("scale", 2)
+
+    def _month_path(self, month):
+        return self.months_dir / f"{_month_name(month)}.json"
+
+    def _load_month(self, month):
+        path = self._month_path(month)
+        return json.loads(path.read_text()) if path.exists() else _empty_month(month)
+
+    def refresh(self, snap, order_rows=None, line_rows=None):
+        """Fold the ``orders`` and ``order_product`` rows appended since the last build into their months.
+
+        ``order_rows`` and ``line_rows`` stop early (for staged appends).  Returns the months rewritten.
+        """
+        orders, lines = snap["orders"], snap["order_product"]
+        order_stop = len(orders) if order_rows is None else order_rows
+        line_stop = len(lines) if line_rows is None else line_rows
+        dates = np.asarray(orders["order_date"])
+        months = {}
+
+        def month_of(m):
+            if m not in months:
+                months[m] = self._load_month(m)
+            return months[m]
+
+        new_orders = np.arange(self.order_rows, order_stop)
+        order_day = dates[new_orders]
+        for m in np.unique(order_day.astype("datetime64[M]").astype(np.int64)).tolist():
+            partial = month_of(m)
+            in_month = order_day.astype("datetime64[M]").astype(np.int64) == m
+            day = (order_day[in_month] - np.datetime64(m, "M").astype("datetime64[D]")).astype(np.int64)
+            partial["orders"] = (np.asarray(partial["orders"]) + np.bincount(day, minlength=len(partial["orders"]))).tolist()
+
+        facts = olap.line_facts(snap, np.arange(self.line_rows, line_stop))
+        self.scale = facts["scale"]
+        line_day = dates[facts["order"]]
+        line_month = line_day.astype("datetime64[M]").astype(np.int64)
+        products, product_codes = np.unique(facts["product"], return_inverse=True)
+        names = snap["product"]["name"]
+        lines_of = np.array([product_line(str(names[int(p)])) for p in products], dtype=object)[product_codes] \
+            if len(products) else np.array([], dtype=object)
+        supplier = np.asarray(snap["product"]["supplierID"])[facts["product"]]
+        for m in np.unique(line_month).tolist():
+            partial = month_of(m)
+            in_month = line_month == m
+            day = (line_day[in_month] - np.datetime64(m, "M").astype("datetime64[D]")).astype(np.int64)
+            value = facts["value"][in_month]
+            days = len(partial["revenue"])
+            partial["revenue"] = (np.asarray(partial["revenue"], dtype=np.int64)
+                                  + np.bincount(day, weights=value, minlength=days).astype(np.int64)).tolist()
+            partial["lines"] = (np.asarray(partial["lines"]) + np.bincount(day, minlength=days)).tolist()
+            for key, keys in (("product_lines", lines_of[in_month]), ("suppliers", supplier[in_month])):
+                uniques, codes = np.unique(keys.astype(str), return_inverse=True)
+                _add(partial[key], uniques.tolist(), np.bincount(codes, weights=value).astype(np.int64).tolist())
+
+        self.months_dir.mkdir(parents=True, exist_ok=True)
+        for m, partial in months.items():
+            self._month_path(m).write_text(json.dumps(partial, separators=(",", ":")))
+        self.order_rows, self.line_rows = order_stop, line_stop
+        (self.out / "build.json").write_text(json.dumps(
+            {"order_rows": self.order_rows, "line_rows": self.line_rows, "scale": self.scale}))
+        return sorted(_month_name(m) for m in months)
+
+    def months(self):
+        """The month partials in order, with empty months filling any gaps."""
+        saved = {p.stem: p for p in self.months_dir.glob("*.json")}
+        if not saved:
+            return []
+        first, last = (np.datetime64(m, "M").astype(np.int64) for m in (min(saved), max(saved)))
+        return [json.loads(saved[_month_name(m)].read_text()) if _month_name(m) in saved else _empty_month(m)
+                for m in range(int(first), int(last) + 1)]
+
+    def _money(self, cents):
+        return round(cents / 10 ** self.scale, 2)
+
+    def assemble(self, snap, points=POINTS):
+        """The dashboard files' contents, ``{file name: object}``, from the month partials."""
+        months = self.months()
+        daily = np.array([r for m in months for r in m["revenue"]], dtype=np.int64)
+        first_day = np.datetime64(months[0]["month"], "D") if months else np.datetime64("1970-01-01")
+        keep = lttb(np.arange(len(daily)), daily, points)
+        revenue = {
+            "monthly": [{"month": m["month"], "revenue": self._money(sum(m["revenue"])), "orders": sum(m["orders"])}
+                        for m in months[-12:]],
+            "daily": {"date": [str(first_day + int(i)) for i in keep], "revenue": [self._money(v) for v in daily[keep]]},
+        }
+
+        by_line, by_supplier, recent_suppliers = {}, {}, set()
+        for i, m in enumerate(months):
+            _add(by_line, m["product_lines"], m["product_lines"].values())
+            _add(by_supplier, m["suppliers"], m["suppliers"].values())
+            if i >= len(months) - 12:
+                recent_suppliers.update(m["suppliers"])
+        total = sum(by_line.values())
+        ranked = sorted(by_line.items(), key=lambda item: (-item[1], item[0]))
+        shares = ranked[:TOP_LINES] + ([("Other", sum(v for _, v in ranked[TOP_LINES:]))] if len(ranked) > TOP_LINES else [])
+        categories = {"categories": [{"category": name, "sales": self._money(v),
+                                      "percentage": round(100 * v / total, 1) if total else 0.0} for name, v in shares]}
+
+        orders = sum(sum(m["orders"]) for m in months)
+        # delivery dates change on existing rows, so they are read afresh rather than kept in the partials
+        folded = slice(0, self.order_rows)
+        delivery_days = (np.asarray(snap["orders"]["delivery_date"])[folded]
+                         - np.asarray(snap["orders"]["order_date"])[folded])
+        delivery_days = delivery_days[~np.isnat(delivery_days)].astype(np.int64)
+        delivered = len(delivery_days)
+        customers, suppliers, agents = (len(snap[t]) for t in ("customer", "supplier", "delivery_agent"))
+        ratings = np.asarray(snap["da_review"]["rating"]) if "da_review" in snap else np.zeros(0)
+        roles = {
+            "admin": {"users": customers + suppliers + agents, "orders": orders, "revenue": self._money(total),
+                      "monthly_revenue": revenue["monthly"][-1]["revenue"] if months else 0.0,
+                      "active_suppliers": len(recent_suppliers)},
+            "supplier": {"suppliers": suppliers, "products": len(snap["product"]),
+                         "top": [{"supplierID": int(s), "revenue": self._money(v)} for s, v in
+                                 sorted(by_supplier.items(), key=lambda item: (-item[1], int(item[0])))[:TOP_SUPPLIERS]]},
+            "customer": {"customers": customers, "orders_per_customer": round(orders / customers, 2) if customers else 0.0,
+                         "average_order_value": self._money(total / orders) if orders else 0.0},
+            "delivery": {"agents": agents, "available": int(np.asarray(snap["delivery_agent"]["availability"]).sum()),
+                         "delivered": delivered,
+                         "average_delivery_days": round(int(delivery_days.sum()) / delivered, 2) if delivered else 0.0,
+                         "average_rating": round(float(ratings.mean()), 2) if len(ratings) else 0.0},
+        }
+        return {"revenue.json": revenue, "categories.json": categories, "roles.json": roles}
+
+    def write(self, snap, points=POINTS, compress=False):
+        """Write the dashboard files; returns ``{file name: bytes}`` as written (before compression)."""
+        sizes = {}
+        for name, content in self.assemble(snap, points).items():
+            data = json.dumps(content, separators=(",", ":")).encode()
+            (self.out / name).write_bytes(data)
+            if compress:
+                (self.out / f"{name}.gz").write_bytes(gzip.compress(data, mtime=0))
+            sizes[name] = len(data)
+        return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snapshot", required=True, help="columnar snapshot directory")
+    parser.add_argument("--out", default="exported-assets/ebms-dashboard/snapshots")
+    parser.add_argument("--points", type=int, default=POINTS, help="points kept of the daily revenue series")
+    parser.add_argument("--gzip", action="store_true", help="also write .json.gz files")
+    parser.add_argument("--rebuild", action="store_true", help="drop the month partials and start over")
+    args = parser.parse_args(argv)
+
+    out = Path(args.out)
+    if args.rebuild:
+        for path in [out / "build.json", *(out / "months").glob("*.json")]:
+            path.unlink(missing_ok=True)
+    builder = DashboardBuilder(out)
+    snap = Snapshot(args.snapshot)
+    t0 = time.perf_counter()
+    months = builder.refresh(snap)
+    t1 = time.perf_counter()
+    sizes = builder.write(snap, args.points, args.gzip)
+    t2 = time.perf_counter()
+    print(f"{len(months)} months rebuilt in {t1 - t0:.2f} s"
+          + (f" ({months[0]} .. {months[-1]})" if months else ""))
+    print(f"dashboard files assembled in {1000 * (t2 - t1):.1f} ms: "
+          + ", ".join(f"{name} {size / 1024:.1f} KiB" for name, size in sizes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Index-backed generation of the derived tables.
+
+``product_review``, ``da_review``, ``cart`` and ``wallet`` are derived from the
+base tables.  The notebook cells scanned ``order_product`` once per sampled order
+and retried in a ``while`` loop until enough unique reviews were found; here the
+orders and order lines are read once into dense-ID indexes (orderID -> lines,
+customerID -> delivered orders) and every table is sampled in a bounded number
+of vectorized steps, so the work grows linearly with order volume and always
+finishes.
+"""
+
+import numpy as np
+
+from .csvio import read_columns, read_dates
+
+RATING_WEIGHTS = np.array([0.08, 0.10, 0.20, 0.32, 0.30])
+
+
+class IdIndex:
+    """Rows grouped by an integer key in ``1..size``, addressed by offsets (a perfect hash on IDs)."""
+
+    def __init__(self, keys, size=None):
+        keys = np.asarray(keys, dtype=np.int64)
+        size = int(keys.max(initial=0)) if size is None else size
+        self.offsets = np.zeros(size + 2, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=size + 1), out=self.offsets[1:])
+        self.rows = np.argsort(keys, kind="stable")
+
+    def counts(self, keys):
+        return self.offsets[np.asarray(keys) + 1] - self.offsets[keys]
+
+    def rows_of(self, key):
+        return self.rows[self.offsets[key]:self.offsets[key + 1]]
+
+    def gather(self, keys):
+        """Rows of all ``keys`` concatenated, without a Python loop."""
+        keys = np.asarray(keys, dtype=np.int64)
+        counts = self.counts(keys)
+        starts = np.repeat(self.offsets[keys] - np.cumsum(counts) + counts, counts)
+        return self.rows[starts + np.arange(counts.sum())]
+
+
+class OrderIndex:
+    """Orders and order lines read once, indexed by orderID and by customer."""
+
+    def __init__(self, order_id, customer, agent, order_date, delivery_date, line_order, line_product):
+        self.order_id = order_id
+        self.customer = customer
+        self.agent = agent
+        self.order_date = order_date
+        self.delivery_date = delivery_date
+        self.line_order = line_order
+        self.line_product = line_product
+        self.position = np.full(int(order_id.max(initial=0)) + 1, -1, dtype=np.int64)
+        self.position[order_id] = np.arange(len(order_id))
+        self.lines = IdIndex(line_order, len(self.position) - 1)
+        self.delivered = np.flatnonzero(~np.isnat(delivery_date))
+        self.delivered_by_customer = IdIndex(customer[self.delivered], int(customer.max(initial=0)))
+
+    @classmethod
+    def from_csv(cls, data_dir):
+        order_id, customer, agent = read_columns(f"{data_dir}/orders.csv", ["orderID", "customerID", "daID"])
+        order_date, delivery_date = read_dates(f"{data_dir}/orders.csv", ["order_date", "delivery_date"])
+        line_order, line_product = read_columns(f"{data_dir}/order_product.csv", ["orderID", "productID"])
+        return cls(order_id, customer, agent, order_date, delivery_date, line_order, line_product)
+
+    def delivered_orders(self, customer):
+        """Row positions of the delivered orders of one customer."""
+        return self.delivered[self.delivered_by_customer.rows_of(customer)]
+
+
+def distinct_sample(rng, keys, n):
+    """Sorted positions of up to ``n`` rows with distinct ``keys``, chosen uniformly at random."""
+    order = rng.permutation(len(keys))
+    _, first = np.unique(keys[order], return_index=True)
+    picked = order[first]
+    if len(picked) > n:
+        picked = rng.choice(picked, n, replace=False)
+    return np.sort(picked)
+
+
+def pair_keys(a, b):
+    return a.astype(np.int64) * (int(b.max(initial=0)) + 1) + b
+
+
+def review_columns(rng, customer, key, date, texts):
+    """Attach ratings and review texts to sampled ``(customer, key, date)`` rows."""
+    n = len(customer)
+    rating = rng.choice(5, n, p=RATING_WEIGHTS) + 1
+    content = texts[rng.integers(0, len(texts), n)]
+    return [customer, key, rating, content, date.astype(str)]
+
+
+def product_reviews(index, rng, n, texts):
+    """Up to ``n`` reviews of distinct (customer, product) pairs from delivered order lines."""
+    orders = index.delivered
+    lines = index.lines.gather(index.order_id[orders])
+    order_row = index.position[index.line_order[lines]]
+    customer, product = index.customer[order_row], index.line_product[lines]
+    picked = distinct_sample(rng, pair_keys(customer, product), n)
+    return review_columns(rng, customer[picked], product[picked], index.delivery_date[order_row[picked]], texts)
+
+
+def da_reviews(index, rng, n, texts):
+    """Up to ``n`` reviews of distinct (customer, agent) pairs from delivered orders, 5-15 days after delivery."""
+    orders = index.delivered
+    customer, agent = index.customer[orders], index.agent[orders]
+    picked = distinct_sample(rng, pair_keys(customer, agent), n)
+    date = index.delivery_date[orders[picked]] + rng.integers(5, 16, len(picked)).astype("timedelta64[D]")
+    return review_columns(rng, customer[picked], agent[picked], date, texts)
+
+
+def carts(rng, customer_ids, sample_products):
+    """1-10 distinct products per customer with quantities of 5-20.
+
+    ``sample_products(rng, n)`` draws productIDs (uniformly or by popularity).
+    """
+    customer = np.repeat(customer_ids, rng.integers(1, 11, len(customer_ids)))
+    product = sample_products(rng, len(customer))
+    _, keep = np.unique(pair_keys(customer, product), return_index=True)
+    return [customer[keep], product[keep], rng.integers(5, 21, len(keep))]
+
+
+def money(cents):
+    """Format integer cents as ``DECIMAL(10, 2)`` literals."""
+    return np.char.add(np.char.add((cents // 100).astype(str), "."), np.char.zfill((cents % 100).astype(str), 2))
+
+
+def wallets(rng, customer_ids, emails):
+    """A wallet per customer with a 10,000-50,000 balance and a UPI ID taken from the email."""
+    upi = np.array([e[:e.find(".")] for e in np.asarray(emails).tolist()], dtype=object)
+    return [customer_ids, money(rng.integers(1_000_000, 5_000_001, len(customer_ids))), upi]
+
+
+def uniform_products(n_products):
+    def sample(rng, n):
+        return rng.integers(1, n_products + 1, n)
+
+    return sample
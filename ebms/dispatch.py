@@ -0,0 +1,188 @@
+"""In-memory delivery-agent assignment balanced by open orders and rating.
+
+Simple Query-01 assigns ``SELECT daID FROM delivery_agent WHERE availability
+= 1 ORDER BY daID ASC LIMIT 1``, so every checkout goes for the same lowest-ID
+agent, and the ``da_available`` trigger scans ``orders`` with ``NOT EXISTS`` on
+every update to free an agent again.  ``Dispatcher`` keeps the agents in a heap
+ordered by
+
+* open (undelivered) orders, fewest first;
+* orders assigned so far divided by the agent's recent rating (the mean of
+  its last ``recent`` reviews in ``da_review``, relative to the average), so
+  agents with the same load take turns and better-rated ones get
+  proportionally more of the orders.
+
+Each agent also sits in the heap of its home city, the city it has delivered
+to most.  With ``affinity`` on, an order goes to an agent of the customer's
+city when that agent has at most ``affinity_slack`` more open orders than the
+best agent overall.  Entries are replaced rather than updated (stale ones are
+skipped when they reach the top), so ``assign`` and ``release`` are O(log n)
+amortized.  ``max_open`` caps the open orders of an agent; ``max_open=1`` is
+the schema's ``availability`` flag.
+
+The dispatcher learns about orders through ``assign`` and ``release``;
+``sync`` reconciles it with the ``orders`` table for orders placed or
+delivered elsewhere (or assigned in a transaction that was rolled back).
+"""
+
+import heapq
+import json
+import threading
+from collections import Counter
+
+
+def recent_ratings(conn, recent=20):
+    """``{daID: mean of the agent's last `recent` review ratings}``."""
+    return dict(conn.execute(
+        "SELECT daID, AVG(rating) FROM (SELECT daID, rating, ROW_NUMBER() OVER "
+        "(PARTITION BY daID ORDER BY review_date DESC) AS n FROM da_review) WHERE n <= ? GROUP BY daID",
+        [recent]))
+
+
+def home_cities(conn):
+    """``{daID: the customer city the agent has delivered the most orders to}``."""
+    counts = {}
+    for agent, city, n in conn.execute(
+            "SELECT o.daID, a.city, COUNT(*) FROM orders o JOIN customer c ON c.customerID = o.customerID "
+            "JOIN address a ON a.addressID = c.addressID GROUP BY o.daID, a.city"):
+        counts.setdefault(agent, Counter())[city] = n
+    return {agent: cities.most_common(1)[0][0] for agent, cities in counts.items()}
+
+
+class Dispatcher:
+    def __init__(self, agents, ratings=None, cities=None, max_open=None, affinity=True, affinity_slack=0):
+        ratings = ratings or {}
+        default = sum(ratings.values()) / len(ratings) if ratings else 0.0
+        self.max_open = max_open
+        self.affinity = affinity
+        self.affinity_slack = affinity_slack
+        self.agents = list(agents)
+        self.rating = {a: ratings.get(a, default) for a in self.agents}
+        self.mean_rating = default
+        self.city = {a: cities[a] for a in self.agents if cities and a in cities}
+        self.open = dict.fromkeys(self.agents, 0)
+        self.assigned = dict.fromkeys(self.agents, 0)
+        self.orders = {}  # open orderID -> daID
+        self.watermark = 0  # highest orderID seen
+        self._version = dict.fromkeys(self.agents, 0)
+        self._heap = []
+        self._city_heaps = {}
+        self._lock = threading.Lock()
+        for agent in self.agents:
+            self._push(agent)
+
+    @classmethod
+    def from_db(cls, conn, recent=20, **kwargs):
+        """A dispatcher for every agent of the database, with its open orders loaded."""
+        agents = [a for a, in conn.execute("SELECT daID FROM delivery_agent ORDER BY daID")]
+        dispatcher = cls(agents, recent_ratings(conn, recent), home_cities(conn), **kwargs)
+        dispatcher.sync(conn)
+        return dispatcher
+
+    def _key(self, agent):
+        weight = max(self.rating[agent], 0.5) / max(self.mean_rating, 0.5)
+        return self.open[agent], (self.assigned[agent] + 1) / weight, agent
+
+    def _push(self, agent):
+        self._version[agent] += 1
+        entry = (self._key(agent), self._version[agent])
+        if self.max_open is not None and self.open[agent] >= self.max_open:
+            return  # full: pushed again when an order is released
+        heapq.heappush(self._heap, entry)
+        if agent in self.city:
+            heapq.heappush(self._city_heaps.setdefault(self.city[agent], []), entry)
+        if len(self._heap) > 4 * len(self.agents) + 64:
+            self._compact()
+
+    def _compact(self):
+        live = [(self._key(a), self._version[a]) for a in self.agents
+                if self.max_open is None or self.open[a] < self.max_open]
+        self._heap = list(live)
+        heapq.heapify(self._heap)
+        self._city_heaps = {}
+        for entry in live:
+            agent = entry[0][-1]
+            if agent in self.city:
+                self._city_heaps.setdefault(self.city[agent], []).append(entry)
+        for heap in self._city_heaps.values():
+            heapq.heapify(heap)
+
+    def _top(self, heap):
+        """The best live entry of ``heap`` (stale entries are dropped), or None."""
+        while heap:
+            key, version = heap[0]
+            if version == self._version[key[-1]]:
+                return key
+            heapq.heappop(heap)
+        return None
+
+    def _take(self, agent, order_id):
+        self.open[agent] += 1
+        self.assigned[agent] += 1
+        self.orders[order_id] = agent
+        self.watermark = max(self.watermark, order_id)
+        self._push(agent)
+
+    def assign(self, order_id, city=None):
+        """Pick the agent for a new order; None when every agent has ``max_open`` orders."""
+        with self._lock:
+            best = self._top(self._heap)
+            if best is None:
+                return None
+            if self.affinity and city in self._city_heaps:
+                local = self._top(self._city_heaps[city])
+                if local is not None and local[0] <= best[0] + self.affinity_slack:
+                    best = local
+            self._take(best[-1], order_id)
+            return best[-1]
+
+    def release(self, order_id):
+        """Forget a delivered (or cancelled) order; returns its agent, or None if unknown."""
+        with self._lock:
+            agent = self.orders.pop(order_id, None)
+            if agent is not None:
+                self.open[agent] -= 1
+                self._push(agent)
+            return agent
+
+    def add_agent(self, agent, rating=None, city=None):
+        """Start assigning to a new agent (rated like the average agent unless given)."""
+        with self._lock:
+            if rating is None:
+                rating = sum(self.rating.values()) / len(self.rating) if self.rating else 0.0
+            self.agents.append(agent)
+            self.rating[agent] = rating
+            if city is not None:
+                self.city[agent] = city
+            self.open[agent] = self.assigned[agent] = self._version[agent] = 0
+            self._push(agent)
+
+    def sync(self, conn):
+        """Catch up with ``orders``: pick up new open orders, release delivered or missing ones."""
+        known = list(self.orders)
+        still_open = {o for o, in conn.execute(
+            "SELECT orderID FROM orders WHERE delivery_date IS NULL AND orderID IN "
+            "(SELECT value FROM json_each(?))", [json.dumps(known)])}
+        for order_id in known:
+            if order_id not in still_open:
+                self.release(order_id)
+        for order_id, agent in conn.execute(
+                "SELECT orderID, daID FROM orders WHERE orderID > ? AND delivery_date IS NULL",
+                [self.watermark]).fetchall():
+            if agent in self.open and order_id not in self.orders:
+                with self._lock:
+                    self._take(agent, order_id)
+        latest = conn.execute("SELECT MAX(orderID) FROM orders").fetchone()[0]
+        self.watermark = max(self.watermark, latest or 0)
+
+    def refresh_ratings(self, conn, recent=20):
+        """Re-read the recent ratings and rebuild the heaps (O(n log n))."""
+        with self._lock:
+            self.rating.update(recent_ratings(conn, recent))
+            self.mean_rating = sum(self.rating.values()) / len(self.rating) if self.rating else 0.0
+            for agent in self.agents:
+                self._version[agent] += 1
+            self._compact()
+
+    def available(self, agent):
+        return self.max_open is None or self.open[agent] < self.max_open
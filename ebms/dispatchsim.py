@@ -0,0 +1,210 @@
+"""Simulate order dispatch: assignment latency and load spread across delivery agents.
+
+A dataset is loaded into an in-memory SQLite stand-in and every open order is
+delivered, so all agents start idle.  Orders then arrive as a Poisson stream
+from random customers at ``--load`` times the rate the agents can absorb
+(``--load 1`` keeps, on average, one order in flight per agent), and each takes
+an exponentially distributed ``--delivery-minutes`` to deliver.  The same
+arrivals and delivery times are replayed under each policy:
+
+* ``sql``: Simple Query-01's ``availability = 1 ORDER BY daID LIMIT 1`` pick
+  and the ``da_unavailable`` / ``da_available`` triggers, including the
+  ``NOT EXISTS`` scan over ``orders`` on every delivery;
+* ``balanced``: ``ebms.dispatch.Dispatcher`` (``--max-open`` caps the open
+  orders of an agent, ``--affinity-slack`` trades load for a local agent).
+
+Orders that find no agent wait for the next delivery.  Assign and release
+times cover the policy's own work (the pick and keeping ``availability``
+up to date), not the ``orders`` row written in both cases.
+
+    python -m ebms.dispatchsim --scale-factor 1 --orders 20000 --load 0.9
+"""
+
+import argparse
+import heapq
+import json
+import random
+import tempfile
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from . import standin
+from .dispatch import Dispatcher, home_cities
+from .generator import Generator
+
+START = date(2024, 1, 1)
+
+
+class SqlPolicy:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def assign(self, order_id, city):
+        row = self.conn.execute(
+            "SELECT daID FROM delivery_agent WHERE availability = 1 ORDER BY daID ASC LIMIT 1").fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE delivery_agent SET availability = 0 WHERE daID = ?", row)
+        return row[0]
+
+    def release(self, order_id, agent):
+        self.conn.execute("UPDATE delivery_agent SET availability = 1 WHERE daID = ? AND NOT EXISTS "
+                          "(SELECT * FROM orders WHERE daID = ? AND delivery_date IS NULL)", [agent, agent])
+
+
+class BalancedPolicy:
+    def __init__(self, conn, **kwargs):
+        self.conn = conn
+        self.dispatcher = Dispatcher.from_db(conn, **kwargs)
+
+    def assign(self, order_id, city):
+        agent = self.dispatcher.assign(order_id, city)
+        if agent is not None and self.dispatcher.open[agent] == 1:
+            self.conn.execute("UPDATE delivery_agent SET availability = 0 WHERE daID = ?", [agent])
+        return agent
+
+    def release(self, order_id, agent):
+        self.dispatcher.release(order_id)
+        if self.dispatcher.open[agent] == 0:
+            self.conn.execute("UPDATE delivery_agent SET availability = 1 WHERE daID = ?", [agent])
+
+
+def prepare(data_dir):
+    """An in-memory stand-in loaded from ``data_dir`` with every order delivered."""
+    conn = standin.connect()
+    standin.load_csv_dir(conn, data_dir)
+    conn.execute("UPDATE orders SET delivery_date = order_date WHERE delivery_date IS NULL")
+    conn.execute("UPDATE delivery_agent SET availability = 1")
+    conn.execute("ANALYZE")
+    conn.commit()
+    return conn
+
+
+def arrivals(customers, agents, orders, load, delivery_minutes, seed):
+    """``[(minute, customerID, minutes to deliver)]`` for ``orders`` arrivals."""
+    rng = random.Random(seed)
+    rate = load * agents / delivery_minutes
+    t, stream = 0.0, []
+    for _ in range(orders):
+        t += rng.expovariate(rate)
+        stream.append((t, rng.choice(customers), rng.expovariate(1 / delivery_minutes)))
+    return stream
+
+
+def _day(minute):
+    return (START + timedelta(days=int(minute // 1440))).isoformat()
+
+
+def simulate(conn, policy, stream, homes):
+    """Replay ``stream`` under ``policy``; returns the summary."""
+    cities = dict(conn.execute("SELECT c.customerID, a.city FROM customer c "
+                               "JOIN address a ON a.addressID = c.addressID"))
+    agents = [a for a, in conn.execute("SELECT daID FROM delivery_agent")]
+    next_id = conn.execute("SELECT MAX(orderID) FROM orders").fetchone()[0] + 1
+    events = [(t, 0, i) for i, (t, _, _) in enumerate(stream)]  # (minute, 0 arrive / 1 deliver, index)
+    heapq.heapify(events)
+    waiting, order_of, agent_of = deque(), {}, {}
+    assign_ns, release_ns, waits = [], [], []
+    load, open_now, peak = Counter(), Counter(), Counter()
+    local = 0
+
+    def place(i, now):
+        nonlocal local
+        t, customer, minutes = stream[i]
+        t0 = time.perf_counter_ns()
+        agent = policy.assign(order_of[i], cities.get(customer))
+        assign_ns.append(time.perf_counter_ns() - t0)
+        if agent is None:
+            return False
+        conn.execute("INSERT INTO orders (orderID, customerID, daID, order_date) VALUES (?, ?, ?, ?)",
+                     [order_of[i], customer, agent, _day(t)])
+        agent_of[i] = agent
+        load[agent] += 1
+        open_now[agent] += 1
+        peak[agent] = max(peak[agent], open_now[agent])
+        local += homes.get(agent) == cities.get(customer)
+        waits.append(now - t)
+        heapq.heappush(events, (now + minutes, 1, i))
+        return True
+
+    while events:
+        now, kind, i = heapq.heappop(events)
+        if kind == 0:
+            order_of[i] = next_id
+            next_id += 1
+            if waiting or not place(i, now):
+                waiting.append(i)
+            continue
+        agent = agent_of[i]
+        conn.execute("UPDATE orders SET delivery_date = ? WHERE orderID = ?", [_day(now), order_of[i]])
+        t0 = time.perf_counter_ns()
+        policy.release(order_of[i], agent)
+        release_ns.append(time.perf_counter_ns() - t0)
+        open_now[agent] -= 1
+        while waiting and place(waiting[0], now):
+            waiting.popleft()
+    conn.rollback()
+
+    counts = np.array([load[a] for a in agents], dtype=float)
+    assign_us, release_us = np.array(assign_ns) / 1000, np.array(release_ns) / 1000
+    return {
+        "orders": len(stream),
+        "assign_p50_us": float(np.percentile(assign_us, 50)), "assign_p99_us": float(np.percentile(assign_us, 99)),
+        "release_p50_us": float(np.percentile(release_us, 50)),
+        "release_p99_us": float(np.percentile(release_us, 99)),
+        "waited": int(sum(w > 0 for w in waits)), "mean_wait_min": float(np.mean(waits)),
+        "max_over_mean": float(counts.max() / counts.mean()), "cv": float(counts.std() / counts.mean()),
+        "agents_used": float((counts > 0).mean()), "peak_open": max(peak.values()),
+        "affinity": local / len(stream),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--load", type=float, default=0.9, help="orders in flight per agent, on average")
+    parser.add_argument("--delivery-minutes", type=float, default=45.0)
+    parser.add_argument("--max-open", type=int, help="open orders per agent for the balanced policy")
+    parser.add_argument("--affinity-slack", type=int, default=0)
+    parser.add_argument("--policies", default="sql,balanced")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        conn = prepare(data_dir)
+    customers = [c for c, in conn.execute("SELECT customerID FROM customer")]
+    agents = conn.execute("SELECT COUNT(*) FROM delivery_agent").fetchone()[0]
+    stream = arrivals(customers, agents, args.orders, args.load, args.delivery_minutes, args.seed)
+    homes = home_cities(conn)
+
+    report = {}
+    print(f"{'policy':<10}{'assign p50':>11}{'p99 us':>8}{'release p50':>12}{'p99 us':>8}{'waited':>8}"
+          f"{'wait min':>9}{'max/mean':>9}{'cv':>6}{'used':>6}{'peak':>5}{'local':>7}")
+    for name in args.policies.split(","):
+        if name == "sql":
+            policy = SqlPolicy(conn)
+        else:
+            policy = BalancedPolicy(conn, max_open=args.max_open, affinity_slack=args.affinity_slack)
+        r = report[name] = simulate(conn, policy, stream, homes)
+        print(f"{name:<10}{r['assign_p50_us']:>11.1f}{r['assign_p99_us']:>8.1f}{r['release_p50_us']:>12.1f}"
+              f"{r['release_p99_us']:>8.1f}{r['waited']:>8}{r['mean_wait_min']:>9.2f}{r['max_over_mean']:>9.2f}"
+              f"{r['cv']:>6.2f}{100 * r['agents_used']:>5.0f}%{r['peak_open']:>5}{100 * r['affinity']:>6.1f}%")
+    conn.close()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
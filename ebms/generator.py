@@ -0,0 +1,454 @@
+"""Scale-factor driven generator for the EBMS dataset.
+
+Replaces the per-row ``random`` loops of ``generator.ipynb`` with batched NumPy
+sampling.  Every table is produced in fixed-size chunks that are written to CSV
+as soon as they are sampled, so memory stays flat as the scale factor grows.
+Names, places, product names and review texts are drawn from the hand-made CSVs
+in ``Database-Generation/Data``; scale factor 1 reproduces their row counts
+(200 customers, 1,000 orders, ~5.5k order lines).
+
+Shards are generated on a process pool and merged by streaming concatenation;
+each worker holds one shard at a time, so memory is bounded by
+``--workers`` x ``--chunk-rows`` whatever the scale factor.
+
+    python -m ebms.generator --scale-factor 100 --seed 7 --out generated/sf-100
+    python -m ebms.generator --scale-factor 20000 --workers 16 --sql multirow
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import string
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from . import changelog, csvio, derived, instrument, population
+from .tables import DATA_DIR, LOAD_ORDER, TABLES
+
+ADMINS = [(1, "dvgt", "dvgt1234"), (2, "mhrk", "mhrk1234")]
+LETTERS = np.array(list(string.ascii_uppercase))
+
+# Stream numbers for the per-table random generators; a table's output only
+# depends on the seed, the scale factor and its own stream.
+STREAMS = {
+    "phone_number": 1, "address": 2, "supplier": 3, "customer": 4,
+    "delivery_agent": 5, "product": 6, "popularity": 7, "orders": 8,
+    "product_review": 9, "da_review": 10, "cart": 11,
+}
+
+
+@dataclass(frozen=True)
+class Counts:
+    """Row counts for one scale factor."""
+
+    customer: int
+    supplier: int
+    delivery_agent: int
+    product: int
+    orders: int
+    product_review: int
+    da_review: int
+
+    @classmethod
+    def from_scale(cls, scale_factor):
+        def n(base):
+            return max(1, round(base * scale_factor))
+
+        return cls(
+            customer=n(200), supplier=n(200), delivery_agent=n(200), product=n(200),
+            orders=n(1000), product_review=n(200), da_review=n(200),
+        )
+
+    @property
+    def address(self):
+        return self.customer + self.supplier
+
+    @property
+    def phone_number(self):
+        return self.customer + self.delivery_agent
+
+
+class Vocabulary:
+    """String pools sampled by the generator, read from the seed CSVs."""
+
+    def __init__(self, data_dir=DATA_DIR):
+        def rows(table):
+            with open(Path(data_dir) / f"{table}.csv", newline="") as f:
+                return list(csv.DictReader(f))
+
+        people = rows("customer") + rows("supplier") + rows("delivery_agent")
+        self.first_names = _pool((r["first_name"] for r in people), str)
+        self.last_names = _pool(r["last_name"] for r in people)
+        self.handles = np.array(["".join(c for c in name.lower() if c.isalnum()) for name in self.last_names])
+        self.domains = _pool((r["email"].partition("@")[2] for r in people), str)
+
+        addresses = rows("address")
+        self.streets = _pool(r["street_name"] for r in addresses)
+        places = sorted({(r["city"], r["state"], r["country"]) for r in addresses})
+        self.cities, self.states, self.countries = (np.array(col, dtype=object) for col in zip(*places))
+
+        products = sorted(rows("product"), key=lambda r: int(r["productID"]))
+        self.product_names = np.array([r["name"] for r in products])
+        self.descriptions = _pool(r["product_description"] for r in products)
+        self.reviews = _pool(r["content"] for r in rows("product_review") + rows("da_review"))
+
+
+def _pool(values, dtype=object):
+    # Object arrays keep long texts as shared references instead of wide fixed-size copies.
+    return np.array(sorted(set(values)), dtype=dtype)
+
+
+def _ranges(n, chunk_rows):
+    """1-based ``[start, stop)`` ID ranges covering ``1..n``."""
+    for start in range(1, n + 1, chunk_rows):
+        yield start, min(start + chunk_rows, n + 1)
+
+
+def _hex(rng, n, nbytes=20):
+    raw = rng.integers(0, 256, (n, nbytes), dtype=np.uint8).tobytes().hex().encode()
+    return np.frombuffer(raw, dtype=f"S{2 * nbytes}").astype(str)
+
+
+def _cdf(weights):
+    cdf = np.cumsum(weights, dtype=np.float64)
+    return cdf / cdf[-1]
+
+
+class Generator:
+    """Generate all 13 EBMS tables as CSV files for one scale factor and seed.
+
+    Tables are cut into ID-range shards of ``chunk_rows`` rows.  Every shard
+    draws from its own generator seeded with ``(seed, table stream, shard)``,
+    so the output does not depend on how many workers produce the shards.
+    """
+
+    def __init__(self, scale_factor=1.0, seed=42, chunk_rows=100_000, start="2020-01-01",
+                 end="2022-12-31", zipf=0.8, delivered=0.5, vocabulary=None):
+        self.params = dict(scale_factor=scale_factor, seed=seed, chunk_rows=chunk_rows, start=start,
+                           end=end, zipf=zipf, delivered=delivered)
+        self.scale_factor = scale_factor
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+        self.counts = Counts.from_scale(scale_factor)
+        self.zipf = zipf
+        self.delivered = delivered
+        self.vocab = vocabulary or Vocabulary()
+        self.days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+        self.day_cdf = _cdf(self.seasonality(self.days))
+
+        # Product popularity: Zipf-like weights over a random ranking of products.
+        rng = self.rng("popularity")
+        self.by_rank = rng.permutation(self.counts.product) + 1
+        self.rank_cdf = _cdf(1.0 / np.arange(1, self.counts.product + 1) ** zipf)
+
+    def rng(self, stream, shard=0):
+        return np.random.default_rng([self.seed, STREAMS[stream], shard])
+
+    @staticmethod
+    def seasonality(days):
+        """Relative order volume per day: growth trend, December peak, busier weekends."""
+        t = np.linspace(0.0, 1.0, len(days))
+        day_of_year = (days - days.astype("datetime64[Y]")).astype(int)
+        weekday = (days.astype(int) + 3) % 7
+        annual = 1.0 + 0.3 * np.cos(2 * np.pi * (day_of_year - 350) / 365.25)
+        weekly = np.where(weekday >= 5, 1.15, 1.0)
+        return (1.0 + 0.5 * t) * annual * weekly
+
+    def popular_products(self, rng, n):
+        """Sample ``n`` productIDs following the Zipf-like popularity."""
+        return self.by_rank[np.searchsorted(self.rank_cdf, rng.random(n), side="right")]
+
+    # Entity tables; every ``*_shard`` method returns ``{table: columns}`` for IDs ``start..stop-1``
+
+    def people(self, rng, ids):
+        n = len(ids)
+        v = self.vocab
+        first = v.first_names[rng.integers(0, len(v.first_names), n)]
+        last_idx = rng.integers(0, len(v.last_names), n)
+        local = np.char.add(np.char.add(np.char.lower(first.astype("U1")), v.handles[last_idx]), (ids - 1).astype(str))
+        email = np.char.add(np.char.add(local, "@"), v.domains[rng.integers(0, len(v.domains), n)])
+        return first, LETTERS[rng.integers(0, 26, n)], v.last_names[last_idx], email, _hex(rng, n)
+
+    def admin_shard(self, shard, start, stop):
+        return {"admin": [list(col) for col in zip(*ADMINS)]}
+
+    def phone_number_shard(self, shard, start, stop):
+        rng = self.rng("phone_number", shard)
+        ids = np.arange(start, stop)
+        return {"phone_number": [ids, rng.integers(6_000_000_000, 10_000_000_000, len(ids))]}
+
+    def address_shard(self, shard, start, stop):
+        rng = self.rng("address", shard)
+        v = self.vocab
+        ids = np.arange(start, stop)
+        n = len(ids)
+        place = rng.integers(0, len(v.cities), n)
+        return {"address": [
+            ids, v.streets[rng.integers(0, len(v.streets), n)], rng.integers(1, 100_000, n),
+            v.cities[place], v.states[place], np.char.zfill(rng.integers(0, 1_000_000, n).astype(str), 6),
+            v.countries[place],
+        ]}
+
+    def supplier_shard(self, shard, start, stop):
+        rng = self.rng("supplier", shard)
+        ids = np.arange(start, stop)
+        first, middle, last, email, pwd = self.people(rng, ids)
+        return {"supplier": [ids, first, middle, last, self.counts.customer + ids, email, pwd]}
+
+    def customer_shard(self, shard, start, stop):
+        """Customers together with their wallets, whose UPI IDs derive from the email."""
+        rng = self.rng("customer", shard)
+        ids = np.arange(start, stop)
+        first, middle, last, email, pwd = self.people(rng, ids)
+        age = rng.integers(18, 61, len(ids))
+        return {
+            "customer": [ids, first, middle, last, ids, age, ids, email, pwd],
+            "wallet": derived.wallets(rng, ids, email),
+        }
+
+    def delivery_agent_shard(self, shard, start, stop):
+        rng = self.rng("delivery_agent", shard)
+        ids = np.arange(start, stop)
+        first, middle, last, email, pwd = self.people(rng, ids)
+        available = np.where(rng.random(len(ids)) < 0.5, "true", "false")
+        return {"delivery_agent": [ids, first, middle, last, available, self.counts.customer + ids, email, pwd]}
+
+    def product_shard(self, shard, start, stop):
+        rng = self.rng("product", shard)
+        v = self.vocab
+        base = len(v.product_names)
+        ids = np.arange(start, stop)
+        n = len(ids)
+        # The first products keep the catalogue names; the rest are model variants.
+        name = v.product_names[(ids - 1) % base]
+        variant = ids > base
+        name = np.where(variant, np.char.add(np.char.add(name, " Model "), ((ids - 1) // base).astype(str)), name)
+        cents = np.maximum(np.round(rng.lognormal(8.5, 1.6, n)), 1).astype(np.int64) * 100
+        cents = np.minimum(cents, 99_999_999)
+        return {"product": [
+            ids, name, rng.integers(1, self.counts.supplier + 1, n), derived.money(cents),
+            rng.integers(50_000, 80_001, n), v.descriptions[rng.integers(0, len(v.descriptions), n)],
+        ]}
+
+    def cart_shard(self, shard, start, stop):
+        rng = self.rng("cart", shard)
+        return {"cart": derived.carts(rng, np.arange(start, stop), self.popular_products)}
+
+    # Orders, order lines and reviews
+
+    def order_shard(self, shard, start, stop):
+        """Orders and their lines.
+
+        Review candidates are sampled from the shard's delivered lines on the way
+        and returned under the ``review_candidates`` key (not a table).
+        """
+        c = self.counts
+        rng = self.rng("orders", shard)
+        review_rng = self.rng("product_review", shard)
+        da_review_rng = self.rng("da_review", shard)
+        delivered_orders = max(c.orders * self.delivered, 1.0)
+        # Oversample so that enough candidates survive (customerID, key) deduplication.
+        p_product = min(1.0, 1.2 * c.product_review / (delivered_orders * 5.5))
+        p_da = min(1.0, 1.2 * c.da_review / delivered_orders)
+
+        ids = np.arange(start, stop)
+        n = len(ids)
+        # Stratified inverse-CDF sampling keeps order dates non-decreasing in orderID.
+        u = (ids - 1 + rng.random(n)) / c.orders
+        order_date = self.days[np.minimum(np.searchsorted(self.day_cdf, u, side="right"), len(self.days) - 1)]
+        customer = rng.integers(1, c.customer + 1, n)
+        agent = rng.integers(1, c.delivery_agent + 1, n)
+        delivered = rng.random(n) < self.delivered
+        delivery_date = order_date + rng.integers(1, 16, n).astype("timedelta64[D]")
+
+        lines = rng.integers(1, 11, n)
+        line_order = np.repeat(ids, lines)
+        line_product = self.popular_products(rng, len(line_order))
+        # Drop repeated products within an order (PRIMARY KEY (orderID, productID)).
+        _, keep = np.unique(line_order * (c.product + 1) + line_product, return_index=True)
+        line_order, line_product = line_order[keep], line_product[keep]
+        quantity = rng.integers(5, 21, len(line_order))
+
+        line_idx = line_order - start
+        pick = delivered[line_idx] & (review_rng.random(len(line_idx)) < p_product)
+        idx = line_idx[pick]
+        da_pick = delivered & (da_review_rng.random(n) < p_da)
+        da_date = delivery_date[da_pick] + da_review_rng.integers(5, 16, da_pick.sum()).astype("timedelta64[D]")
+        return {
+            "orders": [ids, customer, agent, order_date.astype(str),
+                       np.where(delivered, delivery_date.astype(str), "")],
+            "order_product": [line_order, line_product, quantity],
+            "review_candidates": {
+                "product_review": (customer[idx], line_product[pick], delivery_date[idx]),
+                "da_review": (customer[da_pick], agent[da_pick], da_date),
+            },
+        }
+
+    def review_table(self, table, candidates):
+        """Deduplicate the shards' candidates on (customerID, key) and attach ratings and texts."""
+        rng = self.rng(table)
+        customer, key, date = (np.concatenate(col) for col in zip(*candidates))
+        picked = derived.distinct_sample(rng, derived.pair_keys(customer, key), getattr(self.counts, table))
+        return derived.review_columns(rng, customer[picked], key[picked], date[picked], self.vocab.reviews)
+
+    # Output
+
+    def shard_groups(self):
+        """``(shard function, rows)`` for every sharded table group, in load order."""
+        c = self.counts
+        return [
+            (self.admin_shard, len(ADMINS)), (self.phone_number_shard, c.phone_number),
+            (self.address_shard, c.address), (self.supplier_shard, c.supplier),
+            (self.customer_shard, c.customer), (self.delivery_agent_shard, c.delivery_agent),
+            (self.product_shard, c.product), (self.order_shard, c.orders), (self.cart_shard, c.customer),
+        ]
+
+    def tasks(self):
+        for fn, rows in self.shard_groups():
+            for shard, (start, stop) in enumerate(_ranges(rows, self.chunk_rows)):
+                yield fn.__name__, shard, start, stop
+
+    def write_csv(self, out_dir, workers=1, sql=None, batch_size=1000, log=None):
+        """Write every table to ``out_dir/<table>.csv``; returns ``{table: rows}``.
+
+        Shards are written to part files by ``workers`` processes and then merged
+        by streaming concatenation.  With ``sql`` (``"rows"`` or ``"multirow"``)
+        the shards also render their INSERT statements, which are merged into
+        ``out_dir/Data-Population/<table>.sql`` and ``out_dir/data-population.sql``.
+        With ``log`` (an ``ebms.changelog.ChangeLog``) the rows of the logged
+        tables are appended to it as inserts, in load order.
+        """
+        out_dir = Path(out_dir)
+        parts_dir = out_dir / ".parts"
+        parts_dir.mkdir(parents=True, exist_ok=True)
+        options = (str(parts_dir), sql, batch_size)
+        tasks = [task + options for task in self.tasks()]
+        parts, candidates = {}, {"product_review": [], "da_review": []}
+
+        with instrument.stage("generate.shards", workers=workers):
+            if workers > 1:
+                with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self.params,)) as pool:
+                    results = list(pool.map(_run_task, tasks))
+            else:
+                _init_worker(self.params, self)
+                results = [_run_task(task) for task in tasks]
+        for shard_parts, shard_candidates in results:
+            for table, part in shard_parts.items():
+                parts.setdefault(table, []).append(part)
+            for table, columns in (shard_candidates or {}).items():
+                candidates[table].append(columns)
+
+        for table, shards in candidates.items():
+            with instrument.stage("generate.review", table=table) as s:
+                parts[table] = [_write_part(parts_dir / f"{table}-000000", table, self.review_table(table, shards),
+                                            sql, batch_size)]
+                s.add_rows(parts[table][0][1])
+
+        written = {}
+        sql_dir = out_dir / "Data-Population"
+        if sql:
+            sql_dir.mkdir(exist_ok=True)
+        for table in LOAD_ORDER:
+            written[table] = sum(rows for _, rows in parts[table])
+            with instrument.stage("generate.merge", table=table) as s:
+                _merge([stem for stem, _ in parts[table]], out_dir / f"{table}.csv", ".csv",
+                       ",".join(TABLES[table]) + "\r\n")
+                if sql:
+                    _merge([stem for stem, _ in parts[table]], sql_dir / f"{table}.sql", ".sql", "USE EBMS;\n\n")
+                s.add_rows(written[table])
+        if sql:
+            population.combine(sql_dir, out_dir / "data-population.sql")
+        shutil.rmtree(parts_dir)
+        if log is not None:
+            for table in LOAD_ORDER:
+                if table in changelog.LOGGED:
+                    log.append_csv(table, out_dir / f"{table}.csv")
+        return written
+
+
+# Process-pool workers build their own Generator once and then run shards.
+_worker = None
+
+
+def _init_worker(params, generator=None):
+    global _worker
+    if generator is None:  # a pool process: a forked copy of the parent's tracer would only be discarded
+        instrument.disable()
+    _worker = generator or Generator(**params)
+
+
+def _run_task(task):
+    name, shard, start, stop, parts_dir, sql, batch_size = task
+    with instrument.stage(f"generate.{name}") as s:
+        result = getattr(_worker, name)(shard, start, stop)
+        candidates = result.pop("review_candidates", None)
+        parts = {table: _write_part(Path(parts_dir) / f"{table}-{shard:06d}", table, columns, sql, batch_size)
+                 for table, columns in result.items()}
+        s.add_rows(sum(rows for _, rows in parts.values()))
+    return parts, candidates
+
+
+def _write_part(stem, table, columns, sql, batch_size):
+    """Write one shard as a headerless CSV part (and SQL part); returns ``(stem, rows)``."""
+    cols = csvio.to_lists(columns)
+    with open(f"{stem}.csv", "w", newline="") as f:
+        csv.writer(f).writerows(zip(*cols))
+    if sql:
+        with open(f"{stem}.sql", "w") as f:
+            f.writelines(population.insert_statements(zip(*cols), table, sql, batch_size))
+    return str(stem), len(cols[0])
+
+
+def _merge(stems, path, suffix, header):
+    with open(path, "w", newline="") as out:
+        out.write(header)
+        for stem in stems:
+            with open(stem + suffix, newline="") as part:
+                shutil.copyfileobj(part, out)
+            os.remove(stem + suffix)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale-factor", type=float, default=1.0, help="1 = 200 customers and 1,000 orders")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="output directory (default: generated/sf-<scale>)")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="rows per shard")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="generator processes")
+    parser.add_argument("--memory-mb", type=int, default=None,
+                        help="cap workers so that about workers x shard footprint fits this budget")
+    parser.add_argument("--sql", choices=("rows", "multirow"), default=None,
+                        help="also write Data-Population/*.sql and data-population.sql")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT for --sql multirow")
+    parser.add_argument("--start", default="2020-01-01", help="first order date")
+    parser.add_argument("--end", default="2022-12-31", help="last order date")
+    parser.add_argument("--zipf", type=float, default=0.8, help="product popularity exponent")
+    parser.add_argument("--delivered", type=float, default=0.5, help="share of delivered orders")
+    parser.add_argument("--changelog", help="also append the logged tables' rows to this change log directory")
+    args = parser.parse_args(argv)
+
+    workers = args.workers
+    if args.memory_mb:
+        workers = max(1, min(workers, args.memory_mb // shard_footprint_mb(args.chunk_rows)))
+    out = args.out or f"generated/sf-{args.scale_factor:g}"
+    generator = Generator(args.scale_factor, args.seed, args.chunk_rows, args.start, args.end,
+                          args.zipf, args.delivered)
+    log = changelog.ChangeLog(args.changelog) if args.changelog else None
+    for table, rows in generator.write_csv(out, workers, args.sql, args.batch_size, log).items():
+        print(f"Generated {table}.csv ({rows} rows)")
+    if log is not None:
+        print(f"Logged up to offset {log.next_offset} in {args.changelog}")
+        log.close()
+
+
+def shard_footprint_mb(chunk_rows):
+    """Rough peak memory of one worker: the interpreter plus ~1 KB per shard row."""
+    return 60 + chunk_rows // 1000
+
+
+if __name__ == "__main__":
+    main()
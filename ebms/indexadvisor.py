@@ -0,0 +1,339 @@
+"""Check the indexes of ``database-schema.sql`` against the queries that use them.
+
+Every statement of the ``Sql Queries`` files (see ``ebms.queryfiles``) is
+planned with ``EXPLAIN QUERY PLAN`` on the SQLite stand-in, loaded with
+generated data and ``ANALYZE``d.  The report lists
+
+* full scans: tables a plan reads end to end, or builds a temporary index over;
+* missing indexes: for a scanned table that a statement filters with equality
+  or ``IS NULL`` predicates, an index over those columns is created, and kept
+  when the planner searches it without scanning another table instead;
+* unused indexes: schema indexes no plan uses, that repeat (a prefix of) a key,
+  or whose uniqueness a narrower key already implies;
+* schema problems: indexes on columns the table does not have, and statements
+  SQLite cannot prepare.
+
+Rows are estimated per execution of a plan step from ``sqlite_stat1``: a scan
+reads the whole table, an index search the average rows per key prefix.
+
+    python -m ebms.indexadvisor --scale-factor 10 --json index-report.json
+"""
+
+import argparse
+import difflib
+import json
+import re
+import sqlite3
+import tempfile
+import warnings
+from collections import namedtuple
+from pathlib import Path
+
+from . import queryfiles, standin
+from .generator import Generator
+from .schema import load_schema
+from .tables import QUERIES_DIR, TABLES, sql_columns
+
+Step = namedtuple("Step", "alias table full index terms detail")
+Planned = namedtuple("Planned", "query sql aliases steps rows")
+
+_STEP = re.compile(r"(SCAN|SEARCH) (\w+)(?: USING (AUTOMATIC )?(?:COVERING |PARTIAL )*"
+                   r"(?:INDEX ?(\w*)|INTEGER PRIMARY KEY|PRIMARY KEY))?\s*(?:\((.*?)\))?")
+_PREDICATE = re.compile(
+    r"\b(?:WHERE|ON|AND)\s+\(?\s*(?:(\w+)\.)?(\w+)\s*"
+    r"(?:=\s*(?:(\w+)\.(\w+)\b|\?|-?\d|'|\(|TRUE\b|FALSE\b)|(IS\s+NULL\b))", re.I)
+_KEYWORDS = ("AS", "CROSS", "FROM", "GROUP", "HAVING", "INNER", "JOIN", "LEFT", "LIMIT", "ON", "ORDER",
+             "RIGHT", "SELECT", "SET", "UNION", "USING", "VALUES", "WHERE")
+_SOURCE = re.compile(r"(?:\bFROM|\bJOIN|\bUPDATE|\bINTO|,)\s+(\w+)"
+                     rf"(?:\s+(?:AS\s+)?(?!(?:{'|'.join(_KEYWORDS)})\b)(\w+))?", re.I)
+
+
+def planned_name(index):
+    """Name of a schema index on the stand-in (see ``standin.mysql_to_sqlite``)."""
+    return f"{index.name}_idx" if index.name in TABLES else index.name
+
+
+def table_aliases(sql):
+    """``{alias: table}`` for every table the statement reads or writes, in text order."""
+    found = {}
+    for m in _SOURCE.finditer(sql):
+        table, alias = m.group(1), m.group(2)
+        if table in TABLES:
+            found.setdefault(alias or table, table)
+    return found
+
+
+def predicates(sql, aliases):
+    """``{alias: (equal, joined, null)}`` column lists filtered in ``WHERE``/``ON`` clauses.
+
+    A column joined to one compared with a constant counts as compared with it.
+    """
+    def resolve(qualifier, column):
+        if qualifier:
+            return (qualifier, column) if qualifier in aliases else None
+        return next(((a, column) for a, t in aliases.items() if column in sql_columns(t)), None)
+
+    equal, null, joins = [], [], []
+    for m in _PREDICATE.finditer(sql):
+        left = resolve(m.group(1), m.group(2))
+        if left is None:
+            continue
+        if m.group(5):
+            null.append(left)
+        elif m.group(4):
+            right = resolve(m.group(3), m.group(4))
+            if right:
+                joins.append((left, right))
+        else:
+            equal.append(left)
+    changed = True
+    while changed:
+        changed = False
+        for a, b in joins:
+            for x, y in ((a, b), (b, a)):
+                if y in equal and x not in equal:
+                    equal.append(x)
+                    changed = True
+    joined = [x for pair in joins for x in pair if x not in equal]
+    found = {}
+    for alias in aliases:
+        columns = [[c for a, c in group if a == alias] for group in (equal, joined, null)]
+        if any(columns):
+            found[alias] = tuple(list(dict.fromkeys(c)) for c in columns)
+    return found
+
+
+def explain(conn, sql, aliases):
+    steps = []
+    for _, _, _, detail in conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?")):
+        m = _STEP.match(detail)
+        if m and m.group(2) in aliases:
+            steps.append(Step(m.group(2), aliases[m.group(2)], m.group(1) == "SCAN" or bool(m.group(3)),
+                              m.group(4) or None, m.group(5) or "", detail))
+    return steps
+
+
+def load_stats(conn):
+    """``{index: [rows, rows per 1-column prefix, ...]}`` from ``sqlite_stat1``."""
+    return {idx: [int(n) for n in stat.split() if n.isdigit()]
+            for idx, stat in conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL")}
+
+
+def step_rows(step, stats, counts):
+    """Estimated rows one execution of a plan step reads."""
+    if step.full:
+        return counts[step.table]
+    if step.index is None or not step.terms:
+        return 1  # rowid lookup, or min()/max() read from the end of an index
+    k = len(re.findall(r"\w+=\?", step.terms))
+    stat = stats.get(step.index)
+    if not k or not stat:
+        return max(counts[step.table] // 4, 1)
+    return stat[min(k, len(stat) - 1)]
+
+
+def index_columns(conn):
+    """``{table: [columns, ...]}`` of every index on the stand-in, constraint indexes included."""
+    found = {}
+    for table in TABLES:
+        for row in conn.execute(f"PRAGMA index_list({table})"):
+            columns = tuple(r[2] for r in conn.execute(f"PRAGMA index_info({row[1]})"))
+            found.setdefault(table, []).append(columns)
+    return found
+
+
+def plan_all(conn, queries):
+    """``(planned, errors, counts)``: baseline plans of the statements SQLite can prepare."""
+    stats = load_stats(conn)
+    counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in TABLES}
+    planned, errors = [], []
+    for query in queries:
+        sql = queryfiles.to_sqlite(queryfiles.bind(query.sql))
+        aliases = table_aliases(sql)
+        try:
+            steps = explain(conn, sql, aliases)
+        except sqlite3.Error as e:
+            errors.append({"statement": f"{query.source} {query.label}", "error": str(e)})
+            continue
+        rows = {}
+        for step in steps:
+            rows[step.alias] = rows.get(step.alias, 0) + step_rows(step, stats, counts)
+        planned.append(Planned(query, sql, aliases, steps, rows))
+    return planned, errors, counts
+
+
+def schema_findings(tables, indexes):
+    """``(problems, redundant)``: indexes on missing columns, and indexes a key makes redundant."""
+    problems, redundant = [], {}
+    for index in indexes:
+        table = tables[index.table]
+        names = [c.name for c in table.columns]
+        missing = [c for c in index.columns if c not in names]
+        for column in missing:
+            close = difflib.get_close_matches(column, names, 1)
+            problems.append({"index": index.name, "table": index.table, "problem":
+                             f"no column {column}" + (f" (did you mean {close[0]}?)" if close else "")})
+        if missing:
+            continue
+        keys = [("PRIMARY KEY", table.primary_key, True)] + [("UNIQUE", u, True) for u in table.unique]
+        keys += [(o.name, o.columns, o.unique) for o in indexes if o is not index and o.table == index.table]
+        for name, columns, unique in keys:
+            described = f"{name} ({', '.join(columns)})"
+            if not columns:
+                continue
+            if columns == index.columns:
+                redundant[index.name] = f"duplicates {described}"
+            elif columns[:len(index.columns)] == index.columns and not index.unique:
+                redundant[index.name] = f"is a prefix of {described}"
+            elif index.unique and unique and set(columns) < set(index.columns):
+                redundant[index.name] = f"{described} already makes it unique"
+            else:
+                continue
+            break
+    return problems, redundant
+
+
+def candidates(entry):
+    """``(table, columns)`` indexes that could replace the full scans of one statement."""
+    filters = predicates(entry.sql, entry.aliases)
+    for step in entry.steps:
+        if not step.full or step.alias not in filters:
+            continue
+        equal, joined, null = filters[step.alias]
+        if equal or null:
+            yield step.table, tuple(equal + null)
+        else:
+            for column in joined:
+                yield step.table, (column,)
+
+
+def advise(conn, planned, tables, counts):
+    """Try the candidate indexes together; returns the ones the planner uses, best first."""
+    existing = index_columns(conn)
+    proposed = []
+    for entry in planned:
+        for table, columns in candidates(entry):
+            served = any(cols[:len(columns)] == columns for cols in existing.get(table, ()))
+            if not served and (table, columns) not in proposed:
+                proposed.append((table, columns))
+    proposed = [(t, c) for t, c in proposed
+                if not any(t == t2 and c2 != c and c2[:len(c)] == c for t2, c2 in proposed)]
+    trial = {f"advise_{i}": key for i, key in enumerate(proposed)}
+    for name, (table, columns) in trial.items():
+        conn.execute(f"CREATE INDEX {name} ON {table}({', '.join(columns)})")
+    conn.execute("ANALYZE")
+    stats = load_stats(conn)
+    found = {name: [] for name in trial}
+    for entry in planned:
+        after = explain(conn, entry.sql, entry.aliases)
+        if {s.alias for s in after if s.full} - {s.alias for s in entry.steps if s.full}:
+            continue
+        for step in after:
+            if step.index in trial:
+                rows = sum(step_rows(s, stats, counts) for s in after if s.alias == step.alias)
+                saved = entry.rows.get(step.alias, 0) - rows
+                if saved > 0:
+                    found[step.index].append({"statement": f"{entry.query.source} {entry.query.label}",
+                                              "rows_before": entry.rows[step.alias], "rows_after": rows})
+    for name in trial:
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("ANALYZE")
+
+    missing = []
+    for name, uses in found.items():
+        if not uses:
+            continue
+        table, columns = trial[name]
+        entry = {
+            "table": table, "columns": list(columns),
+            "sql": f"CREATE INDEX {table}_{'_'.join(columns)} ON {table}({', '.join(columns)});",
+            "rows_saved": sum(u["rows_before"] - u["rows_after"] for u in uses), "statements": uses,
+        }
+        for fk_columns, _, _ in tables[table].foreign_keys:
+            if list(columns[:len(fk_columns)]) == fk_columns:
+                entry["note"] = ("InnoDB already indexes this foreign key" if len(columns) == len(fk_columns)
+                                 else f"extends InnoDB's implicit index on the foreign key ({', '.join(fk_columns)})")
+        missing.append(entry)
+    return sorted(missing, key=lambda m: -m["rows_saved"])
+
+
+def report(conn, queries, schema_path=standin.SCHEMA_PATH):
+    """Run every check on a loaded stand-in; returns the report as a dict."""
+    tables, indexes = load_schema(schema_path)
+    conn.execute("ANALYZE")
+    planned, errors, counts = plan_all(conn, queries)
+    problems, redundant = schema_findings(tables, indexes)
+    broken = {p["index"] for p in problems}
+
+    used = {}
+    for entry in planned:
+        for step in entry.steps:
+            used.setdefault(step.index, []).append(f"{entry.query.source} {entry.query.label}")
+    unused = []
+    for index in indexes:
+        uses = used.get(planned_name(index), [])
+        if not uses or index.name in redundant:
+            unused.append({"index": index.name, "table": index.table, "columns": index.columns,
+                           "used_by": len(uses), "reason": "cannot be created" if index.name in broken
+                           else redundant.get(index.name, "no plan uses it")})
+    full_scans = [{"statement": f"{e.query.source} {e.query.label}", "table": s.table,
+                   "rows": counts[s.table], "plan": s.detail}
+                  for e in planned for s in e.steps if s.full]
+    return {
+        "statements": len(queries), "rows": counts,
+        "schema_problems": problems, "errors": errors, "full_scans": full_scans,
+        "missing_indexes": advise(conn, planned, tables, counts), "unused_indexes": unused,
+    }
+
+
+def print_report(result):
+    print(f"{result['statements']} statements, {len(result['errors'])} could not be prepared\n")
+    print("Schema problems")
+    for p in result["schema_problems"]:
+        print(f"  index {p['index']} on {p['table']}: {p['problem']}")
+    for e in result["errors"]:
+        print(f"  {e['statement']}: {e['error']}")
+    print("\nFull scans (rows read per execution)")
+    for s in result["full_scans"]:
+        print(f"  {s['statement']:<32}{s['table']:<16}{s['rows']:>10}  {s['plan']}")
+    print("\nMissing indexes (estimated rows saved per execution)")
+    for m in result["missing_indexes"]:
+        note = f"  [{m['note']}]" if "note" in m else ""
+        print(f"  {m['sql']:<64}{m['rows_saved']:>10}{note}")
+        for use in m["statements"]:
+            print(f"      {use['statement']:<30}{use['rows_before']:>10} -> {use['rows_after']}")
+    print("\nUnused or redundant indexes")
+    for u in result["unused_indexes"]:
+        used = f"used by {u['used_by']} statements" if u["used_by"] else "unused"
+        print(f"  {u['index']} ON {u['table']}({', '.join(u['columns'])}): {used}; {u['reason']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--queries", default=str(QUERIES_DIR), help="directory with the query files")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # indexes SQLite cannot create are reported below
+        conn = standin.connect()
+    queryfiles.register_functions(conn)
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        standin.load_csv_dir(conn, data_dir)
+    result = report(conn, queryfiles.read_all(args.queries))
+    conn.close()
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Per-stage wall time, CPU time, peak memory and rows/s for the generator, loaders and reports.
+
+The tooling calls ``stage`` around its steps (every table the generator
+writes, every table ``ebms.standin`` loads and the index build, every
+``ebms.olap`` report) and ``traced`` on whole functions::
+
+    with instrument.stage("load", table=table) as s:
+        ...
+        s.add_rows(n)
+
+Nothing is recorded until ``enable`` is called: ``stage`` then returns one
+shared no-op object, which costs a global lookup and a call.  Once enabled,
+each stage records its wall time, the CPU time of its thread, the rows it
+reports and, with ``memory=True``, the peak of ``tracemalloc`` above the
+memory in use when it started (``tracemalloc`` slows Python code down a lot,
+so it is off by default).  Stages nest per thread.  Work done in other
+processes (``--workers`` pools) is only seen as the wall time of the stage
+that waits for it.
+
+``write_json`` writes the stages as a flat list, ``write_speedscope`` as an
+evented profile per thread for https://www.speedscope.app, and ``summary``
+totals them per name.  Any CLI of the package can be run traced:
+
+    python -m ebms.instrument --json trace.json --speedscope trace.speedscope.json -- ebms.generator --scale-factor 10
+    python -m ebms.instrument --memory -- ebms.olap --snapshot generated/sf-100/columnar --query 2
+"""
+
+import argparse
+import functools
+import importlib
+import json
+import threading
+import time
+import tracemalloc
+
+_tracer = None
+
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_rows(self, n):
+        pass
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _Noop()
+
+
+class Stage:
+    """One recorded stage; returned by ``stage`` while tracing is enabled."""
+
+    __slots__ = ("tracer", "name", "attrs", "rows", "id", "parent", "thread", "start", "end", "cpu",
+                 "_cpu0", "_base", "peak")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.rows = 0
+        self.peak = None
+
+    def add_rows(self, n):
+        self.rows += int(n)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.tracer._open(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer._close(self)
+        return False
+
+    @property
+    def wall(self):
+        return self.end - self.start
+
+    def record(self):
+        rate = self.rows / self.wall if self.rows and self.wall > 0 else None
+        return {"id": self.id, "parent": self.parent, "thread": self.thread, "name": self.name,
+                "attrs": self.attrs, "start_s": self.start, "wall_s": self.wall, "cpu_s": self.cpu,
+                "peak_bytes": self.peak, "rows": self.rows, "rows_per_s": rate}
+
+
+class Tracer:
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.origin = time.perf_counter()
+        self.stages = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _open(self, stage):
+        stack = self._stack()
+        with self._lock:
+            stage.id = len(self.stages)
+            self.stages.append(stage)
+        stage.parent = stack[-1].id if stack else None
+        stage.thread = threading.current_thread().name
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:  # the peak is about to be reset, so the enclosing stage takes it now
+                stack[-1].peak = max(stack[-1].peak or 0, peak - stack[-1]._base)
+            tracemalloc.reset_peak()
+            stage._base = current
+        stack.append(stage)
+        stage._cpu0 = time.thread_time()
+        stage.start = time.perf_counter() - self.origin
+
+    def _close(self, stage):
+        stage.end = time.perf_counter() - self.origin
+        stage.cpu = time.thread_time() - stage._cpu0
+        stack = self._stack()
+        stack.pop()
+        if self.memory:
+            _, peak = tracemalloc.get_traced_memory()
+            stage.peak = max(stage.peak or 0, peak - stage._base)
+            if stack:
+                stack[-1].peak = max(stack[-1].peak or 0, peak - stack[-1]._base)
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def records(self):
+        """The finished stages, in the order they started."""
+        return [s.record() for s in self.stages if hasattr(s, "end") and hasattr(s, "cpu")]
+
+
+def enable(memory=False):
+    """Start recording; returns the ``Tracer``."""
+    global _tracer
+    _tracer = Tracer(memory)
+    return _tracer
+
+
+def disable():
+    """Stop recording; returns the ``Tracer`` that was active (or None)."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def stage(name, **attrs):
+    """Context manager recording one stage, or a shared no-op when tracing is off."""
+    tracer = _tracer
+    if tracer is None:
+        return NOOP
+    return Stage(tracer, name, attrs)
+
+
+def traced(name=None, rows=None):
+    """Decorator recording every call as a stage; ``rows(result)`` gives the rows it processed."""
+    def decorate(fn):
+        label = name or f"{fn.__module__.rpartition('.')[2]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with Stage(_tracer, label, {}) as s:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    s.add_rows(rows(result))
+                return result
+        return wrapper
+    return decorate
+
+
+def write_json(records, path):
+    with open(path, "w") as f:
+        json.dump({"stages": records}, f, indent=1, default=str)
+
+
+def _label(record):
+    attrs = ", ".join(f"{k}={v}" for k, v in record["attrs"].items())
+    return f"{record['name']} ({attrs})" if attrs else record["name"]
+
+
+def speedscope(records, name="ebms"):
+    """A speedscope file (``evented`` profiles in milliseconds, one per thread) as a dict."""
+    frames, frame_index, profiles = [], {}, []
+    children = {}
+    for r in records:
+        children.setdefault(r["parent"], []).append(r)
+
+    def frame(r):
+        label = _label(r)
+        if label not in frame_index:
+            frame_index[label] = len(frames)
+            frames.append({"name": label})
+        return frame_index[label]
+
+    def emit(r, events):
+        # a child can only be closed once it is open, and no later than its parent
+        start = r["start_s"] * 1000
+        end = start + r["wall_s"] * 1000
+        events.append({"type": "O", "frame": frame(r), "at": start})
+        for child in sorted(children.get(r["id"], []), key=lambda c: c["start_s"]):
+            if child["thread"] == r["thread"]:
+                emit(child, events)
+        events.append({"type": "C", "frame": frame(r), "at": max(end, events[-1]["at"])})
+
+    by_id = {r["id"]: r for r in records}
+    threads = {}
+    for r in records:
+        parent = by_id.get(r["parent"])
+        if parent is None or parent["thread"] != r["thread"]:
+            threads.setdefault(r["thread"], []).append(r)
+    for thread, roots in threads.items():
+        events = []
+        for r in sorted(roots, key=lambda r: r["start_s"]):
+            emit(r, events)
+        profiles.append({"type": "evented", "name": f"{name} {thread}", "unit": "milliseconds",
+                         "startValue": events[0]["at"], "endValue": events[-1]["at"], "events": events})
+    return {"$schema": "https://www.speedscope.app/file-format-schema.json", "name": name,
+            "exporter": "ebms.instrument", "activeProfileIndex": 0, "shared": {"frames": frames},
+            "profiles": profiles}
+
+
+def write_speedscope(records, path, name="ebms"):
+    with open(path, "w") as f:
+        json.dump(speedscope(records, name), f)
+
+
+def summary(records):
+    """``{label: {calls, wall_s, cpu_s, rows, rows_per_s, peak_bytes}}`` totalled per name and attributes."""
+    totals = {}
+    for r in records:
+        t = totals.setdefault(_label(r), {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0, "peak_bytes": None})
+        t["calls"] += 1
+        t["wall_s"] += r["wall_s"]
+        t["cpu_s"] += r["cpu_s"]
+        t["rows"] += r["rows"]
+        if r["peak_bytes"] is not None:
+            t["peak_bytes"] = max(t["peak_bytes"] or 0, r["peak_bytes"])
+    for t in totals.values():
+        t["rows_per_s"] = t["rows"] / t["wall_s"] if t["rows"] and t["wall_s"] > 0 else None
+    return totals
+
+
+def print_summary(records, file=None):
+    print(f"{'stage':<44}{'calls':>6}{'wall s':>9}{'cpu s':>9}{'rows':>11}{'rows/s':>12}{'peak MB':>9}", file=file)
+    for name, t in summary(records).items():
+        rate = f"{t['rows_per_s']:>12.0f}" if t["rows_per_s"] else f"{'-':>12}"
+        peak = f"{t['peak_bytes'] / 1e6:>9.1f}" if t["peak_bytes"] is not None else f"{'-':>9}"
+        print(f"{name:<44}{t['calls']:>6}{t['wall_s']:>9.3f}{t['cpu_s']:>9.3f}{t['rows']:>11}{rate}{peak}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--json", help="write the stages to this file")
+    parser.add_argument("--speedscope", help="write a speedscope profile to this file")
+    parser.add_argument("--memory", action="store_true", help="also record peak memory (tracemalloc; slow)")
+    parser.add_argument("module", help="module whose main() to run, e.g. ebms.generator")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="its arguments")
+    args = parser.parse_args(argv)
+
+    from . import instrument  # under ``-m`` this file is ``__main__``; the tooling imports the package module
+
+    module = importlib.import_module(args.module)
+    tracer = instrument.enable(args.memory)
+    try:
+        with instrument.stage(args.module):
+            module.main(args.args)
+    finally:
+        instrument.disable()
+        records = tracer.records()
+        print_summary(records)
+        if args.json:
+            write_json(records, args.json)
+        if args.speedscope:
+            write_speedscope(records, args.speedscope, args.module)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Admin dashboard rankings kept up to date from row changes.
+
+Embedded Query-04, 06, 07, 08, 10, 11, 12 and Simple Query-05 and 08 each
+rank customers, products, suppliers or agents with a join, ``GROUP BY`` and
+``ORDER BY`` over every order line or review.  ``Leaderboards`` keeps the
+per-key aggregates those rankings are made of (lines and spend per customer,
+units sold and rating sum and count per product, supplier and agent, orders
+per agent) and feeds every change into a ``TopK`` per ranking, so reading a
+ranking costs O(K log K) whatever the data size:
+
+===================  =====================================  ==========================
+board                queries                                ranked by
+===================  =====================================  ==========================
+top_spenders         Embedded Query-04, Simple Query-08     money spent
+least_active         Embedded Query-06                      fewest order lines (<= 10)
+best_selling         Embedded Query-07                      units sold
+top_rated_products   Embedded Query-08                      average rating
+top_rated_suppliers  Embedded Query-10                      average rating (> 3)
+top_rated_agents     Embedded Query-11, Simple Query-05     average rating
+most_active_agents   Embedded Query-12                      orders
+===================  =====================================  ==========================
+
+Changes arrive as whole rows through ``apply(table, row, sign)`` (``sign=-1``
+takes a row back out; an update is the old row out and the new one in).  As in
+``ebms.cube``, an order line is priced when it is applied.  Ties are broken by
+the lower ID; the queries leave them unordered.
+
+    python -m ebms.leaderboard --data generated/sf-10 --changes 20000
+"""
+
+import argparse
+import heapq
+import random
+import sqlite3
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from . import queryfiles, standin
+from .tables import QUERIES_DIR, TABLES
+
+Entry = namedtuple("Entry", "id value count")
+
+# board -> [(query file, label, column of the ranked value, LIMIT)]
+QUERIES = {
+    "top_spenders": [("embedded-queries", "Query-04", 3, 10), ("simple-queries", "Query-08", 2, 15)],
+    "least_active": [("embedded-queries", "Query-06", 2, 10)],
+    "best_selling": [("embedded-queries", "Query-07", 3, 10)],
+    "top_rated_products": [("embedded-queries", "Query-08", 3, 10)],
+    "top_rated_suppliers": [("embedded-queries", "Query-10", 3, 10)],
+    "top_rated_agents": [("embedded-queries", "Query-11", 3, 10), ("simple-queries", "Query-05", 2, 40)],
+    "most_active_agents": [("embedded-queries", "Query-12", 3, 10)],
+}
+
+
+class TopK:
+    """The ``k`` best keys by score, kept among up to ``k + slack`` candidates.
+
+    Every key outside the candidates scores at most ``bound``, and every
+    candidate at least that, so the best candidates are the best keys.  A
+    candidate whose score drops below ``bound`` leaves; the candidates are
+    rebuilt from all scores (O(n log k)) only when fewer than ``k`` are left.
+    """
+
+    def __init__(self, k, slack=None):
+        self.k = k
+        self.size = k + (k if slack is None else slack)
+        self.scores = {}
+        self.top = {}
+        self.bound = None  # best score outside the candidates (None: nothing outside)
+        self.rebuilds = 0
+        self._heap = []  # (score, key) of the candidates, stale entries included
+
+    def _weakest(self):
+        while self._heap:
+            score, key = self._heap[0]
+            if self.top.get(key) == score:
+                return score
+            heapq.heappop(self._heap)
+        return None
+
+    def _enter(self, key, score):
+        self.top[key] = score
+        heapq.heappush(self._heap, (score, key))
+        if len(self._heap) > 4 * self.size:
+            self._heap = [(s, k) for k, s in self.top.items()]
+            heapq.heapify(self._heap)
+
+    def _outside(self, score):
+        if self.bound is None or score > self.bound:
+            self.bound = score
+
+    def update(self, key, score):
+        """Set the score of ``key``; None takes it out of the ranking."""
+        if score is None:
+            self.scores.pop(key, None)
+        else:
+            self.scores[key] = score
+        if key in self.top:
+            if score is not None and (self.bound is None or score >= self.bound):
+                self._enter(key, score)
+                return
+            del self.top[key]
+            if score is not None:
+                self._outside(score)
+            if len(self.top) < self.k:
+                self.rebuild()
+        elif score is not None:
+            weakest = self._weakest()
+            if len(self.top) < self.size and (self.bound is None or score >= self.bound):
+                self._enter(key, score)
+            elif weakest is not None and score > weakest:
+                del self.top[self._heap[0][1]]
+                self._outside(weakest)
+                self._enter(key, score)
+            else:
+                self._outside(score)
+
+    def rebuild(self):
+        self.rebuilds += 1
+        best = heapq.nlargest(self.size + 1, self.scores.items(), key=lambda item: item[1])
+        self.top = dict(best[:self.size])
+        self.bound = best[self.size][1] if len(best) > self.size else None
+        self._heap = [(s, k) for k, s in self.top.items()]
+        heapq.heapify(self._heap)
+
+    def best(self, k=None):
+        """The best ``k`` (default ``self.k``) keys, best first."""
+        return sorted(self.top, key=self.top.get, reverse=True)[:k or self.k]
+
+
+def _cents(price):
+    return round(float(price) * 100)
+
+
+class Leaderboards:
+    def __init__(self, k=40):
+        self.boards = {name: TopK(k) for name in QUERIES}
+        self.customers = {}  # customerID -> [order lines, cents spent]
+        self.sold = {}  # productID -> units
+        self.ratings = {"product": {}, "supplier": {}, "agent": {}}  # ID -> [rating sum, reviews]
+        self.agent_orders = {}
+        self.price = {}  # productID -> cents
+        self.supplier_of = {}
+        self.customer_of = {}  # orderID -> customerID
+
+    @classmethod
+    def from_db(cls, conn, k=40):
+        boards = cls(k)
+        for table in ("delivery_agent", "product", "orders", "order_product", "product_review", "da_review"):
+            for row in conn.execute(f"SELECT * FROM {table}"):
+                boards.apply(table, row)
+        return boards
+
+    def apply(self, table, row, sign=1):
+        """Fold one inserted (``sign=1``) or deleted (``sign=-1``) row of ``table`` in."""
+        row = dict(zip(TABLES[table], row))
+        if table == "delivery_agent":
+            agent = row["daID"]
+            if sign > 0:
+                self.agent_orders.setdefault(agent, 0)
+                self._agent_orders(agent)
+            else:
+                self.agent_orders.pop(agent, None)
+                self.boards["most_active_agents"].update(agent, None)
+        elif table == "product":
+            self._product(row["productID"], row["supplierID"] if sign > 0 else None, _cents(row["price"]))
+        elif table == "orders":
+            order, agent = row["orderID"], row["daID"]
+            if sign > 0:
+                self.customer_of[order] = row["customerID"]
+            else:
+                self.customer_of.pop(order, None)
+            self.agent_orders[agent] = self.agent_orders.get(agent, 0) + sign
+            self._agent_orders(agent)
+        elif table == "order_product":
+            product, quantity = row["productID"], row["quantity"]
+            customer = self.customer_of[row["orderID"]]
+            totals = self.customers.setdefault(customer, [0, 0])
+            totals[0] += sign
+            totals[1] += sign * quantity * self.price.get(product, 0)
+            self._customer(customer)
+            self.sold[product] = self.sold.get(product, 0) + sign * quantity
+            self.boards["best_selling"].update(product, (self.sold[product], -product) if self.sold[product] else None)
+        elif table == "product_review":
+            product = row["productID"]
+            self._rate("product", product, sign * row["rating"], sign)
+            if product in self.supplier_of:
+                self._rate("supplier", self.supplier_of[product], sign * row["rating"], sign)
+        elif table == "da_review":
+            self._rate("agent", row["daID"], sign * row["rating"], sign)
+
+    def _product(self, product, supplier, cents):
+        """A product (re)defined: later lines use its price; its reviews follow it to its supplier."""
+        old = self.supplier_of.get(product)
+        if old != supplier:
+            total, count = self.ratings["product"].get(product, (0, 0))
+            if old is not None and count:
+                self._rate("supplier", old, -total, -count)
+            if supplier is not None and count:
+                self._rate("supplier", supplier, total, count)
+        if supplier is None:
+            self.supplier_of.pop(product, None)
+            self.price.pop(product, None)
+        else:
+            self.supplier_of[product] = supplier
+            self.price[product] = cents
+
+    def _rate(self, kind, key, rating, count):
+        """Add ``count`` reviews rated ``rating`` in total to ``key`` (negative: take them out)."""
+        totals = self.ratings[kind].setdefault(key, [0, 0])
+        totals[0] += rating
+        totals[1] += count
+        average = totals[0] / totals[1] if totals[1] else None
+        if kind == "supplier" and average is not None and average <= 3:
+            average = None
+        self.boards[f"top_rated_{kind}s"].update(key, None if average is None else (average, -key))
+
+    def _customer(self, customer):
+        lines, cents = self.customers[customer]
+        self.boards["top_spenders"].update(customer, (cents, -customer) if lines else None)
+        self.boards["least_active"].update(customer, (-lines, -customer) if 0 < lines <= 10 else None)
+
+    def _agent_orders(self, agent):
+        self.boards["most_active_agents"].update(agent, (self.agent_orders[agent], -agent))
+
+    def top(self, board, k=10):
+        """``Entry(id, value, count)`` rows of ``board``, best first."""
+        entries = []
+        for key in self.boards[board].best(k):
+            if board in ("top_spenders", "least_active"):
+                lines, cents = self.customers[key]
+                entries.append(Entry(key, lines if board == "least_active" else cents / 100, lines))
+            elif board == "best_selling":
+                entries.append(Entry(key, self.sold[key], None))
+            elif board == "most_active_agents":
+                entries.append(Entry(key, self.agent_orders[key], None))
+            else:
+                total, n = self.ratings[board[len("top_rated_"):-1]][key]
+                entries.append(Entry(key, total / n, n))
+        return entries
+
+
+def sql_rankings(conn):
+    """``{(board, file, label): (seconds, ranked values)}`` from the original queries."""
+    statements = {(q.source, q.label): q.sql for q in queryfiles.read_all(QUERIES_DIR)}
+    results = {}
+    for board, queries in QUERIES.items():
+        for source, label, column, _ in queries:
+            t0 = time.perf_counter()
+            rows = conn.execute(queryfiles.to_sqlite(statements[source, label])).fetchall()
+            results[board, source, label] = (time.perf_counter() - t0, [row[column] for row in rows])
+    return results
+
+
+def check(conn, boards):
+    """Boards whose ranked values differ from the queries' (ties can order keys differently)."""
+    differ = []
+    for (board, source, label), (_, values) in sql_rankings(conn).items():
+        ours = [entry.value for entry in boards.top(board, len(values))]
+        if len(ours) != len(values) or not np.allclose(ours, [float(v) for v in values]):
+            differ.append((board, source, label, values, ours))
+    return differ
+
+
+def _changes(conn, n, seed):
+    """``n`` new orders (one to three lines each) and reviews, as ``(table, row)``."""
+    rng = random.Random(seed)
+    customers = [c for c, in conn.execute("SELECT customerID FROM customer")]
+    agents = [a for a, in conn.execute("SELECT daID FROM delivery_agent")]
+    products = [p for p, in conn.execute("SELECT productID FROM product")]
+    order = conn.execute("SELECT MAX(orderID) FROM orders").fetchone()[0]
+    reviewed = set(conn.execute("SELECT customerID, productID FROM product_review"))
+    for _ in range(n):
+        if rng.random() < 0.7:
+            order += 1
+            yield "orders", (order, rng.choice(customers), rng.choice(agents), "2024-01-01", None)
+            for product in rng.sample(products, rng.randint(1, 3)):
+                yield "order_product", (order, product, rng.randint(1, 3))
+        elif rng.random() < 0.5:
+            key = rng.choice(customers), rng.choice(products)
+            if key not in reviewed:
+                reviewed.add(key)
+                yield "product_review", key + (rng.randint(1, 5), None, "2024-01-01")
+        else:
+            yield "da_review", (rng.choice(customers), rng.choice(agents), rng.randint(1, 5), None, "2024-01-01")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", required=True, help="directory with <table>.csv files")
+    parser.add_argument("--changes", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    conn = standin.connect()
+    standin.load_csv_dir(conn, args.data)
+    conn.execute("ANALYZE")
+    queryfiles.register_functions(conn)
+    t0 = time.perf_counter()
+    boards = Leaderboards.from_db(conn)
+    print(f"aggregates built in {time.perf_counter() - t0:.2f} s")
+
+    apply_times = []
+    for table, row in _changes(conn, args.changes, args.seed):
+        try:
+            conn.execute(f"INSERT INTO {table} VALUES ({', '.join('?' * len(row))})", row)
+        except sqlite3.IntegrityError:
+            continue  # a customer reviews an agent once
+        t1 = time.perf_counter()
+        boards.apply(table, row)
+        apply_times.append(time.perf_counter() - t1)
+    conn.commit()
+    us = 1e6 * np.array(apply_times)
+    print(f"{len(us)} row changes applied: p50 {np.percentile(us, 50):.1f} us, p99 {np.percentile(us, 99):.1f} us; "
+          f"rebuilds {sum(b.rebuilds for b in boards.boards.values())}")
+
+    print(f"{'board':<22}{'query':<28}{'SQL ms':>10}{'board ms':>10}")
+    for (board, source, label), (seconds, values) in sql_rankings(conn).items():
+        t1 = time.perf_counter()
+        boards.top(board, len(values))
+        print(f"{board:<22}{source + ' ' + label:<28}{1000 * seconds:>10.2f}{1000 * (time.perf_counter() - t1):>10.3f}")
+    differ = check(conn, boards)
+    for board, source, label, values, ours in differ:
+        print(f"{board} differs from {source} {label}: {values} != {ours}")
+    if differ:
+        raise SystemExit(1)
+    print("every board matches its queries")
+
+
+if __name__ == "__main__":
+    main()
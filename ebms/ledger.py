@@ -0,0 +1,359 @@
+"""Append-only wallet ledger with balance snapshots, and a vectorized reconciliation of it.
+
+Simple Query-01 updates ``wallet`` through a join over every order the
+customer has placed, so it charges all of them again, and the work grows with
+the order history.  The ledger keeps the movements instead:
+
+* ``wallet_ledger`` gets one entry per movement, in cents: an ``open`` entry
+  with the wallet's balance when the customer's account is opened (its
+  ``orderID`` is the last order already paid for), a negative ``debit`` per
+  order placed by ``ebms.checkout`` (``checkout(..., ledger=True)``), and a
+  positive ``credit`` per top-up or refund.  On the stand-in, triggers reject
+  ``UPDATE`` and ``DELETE``; on MySQL grant the application only ``INSERT``
+  and ``SELECT`` on it.
+* ``take_snapshot`` stores the balance of every customer with new entries at
+  the ledger's current ``entryID``, reading only the entries since the
+  previous snapshot.  ``balance`` is then the customer's latest snapshot plus
+  the entries after it, two index lookups however long the history is.
+
+``reconcile`` recomputes every balance from the ledger, checks that each order
+placed since the accounts were opened has exactly one debit of its total, and
+that the snapshots and the ``wallet`` table agree with the ledger.  It reads the
+ledger, the new orders and the snapshots once and does the rest with
+``np.bincount`` and sorted lookups.  Sums are kept in ``float64``, which is
+exact for integers of cents below 2**53.  Order totals use the current product
+prices, since the schema keeps no price per order line, so a price change
+shows up as drift on the orders placed before it.
+
+    python -m ebms.ledger --db ebms.db --open --snapshot
+    python -m ebms.ledger --db ebms.db --balance 7
+    python -m ebms.ledger --db ebms.db --reconcile
+    python -m ebms.ledger --bench 2000000
+"""
+
+import argparse
+import json
+import time
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from .checkout import begin, connect
+from .standin import mysql_to_sqlite, split_statements
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallet_ledger (
+    entryID INT NOT NULL AUTO_INCREMENT,
+    customerID INT NOT NULL,
+    orderID INT,
+    kind VARCHAR(6) NOT NULL,
+    cents BIGINT NOT NULL,
+    entry_date DATE NOT NULL,
+    CHECK (kind IN ('open', 'debit', 'credit')),
+    PRIMARY KEY (entryID),
+    FOREIGN KEY (customerID) REFERENCES customer(customerID)
+);
+
+CREATE INDEX ledger_customer ON wallet_ledger(customerID, entryID);
+
+CREATE TABLE IF NOT EXISTS wallet_snapshot (
+    customerID INT NOT NULL,
+    entryID INT NOT NULL,
+    cents BIGINT NOT NULL,
+    PRIMARY KEY (customerID, entryID)
+);
+"""
+
+APPEND_ONLY = [
+    f"CREATE TRIGGER IF NOT EXISTS wallet_ledger_no_{action} BEFORE {action.upper()} ON wallet_ledger "
+    f"BEGIN SELECT RAISE(ABORT, 'wallet_ledger is append-only'); END"
+    for action in ("update", "delete")
+]
+
+Balance = namedtuple("Balance", "cents snapshot_entry tail")
+Drift = namedtuple("Drift", "check keys expected actual")
+
+
+def create(conn):
+    """Create the ledger tables (and the append-only triggers) if they are missing."""
+    for statement in split_statements(SCHEMA):
+        conn.execute(mysql_to_sqlite(statement).replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS"))
+    for statement in APPEND_ONLY:
+        conn.execute(statement)
+    conn.commit()
+
+
+def open_accounts(conn, on_date=None):
+    """Open an account for every wallet without one; returns how many were opened.
+
+    The opening entry covers the orders placed so far: it is the wallet's
+    balance less whatever was posted for the customer before the account was
+    opened, so that the ledger sums to the wallet.
+    """
+    begin(conn)
+    try:
+        cursor = conn.execute(
+            "INSERT INTO wallet_ledger (customerID, orderID, kind, cents, entry_date) "
+            "SELECT w.customerID, (SELECT MAX(orderID) FROM orders), 'open', "
+            "CAST(ROUND(w.balance * 100) AS INTEGER) "
+            "- (SELECT COALESCE(SUM(l.cents), 0) FROM wallet_ledger l WHERE l.customerID = w.customerID), ? "
+            "FROM wallet w WHERE NOT EXISTS (SELECT 1 FROM wallet_ledger l "
+            "WHERE l.customerID = w.customerID AND l.kind = 'open') "
+            "ORDER BY w.customerID", [(on_date or date.today()).isoformat()])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return cursor.rowcount
+
+
+def post_checkout(conn, order_date):
+    """Append a debit for every order of ``checkout``'s ``checkout_batch`` (inside its transaction)."""
+    conn.execute("INSERT INTO wallet_ledger (customerID, orderID, kind, cents, entry_date) "
+                 "SELECT customerID, orderID, 'debit', -CAST(ROUND(total * 100) AS INTEGER), ? "
+                 "FROM checkout_batch ORDER BY orderID", [order_date])
+
+
+def credit(conn, customer_id, cents, order_id=None, on_date=None):
+    """Top up (or refund ``order_id`` to) a wallet: a credit entry and the ``wallet`` update, in one transaction."""
+    if cents <= 0:
+        raise ValueError(f"a credit must be positive, not {cents} cents")
+    begin(conn)
+    try:
+        conn.execute("INSERT INTO wallet_ledger (customerID, orderID, kind, cents, entry_date) "
+                     "VALUES (?, ?, 'credit', ?, ?)",
+                     [customer_id, order_id, cents, (on_date or date.today()).isoformat()])
+        conn.execute("UPDATE wallet SET balance = ROUND(balance + ? / 100.0, 2) WHERE customerID = ?",
+                     [cents, customer_id])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def take_snapshot(conn):
+    """Snapshot the customers with entries since the last snapshot; returns ``(entryID, customers)``.
+
+    Every entry up to the previous snapshot's ``entryID`` is in some customer's
+    latest snapshot, so only the entries after it are read.
+    """
+    begin(conn)
+    try:
+        last = conn.execute("SELECT COALESCE(MAX(entryID), 0) FROM wallet_snapshot").fetchone()[0]
+        upto = conn.execute("SELECT COALESCE(MAX(entryID), 0) FROM wallet_ledger").fetchone()[0]
+        cursor = conn.execute(
+            "INSERT INTO wallet_snapshot (customerID, entryID, cents) "
+            "SELECT l.customerID, ?, COALESCE((SELECT s.cents FROM wallet_snapshot s WHERE s.customerID = l.customerID "
+            "ORDER BY s.entryID DESC LIMIT 1), 0) + SUM(l.cents) "
+            "FROM wallet_ledger l WHERE l.entryID > ? AND l.entryID <= ? GROUP BY l.customerID",
+            [upto, last, upto])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return upto, cursor.rowcount
+
+
+def balance(conn, customer_id):
+    """The customer's latest snapshot plus the entries after it."""
+    snapshot = conn.execute("SELECT entryID, cents FROM wallet_snapshot WHERE customerID = ? "
+                            "ORDER BY entryID DESC LIMIT 1", [customer_id]).fetchone() or (0, 0)
+    tail, n = conn.execute("SELECT COALESCE(SUM(cents), 0), COUNT(*) FROM wallet_ledger "
+                           "WHERE customerID = ? AND entryID > ?", [customer_id, snapshot[0]]).fetchone()
+    return Balance(snapshot[1] + tail, snapshot[0], n)
+
+
+def _read(conn, sql, columns, args=()):
+    """Query result as ``{column: int64 array}``."""
+    rows = np.fromiter(conn.execute(sql, args), dtype=[(c, np.int64) for c in columns])
+    return {c: rows[c] for c in columns}
+
+
+def load(conn):
+    """The columns ``reconcile_arrays`` needs, read with one query per table."""
+    ledger = _read(conn, "SELECT entryID, customerID, COALESCE(orderID, -1), "
+                         "CASE kind WHEN 'open' THEN 0 WHEN 'debit' THEN 1 ELSE 2 END, cents "
+                         "FROM wallet_ledger ORDER BY entryID", ["entry", "customer", "order", "kind", "cents"])
+    opened = ledger["order"][ledger["kind"] == 0]
+    # no account is older than the first one; reconcile_arrays narrows this to each customer's opening
+    first = int(opened.min()) + 1 if len(opened) else 1
+    orders = _read(conn, "SELECT o.orderID, o.customerID, COALESCE(SUM(CAST(ROUND(p.price * 100) AS INTEGER) "
+                         "* op.quantity), 0) FROM orders o LEFT JOIN order_product op ON op.orderID = o.orderID "
+                         "LEFT JOIN product p ON p.productID = op.productID WHERE o.orderID >= ? "
+                         "GROUP BY o.orderID ORDER BY o.orderID", ["order", "customer", "cents"], [first])
+    # SQLite takes the bare ``cents`` from the row of MAX(entryID)
+    snapshots = _read(conn, "SELECT customerID, MAX(entryID), cents FROM wallet_snapshot GROUP BY customerID",
+                      ["customer", "entry", "cents"])
+    wallets = _read(conn, "SELECT customerID, CAST(ROUND(balance * 100) AS INTEGER) FROM wallet",
+                    ["customer", "cents"])
+    return ledger, orders, snapshots, wallets
+
+
+def _sums(keys, cents, size, mask=None):
+    """Exact per-key sums of cents (the sums stay below 2**53, where float64 counts exactly)."""
+    if mask is not None:
+        keys, cents = keys[mask], cents[mask]
+    return np.rint(np.bincount(keys, weights=cents, minlength=size)).astype(np.int64)
+
+
+def reconcile_arrays(ledger, orders, snapshots, wallets):
+    """Every disagreement between the ledger, the orders, the snapshots and the wallets; a list of ``Drift``.
+
+    ``ledger`` is sorted by entry.  ``orders`` holds the orders (with their
+    totals) placed since the first account was opened, ``snapshots`` each
+    customer's latest snapshot and ``wallets`` the ``wallet`` table.  Only the
+    orders after the ``orderID`` of the customer's own opening entry must be
+    debited; debits posted before that entry are part of the opening balance.
+    """
+    drifts = []
+    size = int(max((a["customer"].max(initial=0) for a in (ledger, orders, snapshots, wallets)))) + 1
+    opening = ledger["kind"] == 0
+    has_account = np.bincount(ledger["customer"][opening], minlength=size)
+    balances = _sums(ledger["customer"], ledger["cents"], size)
+    open_order = np.full(size, -1, dtype=np.int64)
+    open_order[ledger["customer"][opening]] = ledger["order"][opening]
+    open_entry = np.zeros(size, dtype=np.int64)
+    open_entry[ledger["customer"][opening]] = ledger["entry"][opening]
+    after = orders["order"] > open_order[orders["customer"]]
+    orders = {k: v[after] for k, v in orders.items()}
+
+    def report(check, keys, expected, actual):
+        if len(keys):
+            drifts.append(Drift(check, keys, expected, actual))
+
+    # accounts: exactly one open entry each, and every wallet has one
+    opens = np.flatnonzero(has_account > 1)
+    report("customers with more than one open entry", opens, np.ones(len(opens), np.int64), has_account[opens])
+    no_account = wallets["customer"][has_account[wallets["customer"]] == 0]
+    report("wallets without an account", no_account, wallets["cents"][has_account[wallets["customer"]] == 0],
+           np.zeros(len(no_account), np.int64))
+    orphans = np.unique(ledger["customer"][has_account[ledger["customer"]] == 0])
+    report("ledger entries without an open entry", orphans, np.zeros(len(orphans), np.int64), balances[orphans])
+
+    # debits: one per order placed since opening, of minus its total
+    debit = (ledger["kind"] == 1) & (ledger["entry"] > open_entry[ledger["customer"]])
+    debit_orders = ledger["order"][debit]
+    if len(orders["order"]):
+        lo = int(orders["order"][0])
+        span = int(max(orders["order"][-1], debit_orders.max(initial=lo))) - lo + 1
+        ours = debit_orders >= lo  # a debit of an order paid before opening is a double charge
+        posted = np.bincount(debit_orders[ours] - lo, minlength=span)
+        charged = _sums(debit_orders[ours] - lo, ledger["cents"][debit][ours], span)
+        at = orders["order"] - lo
+        missing = posted[at] == 0
+        report("orders without a debit", orders["order"][missing], -orders["cents"][missing],
+               np.zeros(missing.sum(), np.int64))
+        twice = posted[at] > 1
+        report("orders debited more than once", orders["order"][twice], np.ones(twice.sum(), np.int64), posted[at][twice])
+        wrong = (posted[at] == 1) & (charged[at] != -orders["cents"])
+        report("debits that differ from the order total", orders["order"][wrong], -orders["cents"][wrong],
+               charged[at][wrong])
+        known = np.zeros(span, dtype=bool)
+        known[at] = True
+        unknown = np.unique(np.concatenate([debit_orders[~ours], debit_orders[ours][~known[debit_orders[ours] - lo]]]))
+        report("debits of unknown orders", unknown, np.zeros(len(unknown), np.int64),
+               np.ones(len(unknown), np.int64))
+    else:
+        unknown = np.unique(debit_orders)
+        report("debits of unknown orders", unknown, np.zeros(len(unknown), np.int64), np.ones(len(unknown), np.int64))
+
+    # snapshots: each customer's latest one equals the sum of the entries up to it
+    if len(snapshots["customer"]):
+        upto = np.full(size, -1, dtype=np.int64)
+        upto[snapshots["customer"]] = snapshots["entry"]
+        prefix = _sums(ledger["customer"], ledger["cents"], size, ledger["entry"] <= upto[ledger["customer"]])
+        off = prefix[snapshots["customer"]] != snapshots["cents"]
+        report("snapshots that differ from the ledger", snapshots["customer"][off], prefix[snapshots["customer"]][off],
+               snapshots["cents"][off])
+
+    # wallets: the balance the application reads equals the ledger's
+    held = has_account[wallets["customer"]] > 0
+    off = held & (balances[wallets["customer"]] != wallets["cents"])
+    report("wallet balances that differ from the ledger", wallets["customer"][off],
+           balances[wallets["customer"]][off], wallets["cents"][off])
+    return drifts
+
+
+def reconcile(conn):
+    """``reconcile_arrays`` over the database; returns ``(drifts, seconds reading, seconds checking)``."""
+    t0 = time.perf_counter()
+    data = load(conn)
+    t1 = time.perf_counter()
+    drifts = reconcile_arrays(*data)
+    return drifts, t1 - t0, time.perf_counter() - t1
+
+
+def synthetic(customers, orders_per_customer=5, seed=0):
+    """In-memory ledger, orders, snapshots and wallets for ``customers`` accounts that reconcile cleanly."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, customers + 1)
+    n_orders = customers * orders_per_customer
+    order_customer = rng.integers(1, customers + 1, n_orders)
+    order_cents = rng.integers(100, 500_000, n_orders)
+    opening = rng.integers(1_000_000, 100_000_000, customers)
+    customer = np.concatenate([ids, order_customer])
+    n = len(customer)
+    ledger = {"entry": np.arange(1, n + 1), "customer": customer,
+              "order": np.concatenate([np.zeros(customers, np.int64), np.arange(1, n_orders + 1)]),
+              "kind": np.concatenate([np.zeros(customers, np.int64), np.ones(n_orders, np.int64)]),
+              "cents": np.concatenate([opening, -order_cents])}
+    orders = {"order": np.arange(1, n_orders + 1), "customer": order_customer, "cents": order_cents}
+    # a snapshot halfway through the debits
+    half = customers + n_orders // 2
+    upto = _sums(customer[:half], ledger["cents"][:half], customers + 1)
+    snapshots = {"customer": ids, "entry": np.full(customers, half), "cents": upto[1:]}
+    wallets = {"customer": ids, "cents": _sums(customer, ledger["cents"], customers + 1)[1:]}
+    return ledger, orders, snapshots, wallets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--db", help="SQLite stand-in database file")
+    parser.add_argument("--open", action="store_true", help="open an account for every wallet without one")
+    parser.add_argument("--snapshot", action="store_true", help="snapshot the balances changed since the last one")
+    parser.add_argument("--balance", type=int, metavar="CUSTOMER", help="print a customer's balance")
+    parser.add_argument("--reconcile", action="store_true", help="recompute every balance and report drift")
+    parser.add_argument("--show", type=int, default=5, help="drifting keys to print per check")
+    parser.add_argument("--json", help="also write the drift to this file")
+    parser.add_argument("--bench", type=int, metavar="CUSTOMERS", help="reconcile a synthetic ledger of this size")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        data = synthetic(args.bench)
+        t0 = time.perf_counter()
+        drifts = reconcile_arrays(*data)
+        print(f"{args.bench} customers, {len(data[0]['entry'])} entries reconciled in "
+              f"{time.perf_counter() - t0:.2f} s, {len(drifts)} checks drifting")
+        return
+    if not args.db:
+        parser.error("--db is required unless --bench is given")
+    conn = connect(args.db)
+    create(conn)
+    if args.open:
+        print(f"opened {open_accounts(conn)} accounts")
+    if args.snapshot:
+        entry, customers = take_snapshot(conn)
+        print(f"snapshot at entry {entry}: {customers} balances")
+    if args.balance is not None:
+        b = balance(conn, args.balance)
+        print(f"customer {args.balance}: {b.cents / 100:.2f} (snapshot at entry {b.snapshot_entry} + {b.tail} entries)")
+    if args.reconcile:
+        drifts, read_s, check_s = reconcile(conn)
+        for d in drifts:
+            print(f"{d.check}: {len(d.keys)}")
+            for key, expected, actual in list(zip(d.keys.tolist(), d.expected.tolist(), d.actual.tolist()))[:args.show]:
+                print(f"    {key}: expected {expected}, found {actual}")
+        print(f"reconciled in {read_s + check_s:.2f} s ({read_s:.2f} s reading); "
+              f"{'no drift' if not drifts else f'{len(drifts)} checks drifting'}")
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump([{"check": d.check, "keys": d.keys.tolist(), "expected": d.expected.tolist(),
+                            "actual": d.actual.tolist()} for d in drifts], f, indent=1)
+        if drifts:
+            raise SystemExit(1)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
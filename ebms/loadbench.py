@@ -0,0 +1,88 @@
+"""Benchmark the population formats by loading them into the SQLite stand-in.
+
+Each format is loaded table by table into a fresh database file and reported
+in rows per second.  SQLite has no ``LOAD DATA``, so the ``load`` format is
+stood in for by the CSVs themselves fed through ``executemany``, which is the
+bulk path SQLite offers.
+
+    python -m ebms.loadbench --scale-factor 10 --batch-sizes 100,1000,10000
+"""
+
+import argparse
+import json
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from . import population, standin
+from .generator import Generator
+from .tables import LOAD_ORDER
+
+
+def load_sql_file(conn, path):
+    with open(path) as f:
+        text = re.sub(r"^USE \w+;", "", f.read(), flags=re.M)
+    conn.executescript("BEGIN;\n" + text + "\nCOMMIT;")
+
+
+def run_format(data_dir, work_dir, fmt, batch_size=1000):
+    """Load every table in one format; returns ``{table: (rows, seconds)}``."""
+    label = f"{fmt}-{batch_size}" if fmt == "multirow" else fmt
+    sql_dir = Path(work_dir) / label
+    if fmt != "load":
+        population.write_population(data_dir, sql_dir, fmt, batch_size)
+    db_path = Path(work_dir) / f"{label}.db"
+    conn = standin.connect(str(db_path), indexes=False)
+    results = {}
+    try:
+        for table in LOAD_ORDER:
+            csv_path = Path(data_dir) / f"{table}.csv"
+            if not csv_path.exists():
+                continue
+            t0 = time.perf_counter()
+            if fmt == "load":
+                standin.load_csv_file(conn, csv_path, table)
+            else:
+                load_sql_file(conn, sql_dir / f"{table}.sql")
+            elapsed = time.perf_counter() - t0
+            rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            results[table] = (rows, elapsed)
+    finally:
+        conn.close()
+    return label, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-sizes", default="100,1000,10000")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        runs = [("rows", 1)] + [("multirow", int(b)) for b in args.batch_sizes.split(",")] + [("load", 1)]
+        print(f"{'format':<16}{'rows':>12}{'seconds':>10}{'rows/s':>12}")
+        for fmt, batch_size in runs:
+            label, results = run_format(data_dir, work_dir, fmt, batch_size)
+            rows = sum(r for r, _ in results.values())
+            seconds = sum(s for _, s in results.values())
+            report[label] = {
+                "rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds if seconds else 0.0,
+                "tables": {t: {"rows": r, "seconds": s} for t, (r, s) in results.items()},
+            }
+            print(f"{label:<16}{rows:>12}{seconds:>10.2f}{report[label]['rows_per_sec']:>12.0f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""In-process engine for the reports in ``Sql Queries/olap-queries.sql``.
+
+Query-01 to Query-05 run over a columnar snapshot (see ``ebms.columnar``):
+foreign keys are resolved with vectorized hash joins on the integer IDs and
+``GROUP BY ... WITH ROLLUP`` is a single sort of the finest grouping level
+whose subtotals are reduced from contiguous runs.  Results follow MySQL: sums
+and averages of ``DECIMAL`` columns are exact ``Decimal`` values (averages
+carry four extra digits), rolled-up keys are ``None`` and NULLs sort first.
+
+``SQLITE_QUERIES`` holds the same reports for the SQLite stand-in, which has no
+``WITH ROLLUP`` or ``YEAR()``: each grouping level is a ``UNION ALL`` branch and
+dates go through ``strftime``.
+
+    python -m ebms.olap --snapshot generated/sf-100/columnar --query 2
+    python -m ebms.olap --snapshot generated/sf-100/columnar --query 5 --supplier 7
+"""
+
+import argparse
+import time
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from . import instrument
+from .columnar import DictColumn, Snapshot
+
+Result = namedtuple("Result", ["columns", "rows"])
+
+AVG_EXTRA_SCALE = 4  # MySQL's div_precision_increment
+
+
+class KeyIndex:
+    """Hash index on a unique integer key column, probed a whole column at a time.
+
+    The generator's IDs are dense, so the table is addressed directly by key;
+    sparse keys fall back to a sorted array and ``searchsorted``.
+    """
+
+    def __init__(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        self.size = len(keys)
+        hi = int(keys.max(initial=-1))
+        self.direct = len(keys) > 0 and int(keys.min()) >= 0 and hi < 4 * len(keys) + 1024
+        if self.direct:
+            self.table = np.full(hi + 1, -1, dtype=np.int64)
+            self.table[keys] = np.arange(len(keys))
+        else:
+            self.order = np.argsort(keys, kind="stable")
+            self.sorted = keys[self.order]
+
+    def lookup(self, probe):
+        """Build-side row of every probe key, -1 where it has no match."""
+        probe = np.asarray(probe, dtype=np.int64)
+        if self.direct:
+            inside = (probe >= 0) & (probe < len(self.table))
+            return np.where(inside, self.table[np.where(inside, probe, 0)], -1)
+        if not self.size:
+            return np.full(len(probe), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(self.sorted, probe), self.size - 1)
+        return np.where(self.sorted[at] == probe, self.order[at], -1)
+
+
+def join(probe, build_keys):
+    """Inner equi-join of ``probe`` keys against a unique key column.
+
+    Returns ``(probe_rows, build_rows)`` for the matching pairs.
+    """
+    build = KeyIndex(build_keys).lookup(probe)
+    rows = np.flatnonzero(build >= 0)
+    return rows, build[rows]
+
+
+def distinct_sorted(values):
+    """``np.unique`` without its hash-table path, which is slower for large integer columns."""
+    values = np.sort(values)
+    return values[np.r_[True, values[1:] != values[:-1]]]
+
+
+def run_lengths(ordered):
+    """Length of every run of equal values in a sorted array."""
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    return np.diff(np.r_[starts, len(ordered)])
+
+
+def _dense_codes(values):
+    """Factorize small non-negative integers with a counting pass instead of a sort."""
+    present = np.bincount(values) > 0
+    remap = np.cumsum(present) - 1
+    return np.flatnonzero(present), remap[values]
+
+
+def factorize(column, rows=None):
+    """Sorted distinct values of ``column[rows]`` and the code of every row.
+
+    Dictionary-encoded columns are ranked by their strings, not their codes,
+    so codes always follow the value order.
+    """
+    if isinstance(column, DictColumn):
+        dictionary = column.dictionary
+        order = np.argsort(dictionary, kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        codes = np.asarray(column.codes)
+        ranks, codes = _dense_codes(rank[codes if rows is None else codes[rows]])
+        return dictionary[order][ranks], codes
+    values = np.asarray(column if rows is None else np.asarray(column)[rows], dtype=np.int64)
+    lo = int(values.min(initial=0))
+    if len(values) and int(values.max()) - lo < len(values):
+        uniques, codes = _dense_codes(values - lo)
+        return uniques + lo, codes
+    return np.unique(values, return_inverse=True)
+
+
+def rollup(keys, sums=(), distinct=(), weights=None):
+    """``GROUP BY keys WITH ROLLUP`` over factorized keys.
+
+    ``keys`` is a list of ``(uniques, codes)`` pairs, ``sums`` integer columns
+    to add up, ``distinct`` integer columns for ``COUNT(DISTINCT ...)`` and
+    ``weights`` how many joined rows each input row stands for.  Returns
+    ``(key_codes, counts, totals, distinct_counts)``, finest level first;
+    rolled-up key codes are -1.  Like MySQL, no input means no rows at all.
+    """
+    n = len(keys[0][1])
+    if n == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return [empty] * len(keys), empty, [empty] * len(sums), [empty] * len(distinct)
+    dims = [max(1, len(uniques)) for uniques, _ in keys]
+    combined = np.ravel_multi_index([codes for _, codes in keys], dims).astype(np.int64)
+    order = np.argsort(combined, kind="stable")
+    ordered = combined[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    finest = ordered[starts]
+    weights = np.ones(n, dtype=np.int64) if weights is None else np.asarray(weights, dtype=np.int64)
+    fine_counts = np.add.reduceat(weights[order], starts)
+    fine_sums = [np.add.reduceat(np.asarray(col, dtype=np.int64)[order], starts) for col in sums]
+    distinct = [np.asarray(col, dtype=np.int64) for col in distinct]
+
+    out_keys, out_counts = [[] for _ in keys], []
+    out_sums, out_distinct = [[] for _ in sums], [[] for _ in distinct]
+    for level in range(len(keys), -1, -1):
+        width = int(np.prod(dims[level:], dtype=np.int64))
+        prefix = finest // width
+        runs = np.flatnonzero(np.r_[True, prefix[1:] != prefix[:-1]])
+        codes = np.unravel_index(prefix[runs], dims[:level]) if level else ()
+        for i in range(len(keys)):
+            out_keys[i].append(codes[i] if i < level else np.full(len(runs), -1, dtype=np.int64))
+        out_counts.append(np.add.reduceat(fine_counts, runs))
+        for i, col in enumerate(fine_sums):
+            out_sums[i].append(np.add.reduceat(col, runs))
+        for i, col in enumerate(distinct):
+            span = int(col.max(initial=0)) + 1
+            out_distinct[i].append(run_lengths(distinct_sorted(ordered // width * span + col[order]) // span))
+    return ([np.concatenate(k) for k in out_keys], np.concatenate(out_counts),
+            [np.concatenate(s) for s in out_sums], [np.concatenate(d) for d in out_distinct])
+
+
+def decimal(units, scale):
+    return Decimal(int(units)).scaleb(-scale)
+
+
+def average(units, count, scale):
+    """MySQL ``AVG`` of a ``DECIMAL`` column: exact, rounded to four more digits."""
+    quantum = Decimal(1).scaleb(-(scale + AVG_EXTRA_SCALE))
+    return (Decimal(int(units)).scaleb(-scale) / int(count)).quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+def _key_values(keys, key_codes, row):
+    return tuple(None if codes[row] < 0 else uniques[codes[row]].item()
+                 for (uniques, _), codes in zip(keys, key_codes))
+
+
+def _null_first(value):
+    return (value is not None, value)
+
+
+def order_rows(rows, spec):
+    """Sort like ``ORDER BY``: ``spec`` lists ``(column, descending)``; NULL is the smallest value."""
+    for column, descending in reversed(spec):
+        rows.sort(key=lambda row: _null_first(row[column]), reverse=descending)
+    return rows
+
+
+def rollup_order(rows, width):
+    """The order MySQL emits ``WITH ROLLUP`` rows in: by key, each subtotal after its group."""
+    return sorted(rows, key=lambda row: [(v is None, v) for v in row[:width]])
+
+
+def line_facts(snap, lines=None):
+    """``orders JOIN order_product JOIN product``: row positions of every order line and its value.
+
+    ``lines`` restricts the join to some ``order_product`` rows.
+    """
+    orders, order_product, product = snap["orders"], snap["order_product"], snap["product"]
+    lines = np.arange(len(order_product)) if lines is None else lines
+    kept, order_rows_ = join(np.asarray(order_product["orderID"])[lines], orders["orderID"])
+    lines = lines[kept]
+    kept, product_rows = join(np.asarray(order_product["productID"])[lines], product["productID"])
+    lines, order_rows_ = lines[kept], order_rows_[kept]
+    value = np.asarray(product["price"])[product_rows] * np.asarray(order_product["quantity"])[lines].astype(np.int64)
+    return {"order": order_rows_, "product": product_rows, "value": value, "scale": product.scale("price")}
+
+
+def join_address(snap, table, rows):
+    """Follow ``table.addressID`` for the given rows; returns ``(kept, address_rows)``."""
+    return join(np.asarray(snap[table]["addressID"])[rows], snap["address"]["addressID"])
+
+
+def customer_facts(snap, facts):
+    """Restrict line facts to lines whose customer and address exist; adds their rows."""
+    kept, customer_rows = join(np.asarray(snap["orders"]["customerID"])[facts["order"]], snap["customer"]["customerID"])
+    kept2, address_rows = join_address(snap, "customer", customer_rows)
+    kept = kept[kept2]
+    facts = {k: v[kept] if isinstance(v, np.ndarray) else v for k, v in facts.items()}
+    facts["customer"], facts["address"] = customer_rows[kept2], address_rows
+    return facts
+
+
+def date_parts(dates):
+    """``YEAR``, ``QUARTER`` and ``MONTH`` of a ``datetime64[D]`` column."""
+    months = dates.astype("datetime64[M]").astype(np.int64)
+    year, month = months // 12 + 1970, months % 12 + 1
+    return year, (month - 1) // 3 + 1, month
+
+
+def query_01(snap):
+    """Order lines and revenue by year, quarter and month."""
+    facts = line_facts(snap)
+    parts = date_parts(np.asarray(snap["orders"]["order_date"])[facts["order"]])
+    keys = [factorize(part) for part in parts]
+    key_codes, counts, (revenue,), _ = rollup(keys, sums=[facts["value"]])
+    rows = [_key_values(keys, key_codes, i) + (int(counts[i]), decimal(revenue[i], facts["scale"]))
+            for i in range(len(counts))]
+    rows = order_rows(rollup_order(rows, 3), [(0, True), (2, True)])
+    return Result(["date_year", "date_quarter", "date_month", "order_count", "revenue"], rows)
+
+
+def query_02(snap):
+    """Distinct orders and revenue by the customer's country."""
+    facts = customer_facts(snap, line_facts(snap))
+    keys = [factorize(snap["address"]["country"], facts["address"])]
+    order_id = np.asarray(snap["orders"]["orderID"])[facts["order"]]
+    key_codes, _, (revenue,), (orders,) = rollup(keys, sums=[facts["value"]], distinct=[order_id])
+    rows = [_key_values(keys, key_codes, i) + (int(orders[i]), decimal(revenue[i], facts["scale"]))
+            for i in range(len(orders))]
+    rows = order_rows(rollup_order(rows, 1), [(2, True)])
+    return Result(["country", "order_count", "revenue"], rows)
+
+
+def _demographics(snap, address_rows, who, value, scale, weights=None):
+    address = snap["address"]
+    keys = [factorize(address["country"], address_rows), factorize(address["state"], address_rows)]
+    key_codes, counts, (total,), (people,) = rollup(keys, sums=[value], distinct=[who], weights=weights)
+    rows = [_key_values(keys, key_codes, i)
+            + (int(people[i]), average(total[i], counts[i], scale), decimal(total[i], scale))
+            for i in range(len(counts))]
+    return order_rows(rollup_order(rows, 2), [(0, False), (4, True)])
+
+
+def query_03(snap):
+    """Customers, average line value and total spent by the customer's country and state."""
+    facts = customer_facts(snap, line_facts(snap))
+    who = np.asarray(snap["customer"]["customerID"])[facts["customer"]]
+    rows = _demographics(snap, facts["address"], who, facts["value"], facts["scale"])
+    return Result(["country", "state", "customer_count", "avg_spent", "total_spent"], rows)
+
+
+def query_04(snap):
+    """Suppliers, average line value and total earned by the supplier's country and state.
+
+    The SQL joins each supplier to every order holding one of its products and
+    then to *all* lines of that order, so each distinct (order, supplier) pair
+    stands for the order's line count and adds the order's whole value.
+    """
+    facts = line_facts(snap)
+    supplier = snap["supplier"]
+    kept, supplier_rows = join(np.asarray(snap["product"]["supplierID"])[facts["product"]], supplier["supplierID"])
+    span = len(supplier)
+    pairs = distinct_sorted(facts["order"][kept] * span + supplier_rows)
+    pair_order, pair_supplier = pairs // span, pairs % span
+    n_orders = len(snap["orders"])
+    order_lines = np.bincount(facts["order"], minlength=n_orders)
+    # Per-order totals stay far below 2**53 cents, so the float bincount is exact.
+    order_value = np.bincount(facts["order"], weights=facts["value"], minlength=n_orders).astype(np.int64)
+    kept, address_rows = join_address(snap, "supplier", pair_supplier)
+    pair_order, pair_supplier = pair_order[kept], pair_supplier[kept]
+    who = np.asarray(supplier["supplierID"])[pair_supplier]
+    rows = _demographics(snap, address_rows, who, order_value[pair_order], facts["scale"],
+                         weights=order_lines[pair_order])
+    return Result(["country", "state", "supplier_count", "avg_earned", "total_earned"], rows)
+
+
+def query_05(snap, supplier_id):
+    """One supplier's distinct orders and sales by year, month and the customer's country."""
+    product = snap["product"]
+    products = np.asarray(product["productID"])[np.asarray(product["supplierID"]) == supplier_id]
+    if not np.isin(supplier_id, snap["supplier"]["supplierID"]):
+        products = products[:0]
+    # Filter the order lines on the supplier's products before joining anything.
+    lines = np.flatnonzero(np.isin(snap["order_product"]["productID"], products))
+    facts = customer_facts(snap, line_facts(snap, lines))
+    year, _, month = date_parts(np.asarray(snap["orders"]["order_date"])[facts["order"]])
+    keys = [factorize(year), factorize(month),
+            factorize(snap["address"]["country"], facts["address"])]
+    order_id = np.asarray(snap["orders"]["orderID"])[facts["order"]]
+    key_codes, _, (sales,), (orders,) = rollup(keys, sums=[facts["value"]], distinct=[order_id])
+    rows = [_key_values(keys, key_codes, i) + (int(orders[i]), decimal(sales[i], facts["scale"]))
+            for i in range(len(orders))]
+    return Result(["year", "month", "country", "total_quantity", "total_sales"], rollup_order(rows, 3))
+
+
+QUERIES = {1: query_01, 2: query_02, 3: query_03, 4: query_04, 5: query_05}
+
+# Result columns each query is ordered by, used to compare against SQLite.
+ORDER_BY = {1: [0, 2], 2: [2], 3: [0, 4], 4: [0, 4], 5: []}
+
+
+def run(snap, number, supplier_id=1):
+    with instrument.stage("olap.query", query=number) as s:
+        snap = snap if isinstance(snap, Snapshot) else Snapshot(snap)
+        result = QUERIES[number](snap, supplier_id) if number == 5 else QUERIES[number](snap)
+        s.add_rows(len(result.rows))
+    return result
+
+
+def rollup_sql(keys, measures, body, order_by=None):
+    """Emulate ``GROUP BY <keys> WITH ROLLUP`` with a ``UNION ALL`` branch per grouping level."""
+    branches = []
+    for level in range(len(keys), -1, -1):
+        columns = [f"{expr if i < level else 'NULL'} AS {alias}" for i, (expr, alias) in enumerate(keys)]
+        # The grand total of an empty input is no row at all, as in MySQL.
+        group = " GROUP BY " + ", ".join(expr for expr, _ in keys[:level]) if level else " HAVING COUNT(*) > 0"
+        branches.append(f"SELECT {', '.join(columns + measures)}\n{body}{group}")
+    sql = "\nUNION ALL\n".join(branches)
+    return sql + (f"\nORDER BY {order_by}" if order_by else "")
+
+
+YEAR = "CAST(strftime('%Y', order_date) AS INTEGER)"
+MONTH = "CAST(strftime('%m', order_date) AS INTEGER)"
+QUARTER = f"(({MONTH} + 2) / 3)"
+LINES = ("FROM orders o JOIN order_product op ON o.orderID = op.orderID "
+         "JOIN product p ON op.productID = p.productID")
+CUSTOMER_ADDRESS = ("JOIN customer c ON o.customerID = c.customerID "
+                    "JOIN address a ON c.addressID = a.addressID")
+
+SQLITE_QUERIES = {
+    1: rollup_sql([(YEAR, "date_year"), (QUARTER, "date_quarter"), (MONTH, "date_month")],
+                  ["COUNT(o.orderID) AS order_count", "SUM(p.price * op.quantity) AS revenue"],
+                  LINES, "date_year DESC, date_month DESC"),
+    2: rollup_sql([("a.country", "country")],
+                  ["COUNT(DISTINCT o.orderID) AS order_count", "SUM(op.quantity * p.price) AS revenue"],
+                  f"{LINES} {CUSTOMER_ADDRESS}", "revenue DESC"),
+    3: rollup_sql([("a.country", "country"), ("a.state", "state")],
+                  ["COUNT(DISTINCT c.customerID) AS customer_count",
+                   "AVG(p.price * op.quantity) AS avg_spent", "SUM(p.price * op.quantity) AS total_spent"],
+                  f"{LINES} {CUSTOMER_ADDRESS}", "country ASC, total_spent DESC"),
+    # The correlated IN (...) join of the MySQL text is rewritten as a join on
+    # the distinct (order, supplier) pairs it selects; SQLite would otherwise
+    # evaluate the subquery for every supplier x order combination.
+    4: rollup_sql([("a.country", "country"), ("a.state", "state")],
+                  ["COUNT(DISTINCT s.supplierID) AS supplier_count",
+                   "AVG(p.price * op.quantity) AS avg_earned", "SUM(p.price * op.quantity) AS total_earned"],
+                  "FROM supplier s JOIN (SELECT DISTINCT op2.orderID, p2.supplierID FROM order_product op2 "
+                  "JOIN product p2 ON op2.productID = p2.productID) os ON os.supplierID = s.supplierID "
+                  "JOIN orders o ON o.orderID = os.orderID "
+                  "JOIN order_product op ON o.orderID = op.orderID JOIN product p ON op.productID = p.productID "
+                  "JOIN address a ON s.addressID = a.addressID",
+                  "country ASC, total_earned DESC"),
+    5: rollup_sql([(YEAR, "year"), (MONTH, "month"), ("a.country", "country")],
+                  ["COUNT(DISTINCT o.orderID) AS total_quantity", "SUM(op.quantity * p.price) AS total_sales"],
+                  f"{LINES} {CUSTOMER_ADDRESS} JOIN supplier s ON p.supplierID = s.supplierID "
+                  "WHERE s.supplierID = :s_id"),
+}
+
+
+def run_sqlite(conn, number, supplier_id=1):
+    with instrument.stage("sqlite.query", query=number) as s:
+        cursor = conn.execute(SQLITE_QUERIES[number], {"s_id": supplier_id} if number == 5 else {})
+        result = Result([d[0] for d in cursor.description], cursor.fetchall())
+        s.add_rows(len(result.rows))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snapshot", required=True, help="columnar snapshot directory")
+    parser.add_argument("--query", type=int, choices=sorted(QUERIES), default=1)
+    parser.add_argument("--supplier", type=int, default=1, help="s_id for Query-05")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    result = run(args.snapshot, args.query, args.supplier)
+    elapsed = time.perf_counter() - t0
+    print("\t".join(result.columns))
+    for row in result.rows:
+        print("\t".join("NULL" if v is None else str(v) for v in row))
+    print(f"Query-{args.query:02d}: {len(result.rows)} rows in {1000 * elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
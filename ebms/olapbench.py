@@ -0,0 +1,114 @@
+"""Benchmark the OLAP engine against the same reports on the SQLite stand-in.
+
+For every scale factor a dataset is generated, exported to a columnar
+snapshot and loaded (with the schema's indexes) into a SQLite file database.
+Each of Query-01 to Query-05 then runs on both sides; the best of
+``--repeat`` runs is reported, and every engine result is checked against
+SQLite: the same rows, with the ``ORDER BY`` columns in the same sequence.
+SQLite sums ``DECIMAL`` columns as floating point, so money is compared to within a
+cent and averages to within their sixth decimal.
+
+    python -m ebms.olapbench --scale-factors 1,10,100 --json olap-bench.json
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from . import columnar, olap, standin
+from .generator import Generator
+
+
+def _canonical(value, like):
+    """Bring a SQLite value to the type and precision of the engine's value."""
+    if isinstance(like, Decimal) and value is not None:
+        return Decimal(repr(float(value))).quantize(like)
+    return value
+
+
+def _close(a, b):
+    if isinstance(a, Decimal) and isinstance(b, Decimal):
+        return abs(a - b) <= 2 * Decimal(1).scaleb(a.as_tuple().exponent)
+    return a == b
+
+
+def _sort_key(row):
+    return [(v is not None, str(v) if isinstance(v, str) else float(v) if v is not None else 0) for v in row]
+
+
+def same_result(number, ours, theirs):
+    """True when both results hold the same rows and agree on the ``ORDER BY`` sequence."""
+    if len(ours.rows) != len(theirs.rows):
+        return False
+    if not ours.rows:
+        return True
+    theirs_rows = [tuple(_canonical(v, like) for v, like in zip(row, ours.rows[0])) for row in theirs.rows]
+    for column in olap.ORDER_BY[number]:
+        if not all(_close(a[column], b[column]) for a, b in zip(ours.rows, theirs_rows)):
+            return False
+    return all(all(_close(a, b) for a, b in zip(x, y))
+               for x, y in zip(sorted(ours.rows, key=_sort_key), sorted(theirs_rows, key=_sort_key)))
+
+
+def best_of(repeat, fn):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def run_scale(scale_factor, work_dir, seed=42, repeat=3, supplier_id=1):
+    """Benchmark one scale factor; returns ``{query: {...}}``."""
+    data_dir = Path(work_dir) / f"sf-{scale_factor:g}"
+    Generator(scale_factor, seed).write_csv(data_dir)
+    columnar.export(data_dir, data_dir / "columnar")
+    snap = columnar.Snapshot(data_dir / "columnar")
+    conn = standin.connect(str(data_dir / "ebms.db"))
+    try:
+        standin.load_csv_dir(conn, data_dir)
+        conn.execute("ANALYZE")
+        report = {}
+        for number in olap.QUERIES:
+            engine_s, ours = best_of(repeat, lambda: olap.run(snap, number, supplier_id))
+            sqlite_s, theirs = best_of(repeat, lambda: olap.run_sqlite(conn, number, supplier_id))
+            report[f"Query-{number:02d}"] = {
+                "rows": len(ours.rows), "engine_s": engine_s, "sqlite_s": sqlite_s,
+                "speedup": sqlite_s / engine_s if engine_s else 0.0,
+                "match": same_result(number, ours, theirs),
+            }
+    finally:
+        conn.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale-factors", default="1,10,100")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--supplier", type=int, default=1, help="s_id for Query-05")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    report = {}
+    print(f"{'scale':>6}  {'query':<10}{'rows':>6}{'engine ms':>11}{'sqlite ms':>11}{'speedup':>9}  match")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for sf in (float(s) for s in args.scale_factors.split(",")):
+            report[f"{sf:g}"] = results = run_scale(sf, work_dir, args.seed, args.repeat, args.supplier)
+            for query, r in results.items():
+                print(f"{sf:>6g}  {query:<10}{r['rows']:>6}{1000 * r['engine_s']:>11.1f}"
+                      f"{1000 * r['sqlite_s']:>11.1f}{r['speedup']:>8.1f}x  {'yes' if r['match'] else 'NO'}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if not all(r["match"] for results in report.values() for r in results.values()):
+        raise SystemExit("engine results differ from SQLite")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""Range-partitioned ``orders`` and ``order_product`` by order month, with partition pruning.
+
+Every OLAP report groups or filters on ``YEAR(order_date)``/``MONTH(order_date)``,
+which no index serves, so a report on the last quarter still reads all history.
+This module keeps the two order tables in one segment per period instead:
+
+* ``mysql_schema`` writes the MySQL variant: ``PARTITION BY RANGE COLUMNS
+  (order_date)`` for both tables, where ``order_product`` carries its
+  order's date, and a migration that copies the data over and swaps the
+  tables in.  MySQL wants the partitioning column in every unique key and
+  allows no foreign keys on partitioned tables, so the primary keys gain
+  ``order_date`` and the two ``FOREIGN KEY``s go; reports prune when they
+  filter on ``order_date`` ranges rather than on ``YEAR()``.  A trigger fills
+  in a new order line's date, and the triggers of ``Sql Queries/triggers.sql``
+  on ``orders``, which ``RENAME TABLE`` leaves on the old table, are
+  re-created on the new one.
+* ``migrate`` does the same to a columnar snapshot (``ebms.columnar``), for
+  local use: ``<out>/p-YYYY-MM/`` holds one period's orders and order lines
+  (a line belongs to its order's period), ``<out>/shared/`` the other tables,
+  and ``partitions.json`` lists the periods with their date ranges.
+
+``PartitionedStore.view(start, stop)`` opens only the periods overlapping
+``[start, stop)`` and returns a snapshot-like view with just the orders dated
+in the range (and their lines), which the ``ebms.olap`` reports run on as
+is.  ``date_view`` applies the same filter to an unpartitioned snapshot, which
+has to read the whole of ``orders`` to find them; ``--bench`` compares the
+two on the most recent quarter, next to the reports over all history.
+
+    python -m ebms.partitions --snapshot generated/sf-100/columnar --out generated/sf-100/partitioned --bench
+    python -m ebms.partitions --snapshot generated/sf-100/columnar --mysql partitioned-schema.sql
+"""
+
+import argparse
+import json
+import re
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from . import olap
+from .columnar import Snapshot, write_manifest
+from .schema import load_schema
+from .tables import QUERIES_DIR
+
+PARTITIONED = ("orders", "order_product")
+PERIOD_MONTHS = {"month": 1, "quarter": 3}
+
+
+def period_starts(first, last, period="month"):
+    """``datetime64[M]`` starts of the periods covering ``first`` to ``last`` (inclusive)."""
+    step = PERIOD_MONTHS[period]
+    lo = first.astype("datetime64[M]").astype(np.int64) // step * step
+    hi = last.astype("datetime64[M]").astype(np.int64) // step * step
+    return np.arange(lo, hi + step, step).astype("datetime64[M]")
+
+
+def _partition_name(start):
+    return f"p{str(start).replace('-', '_')}"
+
+
+_ORDERS_TRIGGER = re.compile(r"CREATE\s+TRIGGER\s+(\w+)\s+\w+\s+\w+\s+ON\s+orders\s.*?\bEND\s*;", re.I | re.S)
+
+
+def orders_triggers(path=QUERIES_DIR / "triggers.sql"):
+    """``(name, CREATE TRIGGER statement)`` of the triggers defined on ``orders``."""
+    return [(m.group(1), m.group(0)) for m in _ORDERS_TRIGGER.finditer(Path(path).read_text())]
+
+
+def mysql_schema(first, last, period="month"):
+    """DDL and migration for the partitioned ``orders`` and ``order_product`` (MySQL 8)."""
+    starts = period_starts(first, last, period)
+    step = PERIOD_MONTHS[period]
+    ranges = ",\n".join(f"    PARTITION {_partition_name(s)} VALUES LESS THAN ('{(s + step).astype('datetime64[D]')}')"
+                        for s in starts)
+    partitions = f"PARTITION BY RANGE COLUMNS (order_date) (\n{ranges},\n    PARTITION pmax VALUES LESS THAN (MAXVALUE)\n)"
+    _, indexes = load_schema()
+    moved = [i for i in indexes if i.table in PARTITIONED]
+    triggers = [*orders_triggers(), ("order_product_date", "\n".join([
+        "CREATE TRIGGER order_product_date BEFORE INSERT ON order_product",
+        "FOR EACH ROW",
+        "BEGIN",
+        "    SET NEW.order_date = (SELECT order_date FROM orders WHERE orderID = NEW.orderID);",
+        "END;"]))]
+    return "\n".join([
+        f"-- orders and order_product range-partitioned by {period} of order_date.",
+        "-- The partitioning column has to be part of every unique key, and partitioned InnoDB",
+        "-- tables take no foreign keys, so both primary keys gain order_date and the FKs go.",
+        "-- Reports prune partitions when they filter on order_date ranges, e.g.",
+        "--   WHERE o.order_date >= '2024-10-01' AND o.order_date < '2025-01-01'",
+        "-- rather than on YEAR(order_date) or MONTH(order_date).",
+        "",
+        "CREATE TABLE IF NOT EXISTS orders_partitioned (",
+        "    orderID INT NOT NULL AUTO_INCREMENT,",
+        "    customerID INT NOT NULL,",
+        "    daID INT NOT NULL,",
+        "    order_date DATE NOT NULL,",
+        "    delivery_date DATE,",
+        "    CHECK (delivery_date >= order_date),",
+        "    PRIMARY KEY (orderID, order_date)",
+        f") {partitions};",
+        "",
+        "CREATE TABLE IF NOT EXISTS order_product_partitioned (",
+        "    orderID INT NOT NULL,",
+        "    productID INT NOT NULL,",
+        "    quantity INT NOT NULL,",
+        "    order_date DATE NOT NULL DEFAULT '1000-01-01',  -- set from orders by order_product_date",
+        "    CHECK (quantity >= 1),",
+        "    PRIMARY KEY (orderID, productID, order_date)",
+        f") {partitions};",
+        "",
+        "-- Migration: copy the data, then swap the tables in.",
+        "INSERT INTO orders_partitioned SELECT * FROM orders;",
+        "INSERT INTO order_product_partitioned (orderID, productID, quantity, order_date)",
+        "SELECT op.orderID, op.productID, op.quantity, o.order_date",
+        "FROM order_product op JOIN orders o ON o.orderID = op.orderID;",
+        "RENAME TABLE orders TO orders_unpartitioned, orders_partitioned TO orders,",
+        "    order_product TO order_product_unpartitioned, order_product_partitioned TO order_product;",
+        "",
+        "-- Indexes of database-schema.sql on the moved tables",
+        *(f"CREATE {'UNIQUE ' if i.unique else ''}INDEX {i.name} ON {i.table}({', '.join(i.columns)});"
+          for i in moved),
+        "",
+        "-- Triggers stay with their table on RENAME TABLE: move the ones on orders over, and",
+        "-- give order lines inserted without order_date (Simple Query-01) their order's date.",
+        *(line for name, statement in triggers
+          for line in (f"DROP TRIGGER IF EXISTS {name};", "DELIMITER $$", statement, "$$", "DELIMITER ;")),
+        "",
+        "-- A new period needs its partition before the first order of it arrives:",
+        "-- ALTER TABLE orders REORGANIZE PARTITION pmax INTO (",
+        "--     PARTITION pYYYY_MM VALUES LESS THAN ('YYYY-MM-01'), PARTITION pmax VALUES LESS THAN (MAXVALUE));",
+        "",
+    ])
+
+
+class _Table:
+    """Columns of a table held in memory, with the snapshot table interface ``ebms.olap`` uses."""
+
+    def __init__(self, entry, columns):
+        self.entry = dict(entry, rows=len(next(iter(columns.values()))))
+        self._columns = columns
+
+    def __len__(self):
+        return self.entry["rows"]
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def scale(self, column):
+        return self.entry["columns"][column].get("scale", 0)
+
+    def __getitem__(self, column):
+        return self._columns[column]
+
+
+class View:
+    """A snapshot whose ``orders`` and ``order_product`` are replaced by the given tables."""
+
+    def __init__(self, shared, tables):
+        self.shared = shared
+        self._tables = tables
+
+    @property
+    def tables(self):
+        return sorted(set(self.shared.tables) | set(self._tables))
+
+    def __contains__(self, table):
+        return table in self._tables or table in self.shared
+
+    def __getitem__(self, table):
+        return self._tables[table] if table in self._tables else self.shared[table]
+
+
+def _restrict(orders, lines, start, stop):
+    """Keep the orders dated in ``[start, stop)`` and their lines; ``None`` bounds are open."""
+    date = orders["order_date"]
+    keep = np.ones(len(date), dtype=bool)
+    if start is not None:
+        keep &= date >= np.datetime64(start, "D")
+    if stop is not None:
+        keep &= date < np.datetime64(stop, "D")
+    if keep.all():
+        return orders, lines
+    orders = {c: v[keep] for c, v in orders.items()}
+    in_range = np.isin(lines["orderID"], orders["orderID"])
+    return orders, {c: v[in_range] for c, v in lines.items()}
+
+
+def _read(table):
+    return {c: np.asarray(table[c]) for c in table.columns}
+
+
+def date_view(snap, start=None, stop=None):
+    """The unpartitioned layout: scan all of ``orders`` for the dates in ``[start, stop)``."""
+    orders, lines = _restrict(_read(snap["orders"]), _read(snap["order_product"]), start, stop)
+    return View(snap, {"orders": _Table(snap["orders"].entry, orders),
+                       "order_product": _Table(snap["order_product"].entry, lines)})
+
+
+def migrate(snapshot_dir, out_dir, period="month"):
+    """Split a columnar snapshot into period segments plus the shared tables; returns the period list."""
+    snap = Snapshot(snapshot_dir)
+    out_dir = Path(out_dir)
+    shared = out_dir / "shared"
+    shared.mkdir(parents=True, exist_ok=True)
+    for table in snap.tables:
+        if table not in PARTITIONED:
+            for path in Path(snapshot_dir).glob(f"{table}.*"):
+                shutil.copyfile(path, shared / path.name)
+    write_manifest(shared, {t: e for t, e in snap.manifest["tables"].items() if t not in PARTITIONED})
+
+    orders, lines = _read(snap["orders"]), _read(snap["order_product"])
+    step = PERIOD_MONTHS[period]
+    order_period = orders["order_date"].astype("datetime64[M]").astype(np.int64) // step * step
+    kept, order_rows = olap.join(lines["orderID"], orders["orderID"])
+    line_period = np.full(len(lines["orderID"]), -1, dtype=np.int64)  # lines without an order are dropped
+    line_period[kept] = order_period[order_rows]
+    periods = []
+    for start in np.unique(order_period).tolist():
+        first = np.datetime64(start, "M")
+        directory = out_dir / f"p-{first}"
+        directory.mkdir(exist_ok=True)
+        entries = {}
+        for table, columns, rows in (("orders", orders, order_period == start),
+                                     ("order_product", lines, line_period == start)):
+            source = snap.manifest["tables"][table]
+            for name, values in columns.items():
+                np.save(directory / f"{table}.{name}.npy", values[rows])
+            entries[table] = {"rows": int(rows.sum()), "columns": {
+                name: dict(source["columns"][name], rows=int(rows.sum())) for name in columns}}
+        write_manifest(directory, entries)
+        periods.append({"start": str(first.astype("datetime64[D]")),
+                        "stop": str((first + step).astype("datetime64[D]")),
+                        "path": directory.name, "orders": entries["orders"]["rows"],
+                        "lines": entries["order_product"]["rows"]})
+    (out_dir / "partitions.json").write_text(json.dumps({"period": period, "partitions": periods}, indent=1))
+    return periods
+
+
+class PartitionedStore:
+    """A directory written by ``migrate``."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        meta = json.loads((self.root / "partitions.json").read_text())
+        self.period = meta["period"]
+        self.partitions = meta["partitions"]
+        self.shared = Snapshot(self.root / "shared")
+
+    def prune(self, start=None, stop=None):
+        """The partitions overlapping ``[start, stop)`` (ISO dates; ``None`` is open)."""
+        return [p for p in self.partitions
+                if (start is None or p["stop"] > str(start)) and (stop is None or p["start"] < str(stop))]
+
+    def view(self, start=None, stop=None):
+        """A snapshot-like view of the orders dated in ``[start, stop)``, read from the pruned partitions only."""
+        chosen = [Snapshot(self.root / p["path"]) for p in self.prune(start, stop)]
+        if not chosen:
+            raise ValueError(f"no partition overlaps {start} .. {stop}")
+        orders, lines = ({c: np.concatenate([np.asarray(s[table][c]) for s in chosen]) for c in chosen[0][table].columns}
+                         for table in PARTITIONED)
+        orders, lines = _restrict(orders, lines, start, stop)
+        return View(self.shared, {"orders": _Table(chosen[0]["orders"].entry, orders),
+                                  "order_product": _Table(chosen[0]["order_product"].entry, lines)})
+
+
+def report(view, number, supplier_id=1):
+    return olap.QUERIES[number](view, supplier_id) if number == 5 else olap.QUERIES[number](view)
+
+
+def recent_quarter(snap):
+    """``(start, stop)`` of the last calendar quarter with orders."""
+    last = np.asarray(snap["orders"]["order_date"]).max().astype("datetime64[M]").astype(np.int64)
+    start = np.datetime64(int(last) // 3 * 3, "M")
+    return str(start.astype("datetime64[D]")), str((start + 3).astype("datetime64[D]"))
+
+
+def bench(snapshot_dir, root, repeat=5, supplier_id=1):
+    """Recent-quarter reports on the unpartitioned snapshot and the partitioned store; ``{query: {...}}``."""
+    snap = Snapshot(snapshot_dir)
+    store = PartitionedStore(root)
+    start, stop = recent_quarter(snap)
+    results = {"range": [start, stop], "partitions": len(store.prune(start, stop)), "of": len(store.partitions)}
+    for number in olap.QUERIES:
+        timings = {}
+        for layout, open_view in (("history", lambda: Snapshot(snapshot_dir)),
+                                  ("unpartitioned", lambda: date_view(Snapshot(snapshot_dir), start, stop)),
+                                  ("partitioned", lambda: PartitionedStore(root).view(start, stop))):
+            best = float("inf")
+            for _ in range(repeat):
+                t0 = time.perf_counter()
+                rows = report(open_view(), number, supplier_id).rows
+                best = min(best, time.perf_counter() - t0)
+            timings[layout] = (best, rows)
+        (full_s, full_rows), (pruned_s, pruned_rows) = timings["unpartitioned"], timings["partitioned"]
+        results[f"Query-{number:02d}"] = {"rows": len(pruned_rows), "history_s": timings["history"][0],
+                                          "unpartitioned_s": full_s, "partitioned_s": pruned_s,
+                                          "match": full_rows == pruned_rows}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--snapshot", required=True, help="columnar snapshot directory")
+    parser.add_argument("--out", help="partitioned store directory to create")
+    parser.add_argument("--period", choices=sorted(PERIOD_MONTHS), default="month")
+    parser.add_argument("--mysql", help="write the MySQL partitioned schema and migration to this file")
+    parser.add_argument("--bench", action="store_true", help="compare recent-quarter reports with --out")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--supplier", type=int, default=1, help="s_id for Query-05")
+    args = parser.parse_args(argv)
+
+    if args.mysql:
+        dates = np.asarray(Snapshot(args.snapshot)["orders"]["order_date"])
+        Path(args.mysql).write_text(mysql_schema(dates.min(), dates.max(), args.period))
+        print(f"wrote {args.mysql}")
+    if args.out:
+        t0 = time.perf_counter()
+        periods = migrate(args.snapshot, args.out, args.period)
+        print(f"{len(periods)} {args.period} partitions ({periods[0]['start']} .. {periods[-1]['stop']}) "
+              f"written in {time.perf_counter() - t0:.2f} s")
+    if args.bench:
+        if not args.out:
+            parser.error("--bench needs --out")
+        r = bench(args.snapshot, args.out, args.repeat, args.supplier)
+        print(f"{r['range'][0]} .. {r['range'][1]}: {r['partitions']} of {r['of']} partitions read")
+        print(f"{'query':<10}{'rows':>6}{'all history ms':>16}{'unpartitioned ms':>18}{'partitioned ms':>16}{'speedup':>9}  match")
+        for number in olap.QUERIES:
+            q = r[f"Query-{number:02d}"]
+            print(f"Query-{number:02d}  {q['rows']:>6}{1000 * q['history_s']:>16.1f}{1000 * q['unpartitioned_s']:>18.1f}"
+                  f"{1000 * q['partitioned_s']:>16.1f}{q['unpartitioned_s'] / q['partitioned_s']:>8.1f}x  "
+                  f"{'yes' if q['match'] else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Write the ``Data-Population`` SQL files from a directory of table CSVs.
+
+Output formats:
+
+* ``rows``: one ``INSERT INTO <table> VALUES (...);`` per row, as ``generator.ipynb`` writes them
+* ``multirow``: ``INSERT INTO <table> VALUES (...), (...), ...;`` with ``--batch-size`` rows each
+* ``load``: a ``LOAD DATA LOCAL INFILE`` manifest that points MySQL at the CSVs
+
+``rows`` and ``multirow`` also write ``data-population.sql``, the per-table
+files concatenated in load order.
+
+    python -m ebms.population --data generated/sf-100 --format multirow --batch-size 1000
+"""
+
+import argparse
+import csv
+import re
+import shutil
+from pathlib import Path
+
+from .tables import LOAD_ORDER, sql_columns
+
+FORMATS = ("rows", "multirow", "load")
+NUMBER = re.compile(r"-?\d+(\.\d+)?")
+
+
+def sql_literal(value):
+    """Render one CSV field as a SQL literal: empty fields become NULL, numbers and booleans stay bare."""
+    if value == "":
+        return "NULL"
+    if NUMBER.fullmatch(value) or value.casefold() in {"true", "false"}:
+        return value
+    return "'" + value.replace("'", "''") + "'"
+
+
+def row_values(row):
+    return "(" + ", ".join(sql_literal(value) for value in row) + ")"
+
+
+def insert_statements(rows, table, fmt="rows", batch_size=1000):
+    """Yield the INSERT statements for an iterable of rows (fields are rendered with ``str``)."""
+    if fmt == "rows":
+        for row in rows:
+            yield f"INSERT INTO {table} VALUES {row_values(map(str, row))};\n"
+        return
+    batch = []
+    for row in rows:
+        batch.append(row_values(map(str, row)))
+        if len(batch) == batch_size:
+            yield f"INSERT INTO {table} VALUES\n" + ",\n".join(batch) + ";\n"
+            batch = []
+    if batch:
+        yield f"INSERT INTO {table} VALUES\n" + ",\n".join(batch) + ";\n"
+
+
+def write_table(csv_path, sql_path, table, fmt="rows", batch_size=1000):
+    """Write the INSERT statements for one table; returns the number of rows."""
+    rows = 0
+
+    def counted(reader):
+        nonlocal rows
+        for row in reader:
+            rows += 1
+            yield row
+
+    with open(csv_path, newline="") as f1, open(sql_path, "w") as f2:
+        reader = csv.reader(f1)
+        next(reader)
+        f2.write("USE EBMS;\n\n")
+        f2.writelines(insert_statements(counted(reader), table, fmt, batch_size))
+    return rows
+
+
+def load_statement(csv_path, table):
+    """``LOAD DATA`` statement for one table CSV.
+
+    Every field goes through a user variable so that empty fields load as NULL
+    (like ``sql_literal``) and ``true``/``false`` become booleans.  The line
+    terminator is the header's: ``csv.writer`` (the generator) ends lines with
+    CRLF, the seed CSVs in ``Database-Generation/Data`` with LF.
+    """
+    with open(csv_path, newline="") as f:
+        terminator = "\\r\\n" if f.readline().endswith("\r\n") else "\\n"
+        first = next(csv.reader(f), [])
+    columns = sql_columns(table)
+    assignments = []
+    for i, column in enumerate(columns):
+        if i < len(first) and first[i].casefold() in {"true", "false"}:
+            assignments.append(f"{column} = (LOWER(@{column}) = 'true')")
+        else:
+            assignments.append(f"{column} = NULLIF(@{column}, '')")
+    return (
+        f"LOAD DATA LOCAL INFILE '{Path(csv_path).resolve().as_posix()}'\n"
+        f"INTO TABLE {table}\n"
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'\n"
+        f"LINES TERMINATED BY '{terminator}'\n"
+        "IGNORE 1 LINES\n"
+        f"({', '.join('@' + c for c in columns)})\n"
+        f"SET {', '.join(assignments)};\n"
+    )
+
+
+def write_manifest(data_dir, path, tables=LOAD_ORDER):
+    """Write the ``LOAD DATA`` manifest for every table CSV found in ``data_dir``."""
+    data_dir = Path(data_dir)
+    with open(path, "w") as f:
+        f.write("USE EBMS;\n\n")
+        for table in tables:
+            csv_path = data_dir / f"{table}.csv"
+            if csv_path.exists():
+                f.write(f"-- {table.upper()}\n")
+                f.write(load_statement(csv_path, table))
+                f.write("\n")
+
+
+def combine(sql_dir, path, tables=LOAD_ORDER):
+    """Concatenate the per-table files into one population file without reading them whole."""
+    sql_dir = Path(sql_dir)
+    with open(path, "w") as f1:
+        for table in tables:
+            table_path = sql_dir / f"{table}.sql"
+            if not table_path.exists():
+                continue
+            f1.write(f"-- {table.upper()}\n")
+            with open(table_path) as f2:
+                shutil.copyfileobj(f2, f1)
+            f1.write("\n")
+
+
+def write_population(data_dir, out_dir, fmt="rows", batch_size=1000, tables=LOAD_ORDER):
+    """Write ``out_dir/<table>.sql`` and ``data-population.sql`` (or ``load-data.sql``); returns ``{table: rows}``."""
+    data_dir, out_dir = Path(data_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if fmt == "load":
+        write_manifest(data_dir, out_dir / "load-data.sql", tables)
+        return {}
+    written = {}
+    for table in tables:
+        csv_path = data_dir / f"{table}.csv"
+        if csv_path.exists():
+            written[table] = write_table(csv_path, out_dir / f"{table}.sql", table, fmt, batch_size)
+    combine(out_dir, out_dir / "data-population.sql", tables)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", required=True, help="directory with <table>.csv files")
+    parser.add_argument("--out", default=None, help="output directory (default: <data>/Data-Population)")
+    parser.add_argument("--format", choices=FORMATS, default="rows")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows per INSERT for --format multirow")
+    args = parser.parse_args(argv)
+
+    out = args.out or Path(args.data) / "Data-Population"
+    for table, rows in write_population(args.data, out, args.format, args.batch_size).items():
+        print(f"Generated {table}.sql ({rows} rows)")
+    if args.format == "load":
+        print(f"Generated {Path(out) / 'load-data.sql'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Latency of every ``-- Query-NN`` block across scale factors, with regression checks.
+
+The blocks of ``embedded-queries.sql``, ``simple-queries.sql`` and
+``olap-queries.sql`` run on the SQLite stand-in loaded with generated data at
+each scale factor.  ``%s`` and ``{name}`` placeholders are bound from values
+sampled out of the loaded data (the column they are compared with; a word of it
+for ``LIKE``), a different sample on every run.  A block's statements run in
+one transaction that is rolled back, so writes do not pile up between runs.
+The OLAP reports run as their ``WITH ROLLUP`` emulation from ``ebms.olap``.
+
+    python -m ebms.querybench --scale-factors 1,10 --repeat 20 --json bench.json
+    python -m ebms.querybench --compare base.json bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import random
+import re
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from . import olap, queryfiles, standin
+from .generator import Generator
+from .indexadvisor import table_aliases
+from .tables import QUERIES_DIR, sql_columns
+
+Block = namedtuple("Block", "name title statements")
+
+QUERY_FILES = ("embedded-queries", "simple-queries", "olap-queries")
+PERCENTILES = (50, 95, 99)
+
+# Blocks run with CHECK constraints off.  Simple Query-01's wallet UPDATE has no
+# WHERE, so it drives some balance below zero on every run; the runs are rolled
+# back anyway, and without this the order placement block is never timed.
+UNCHECKED = {"simple-queries Query-01"}
+
+_PLACEHOLDER = re.compile(r"(?:(\w+)\.)?(\w+)\s*(=|LIKE)\s*'?%?(%s|\{\w+\})", re.I)
+
+# Placeholders sampled from a query instead of their column's values: most
+# suppliers have no sales, which would leave OLAP Query-05 timing an empty report.
+SAMPLE_FROM = {
+    "{s_id}": "SELECT DISTINCT p.supplierID FROM product p JOIN order_product op ON op.productID = p.productID",
+}
+
+
+def read_blocks(queries_dir=QUERIES_DIR, files=QUERY_FILES):
+    """One ``Block`` per ``-- Query-NN`` header, holding its statements in order."""
+    blocks = {}
+    for source in files:
+        for query in queryfiles.read_queries(Path(queries_dir) / f"{source}.sql"):
+            name = f"{source} {query.label.split('.')[0]}"
+            sql = query.sql
+            if source == "olap-queries":
+                sql = olap.SQLITE_QUERIES[int(name[-2:])].replace(":s_id", "{s_id}")
+            blocks.setdefault(name, Block(name, query.title, []))[2].append(sql)
+    return list(blocks.values())
+
+
+def _sample(conn, table, column, like, rng, n, source=None):
+    source = source or f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL"
+    values = [v for v, in conn.execute(source)]
+    if not values:
+        return [None] * n
+    picked = rng.choices(values, k=n)
+    return [rng.choice(str(v).split() or [""]) for v in picked] if like else picked
+
+
+def bindings(conn, sql, rng, n):
+    """``n`` ``(sql, args)`` pairs with the placeholders bound to sampled values."""
+    aliases = table_aliases(sql)
+    positional, named = [], {}
+    for m in _PLACEHOLDER.finditer(sql):
+        qualifier, column, op, placeholder = m.groups()
+        table = aliases.get(qualifier) if qualifier else next(
+            (t for t in aliases.values() if column in sql_columns(t)), None)
+        source = SAMPLE_FROM.get(placeholder)
+        values = _sample(conn, table, column, op.upper() == "LIKE", rng, n, source) if table or source else [None] * n
+        if placeholder == "%s":
+            positional.append(values)
+        else:
+            named[placeholder[1:-1]] = values
+    return [(queryfiles.to_sqlite(queryfiles.bind(sql, {k: v[i] for k, v in named.items()})),
+             [v[i] for v in positional]) for i in range(n)]
+
+
+def run_block(conn, statements):
+    """Run one bound block; returns ``(seconds, rows returned, rows changed)``."""
+    returned = changed = 0
+    t0 = time.perf_counter()
+    for sql, args in statements:
+        cursor = conn.execute(sql, args)
+        if cursor.description:
+            returned += len(cursor.fetchall())
+        else:
+            changed += max(cursor.rowcount, 0)
+    elapsed = time.perf_counter() - t0
+    conn.rollback()
+    return elapsed, returned, changed
+
+
+def bench_block(conn, block, repeat, rng, warmup=1):
+    bound = [bindings(conn, sql, rng, repeat + warmup) for sql in block.statements]
+    times, returned, changed = [], [], []
+    if block.name in UNCHECKED:
+        conn.execute("PRAGMA ignore_check_constraints = ON")
+    try:
+        for i in range(repeat + warmup):
+            elapsed, rows, writes = run_block(conn, [b[i] for b in bound])
+            if i >= warmup:
+                times.append(elapsed)
+                returned.append(rows)
+                changed.append(writes)
+    except sqlite3.Error as e:
+        conn.rollback()
+        return {"error": str(e)}
+    finally:
+        conn.execute("PRAGMA ignore_check_constraints = OFF")
+    ms = 1000 * np.array(times)
+    result = {f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES}
+    result.update(mean_ms=float(ms.mean()), runs=repeat,
+                  rows=int(np.median(returned)), changed=int(np.median(changed)))
+    return result
+
+
+def run_scale(scale_factor, work_dir, blocks, seed=42, repeat=20):
+    """Benchmark every block on one scale factor; returns ``{block: {...}}``."""
+    data_dir = Path(work_dir) / f"sf-{scale_factor:g}"
+    Generator(scale_factor, seed).write_csv(data_dir)
+    conn = standin.connect(str(data_dir / "ebms.db"))
+    try:
+        standin.load_csv_dir(conn, data_dir)
+        conn.execute("ANALYZE")
+        queryfiles.register_functions(conn)
+        rng = random.Random(seed)
+        return {block.name: bench_block(conn, block, repeat, rng) for block in blocks}
+    finally:
+        conn.close()
+
+
+def compare(base, new, threshold=0.2, min_ms=0.05):
+    """Blocks whose p50 or p95 grew by more than ``threshold`` (and ``min_ms``), whose rows changed, or that failed.
+
+    A block that failed on either side is flagged under ``error`` with its error
+    messages (``ok`` for the side that ran).
+    """
+    flagged = []
+    for scale, results in new["results"].items():
+        for name, r in results.items():
+            b = base["results"].get(scale, {}).get(name)
+            if not b:
+                continue
+            if "error" in b or "error" in r:
+                flagged.append((scale, name, "error", b.get("error", "ok"), r.get("error", "ok")))
+                continue
+            for key in ("p50_ms", "p95_ms"):
+                if r[key] - b[key] > min_ms and r[key] > (1 + threshold) * b[key]:
+                    flagged.append((scale, name, key, b[key], r[key]))
+            if r["rows"] != b["rows"]:
+                flagged.append((scale, name, "rows", b["rows"], r["rows"]))
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale-factors", default="1,10")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--query", help="only run blocks whose name matches this regex")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown that counts")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            flagged = compare(json.load(f), json.load(g), args.threshold, args.min_ms)
+        for scale, name, key, before, after in flagged:
+            if key == "error":
+                print(f"sf {scale:>6}  {name:<32}{key:<8}{before} -> {after}")
+            else:
+                print(f"sf {scale:>6}  {name:<32}{key:<8}{before:>10.3f} -> {after:.3f}")
+        if flagged:
+            raise SystemExit(f"{len(flagged)} regressions")
+        print("no regressions")
+        return
+
+    blocks = [b for b in read_blocks() if not args.query or re.search(args.query, b.name)]
+    report = {"meta": {"seed": args.seed, "repeat": args.repeat, "sqlite": sqlite3.sqlite_version},
+              "results": {}}
+    print(f"{'scale':>6}  {'block':<32}{'rows':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for sf in (float(s) for s in args.scale_factors.split(",")):
+            results = report["results"][f"{sf:g}"] = run_scale(sf, work_dir, blocks, args.seed, args.repeat)
+            for name, r in results.items():
+                if "error" in r:
+                    print(f"{sf:>6g}  {name:<32}  error: {r['error']}")
+                else:
+                    print(f"{sf:>6g}  {name:<32}{r['rows']:>8}{r['p50_ms']:>10.3f}"
+                          f"{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
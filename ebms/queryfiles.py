@@ -0,0 +1,142 @@
+"""Statements of the ``Sql Queries`` files, split into their ``-- Query-NN`` blocks.
+
+The queries are written for MySQL.  ``to_sqlite`` rewrites the few constructs
+SQLite cannot parse and ``register_functions`` adds the MySQL functions they
+call, so that the tooling can prepare and run them on the stand-in.  Trigger
+bodies are read as the statements they run, with ``NEW.<column>`` left as a
+parameter.
+"""
+
+import re
+from collections import namedtuple
+from datetime import date, timedelta
+from pathlib import Path
+
+from .standin import split_statements
+from .tables import QUERIES_DIR, SCHEMA_PATH
+
+Query = namedtuple("Query", "source label title sql")
+
+# Values substituted for the application's ``{name}`` placeholders.
+PARAMETERS = {"search": "LED", "s_id": "1"}
+
+_HEADER = re.compile(r"^--\s*((?:Query|Trigger)-\d+):\s*(.*)$", re.M)
+_TRIGGER = re.compile(
+    r"CREATE\s+TRIGGER\s+(\w+)\s+\w+\s+\w+\s+ON\s+\w+\s+FOR\s+EACH\s+ROW\s+BEGIN\b(.*?)\bEND\s*;", re.I | re.S)
+
+
+def query_files(queries_dir=QUERIES_DIR):
+    """The query files in ``queries_dir`` (the schema copy kept there is skipped)."""
+    return sorted(p for p in Path(queries_dir).glob("*.sql") if p.name != SCHEMA_PATH.name)
+
+
+def _trigger_statements(body):
+    body = re.sub(r"\bIF\s+(?:NOT\s+)?EXISTS\s*\((.*?)\)\s*THEN\b", r"\1;", body, flags=re.I | re.S)
+    return split_statements(re.sub(r"\bEND\s+IF\b", "", body, flags=re.I))
+
+
+def read_queries(path):
+    """``Query`` tuples of one file, numbered ``Query-02.1``, ``Query-02.2``... within a block."""
+    path = Path(path)
+    text = re.sub(r"^\s*DELIMITER\s+\S+\s*$|\$\$", "", path.read_text(), flags=re.M)
+    parts = _HEADER.split(text)
+    queries = []
+    for label, title, block in zip(parts[1::3], parts[2::3], parts[3::3]):
+        found = []
+        for name, body in _TRIGGER.findall(block):
+            found += [(f"{title.strip()} [trigger {name}]", s) for s in _trigger_statements(body)]
+        rest = _TRIGGER.sub("", block)
+        found += [(title.strip(), s) for s in split_statements(rest)
+                  if not re.match(r"DROP\s+TRIGGER\b", s, re.I)]
+        for i, (title_i, statement) in enumerate(found, 1):
+            queries.append(Query(path.stem, label if len(found) == 1 else f"{label}.{i}", title_i, statement))
+    return queries
+
+
+def read_all(queries_dir=QUERIES_DIR):
+    return [q for path in query_files(queries_dir) for q in read_queries(path)]
+
+
+def bind(sql, values=PARAMETERS):
+    """Turn ``%s`` and ``NEW.<column>`` into ``?`` and fill in the ``{name}`` placeholders."""
+    sql = re.sub(r"%s\b|\bNEW\.\w+", "?", sql)
+    for name, value in values.items():
+        sql = sql.replace("{" + name + "}", str(value))
+    return sql
+
+
+def _top_level(sql, keyword, start=0):
+    """Offset of ``keyword`` outside parentheses and quotes, or -1."""
+    depth, quote = 0, None
+    for m in re.finditer(rf"[()'\"]|\b{keyword}\b", sql[start:], re.I):
+        token = m.group()
+        if quote:
+            quote = None if token == quote else quote
+        elif token in "'\"":
+            quote = token
+        elif token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            return start + m.start()
+    return -1
+
+
+def _update_join(sql):
+    """``UPDATE a x JOIN b y ON c SET ... WHERE w`` -> ``UPDATE a AS x SET ... FROM b AS y WHERE c AND w``."""
+    m = re.match(r"UPDATE\s+(\w+)\s+(?:AS\s+)?(\w+)\s+(?:INNER\s+)?JOIN\s+(\w+)\s+(?:AS\s+)?(\w+)\s+ON\s+",
+                 sql, re.I)
+    set_at = _top_level(sql, "SET", m.end())
+    where_at = _top_level(sql, "WHERE", set_at)
+    on = sql[m.end():set_at].strip()
+    assignments = sql[set_at + 3:where_at if where_at >= 0 else len(sql)].strip()
+    assignments = re.sub(rf"(^|,\s*){m.group(2)}\.(\w+)\s*=", r"\1\2 =", assignments)
+    where = f"({on})" + (f" AND ({sql[where_at + 5:].strip()})" if where_at >= 0 else "")
+    return (f"UPDATE {m.group(1)} AS {m.group(2)} SET {assignments} "
+            f"FROM {m.group(3)} AS {m.group(4)} WHERE {where}")
+
+
+def to_sqlite(sql):
+    """Rewrite a MySQL statement from the query files for SQLite.
+
+    ``WITH ROLLUP`` is dropped, so only the finest grouping level is returned.
+    """
+    sql = re.sub(r"\s+WITH\s+ROLLUP\b", "", sql, flags=re.I)
+    sql = re.sub(r"\bINTERVAL\s+(\d+)\s+DAY\b", r"\1", sql, flags=re.I)
+    if re.match(r"UPDATE\s+\w+\s+(?:AS\s+)?\w+\s+(?:INNER\s+)?JOIN\b", sql, re.I):
+        sql = _update_join(sql)
+    return sql
+
+
+def _date(value):
+    return date.fromisoformat(str(value)[:10]) if value is not None else None
+
+
+def _date_format(value, fmt):
+    d = _date(value)
+    return d.strftime(fmt) if d else None
+
+
+def _adddate(value, days):
+    d = _date(value)
+    return (d + timedelta(days=int(days))).isoformat() if d else None
+
+
+def _concat(*args):
+    return None if any(a is None for a in args) else "".join(str(a) for a in args)
+
+
+def register_functions(conn):
+    """Add the MySQL functions the query files use to a SQLite connection."""
+    functions = {
+        "CONCAT": (-1, _concat),
+        "DATE_FORMAT": (2, _date_format),
+        "ADDDATE": (2, _adddate),
+        "YEAR": (1, lambda v: _date(v) and _date(v).year),
+        "MONTH": (1, lambda v: _date(v) and _date(v).month),
+        "QUARTER": (1, lambda v: _date(v) and (_date(v).month + 2) // 3),
+    }
+    for name, (n_args, fn) in functions.items():
+        conn.create_function(name, n_args, fn, deterministic=True)
+    conn.create_function("CURDATE", 0, lambda: date.today().isoformat())
@@ -0,0 +1,208 @@
+"""The report's diagrams as ``ebms.charts`` specs.
+
+``architecture`` is the three-layer system diagram and ``api_mapping`` the
+map of role endpoints to the tables they touch (``exported-assets``'
+``chart_script.py`` and ``chart_script_1.py``).  Nodes and edges are batched:
+the mapping's 52 edges are four traces, one per HTTP method.
+
+    python -m ebms.charts --out exported-assets
+"""
+
+import numpy as np
+
+from .charts import chart, line_traces, point_traces
+
+LAYERS = [
+    ("Frontend Layer", 3, "#1FB8CD", "React, Next.js, TypeScript, Tailwind",
+     "<b>Frontend</b><br>React, Next.js<br>TypeScript", [
+         ("Admin Dashboard", "Admin", "Analytics, User Mgmt, Order Track"),
+         ("Supplier Dashboard", "Supplier", "Product Mgmt, Sales, Inventory"),
+         ("Customer Dashboard", "Customer", "Catalog, Cart, History"),
+         ("Delivery Dashboard", "Delivery", "Route Track, Performance"),
+     ]),
+    ("Backend API Layer", 2, "#DB4545", "Node.js, Express.js, JWT, bcrypt",
+     "<b>Backend API</b><br>Node.js<br>Express, JWT", [
+         ("Authentication", "Auth", "JWT, Role Access, Login"),
+         ("Controllers", "Controllers", "Admin, Supplier, Customer"),
+         ("Middleware", "Middleware", "Auth Verify, Role Check"),
+         ("Routes", "API Routes", "RESTful, CRUD, Error Handle"),
+     ]),
+    ("Database Layer", 1, "#2E8B57", "MySQL, Triggers, Indexes, Pooling",
+     "<b>Database</b><br>MySQL<br>Triggers, Indexes", [
+         ("User Tables", "Users", "admin, supplier, customer"),
+         ("Core Tables", "Core", "product, orders, cart"),
+         ("Utility Tables", "Utilities", "address, reviews, phone"),
+         ("Relations", "Relations", "order_product joins"),
+     ]),
+]
+
+CONNECTIONS = [
+    ("Admin Dashboard", "Authentication", "auth"),
+    ("Admin Dashboard", "Controllers", "direct"),
+    ("Supplier Dashboard", "Controllers", "direct"),
+    ("Customer Dashboard", "Controllers", "direct"),
+    ("Delivery Dashboard", "Controllers", "direct"),
+    ("Authentication", "Middleware", "internal"),
+    ("Middleware", "Routes", "internal"),
+    ("Controllers", "Routes", "internal"),
+    ("Routes", "User Tables", "data"),
+    ("Routes", "Core Tables", "data"),
+    ("Routes", "Utility Tables", "data"),
+    ("Routes", "Relations", "data"),
+]
+
+CONNECTION_LINES = {
+    "auth": {"color": "#FFD700", "width": 3, "dash": "dot"},
+    "internal": {"color": "#FF6B6B", "width": 2, "dash": "dash"},
+    "data": {"color": "#4ECDC4", "width": 2, "dash": "solid"},
+    "direct": {"color": "#95A5A6", "width": 2, "dash": "solid"},
+}
+
+_HIDDEN_AXIS = {"showgrid": False, "showticklabels": False, "zeroline": False}
+
+
+def architecture():
+    points, positions, shapes, annotations = [], {}, [], []
+    for layer, y, color, tech, label, components in LAYERS:
+        for x, (name, short, features) in zip(np.linspace(1.5, 8.5, len(components)).tolist(), components):
+            positions[name] = (x, y)
+            points.append({
+                "x": x, "y": y, "text": short, "color": color, "textcolor": "white", "name": layer,
+                "marker": {"size": 50, "line": {"width": 3, "color": "white"}, "symbol": "circle"},
+                "textfont": {"size": 11, "family": "Arial Black"},
+                "hover": f"<b>{name}</b><br>Features: {features}<br>Layer: {layer}<br>Tech: {tech}",
+            })
+        shapes.append({"type": "rect", "x0": 0.8, "y0": y - 0.3, "x1": 9.2, "y1": y + 0.3, "fillcolor": color,
+                       "opacity": 0.1, "line": {"color": color, "width": 2, "dash": "dash"}})
+        annotations.append({"x": 0.2, "y": y, "text": label, "showarrow": False,
+                            "font": {"size": 12, "color": color}, "bgcolor": "rgba(255,255,255,0.8)",
+                            "bordercolor": color, "borderwidth": 1})
+    annotations.append({
+        "x": 9.5, "y": 3.4, "showarrow": False, "align": "left",
+        "text": "<b>Data Flow Types:</b><br>━━━ Direct API<br>┅┅┅ Authentication<br>▬▬▬ Internal<br>━━━ Database",
+        "font": {"size": 10}, "bgcolor": "rgba(245,245,245,0.9)", "bordercolor": "gray", "borderwidth": 1,
+    })
+
+    segments = []
+    for start, end, kind in CONNECTIONS:
+        (x0, y0), (x1, y1) = positions[start], positions[end]
+        if abs(x0 - x1) > 2:  # bend wide edges so they do not run through other nodes
+            xs, ys = [x0, (x0 + x1) / 2, x1], [y0, (y0 + y1) / 2 + 0.15 * (y0 - y1), y1]
+        else:
+            xs, ys = [x0, x1], [y0, y1]
+        segments.append((xs, ys, CONNECTION_LINES[kind], 1))
+
+    layout = {
+        "title": "EBMS System Architecture",
+        "xaxis": dict(_HIDDEN_AXIS, range=[0, 10]), "yaxis": dict(_HIDDEN_AXIS, range=[0.4, 3.6]),
+        "plot_bgcolor": "rgba(0,0,0,0)", "paper_bgcolor": "rgba(0,0,0,0)",
+        "legend": {"orientation": "h", "yanchor": "bottom", "y": 1.02, "xanchor": "center", "x": 0.5},
+        "height": 650, "shapes": shapes, "annotations": annotations,
+    }
+    # edges first, so the nodes are drawn over them
+    return chart(line_traces(segments) + point_traces(points), layout, 1400, 650)
+
+
+ENDPOINTS = [
+    ("Admin", "#1FB8CD", 20, [
+        ("/api/admin/dashboard", "GET",
+         ["customer", "supplier", "delivery_agent", "orders", "product", "order_product"]),
+        ("/api/admin/users/:role", "GET", ["customer", "supplier", "delivery_agent"]),
+        ("/api/admin/analytics", "GET", ["orders", "order_product", "product", "customer", "address"]),
+        ("/api/admin/orders", "GET", ["orders", "order_product", "product", "customer"]),
+    ]),
+    ("Supplier", "#2E8B57", 15, [
+        ("/api/supplier/products", "GET", ["product", "product_review"]),
+        ("/api/supplier/products", "POST", ["product"]),
+        ("/api/supplier/products/:id", "PUT", ["product"]),
+        ("/api/supplier/products/:id", "DELETE", ["product"]),
+        ("/api/supplier/analytics", "GET", ["product", "order_product", "orders"]),
+        ("/api/supplier/inventory", "GET", ["product"]),
+    ]),
+    ("Customer", "#5D878F", 9, [
+        ("/api/customer/products", "GET", ["product", "product_review", "supplier"]),
+        ("/api/customer/cart", "GET", ["cart", "product"]),
+        ("/api/customer/cart", "POST", ["cart", "product"]),
+        ("/api/customer/orders", "POST", ["orders", "order_product", "cart", "product", "delivery_agent"]),
+        ("/api/customer/orders", "GET", ["orders", "order_product", "product"]),
+        ("/api/customer/wallet", "GET", ["wallet"]),
+        ("/api/customer/reviews", "POST", ["product_review"]),
+    ]),
+    ("Delivery", "#D2BA4C", 3, [
+        ("/api/delivery/orders", "GET", ["orders", "customer", "address"]),
+        ("/api/delivery/orders/:id/status", "PUT", ["orders", "delivery_agent"]),
+        ("/api/delivery/performance", "GET", ["orders", "da_review"]),
+        ("/api/delivery/availability", "PUT", ["delivery_agent"]),
+    ]),
+]
+
+# (table, type, y), grouped so that related tables sit together and edges cross less
+TABLES = [
+    ("admin", "user", 22), ("supplier", "user", 20.5), ("customer", "user", 19), ("delivery_agent", "user", 17.5),
+    ("product", "core", 15), ("orders", "core", 13.5),
+    ("cart", "relation", 11), ("order_product", "relation", 9.5), ("product_review", "relation", 8),
+    ("da_review", "relation", 6.5),
+    ("wallet", "utility", 4), ("address", "utility", 2.5), ("phone_number", "utility", 1),
+]
+
+METHOD_LINES = {
+    "GET": {"color": "#22C55E", "dash": "solid"},
+    "POST": {"color": "#3B82F6", "dash": "dash"},
+    "PUT": {"color": "#F59E0B", "dash": "dot"},
+    "DELETE": {"color": "#EF4444", "dash": "dashdot"},
+}
+TABLE_COLORS = {"user": "#B4413C", "core": "#964325", "relation": "#944454", "utility": "#13343B"}
+
+
+def api_mapping():
+    points, segments = [], []
+    table_y = {name: y for name, _, y in TABLES}
+    edges = {}
+    for role, color, top, endpoints in ENDPOINTS:
+        points.append({"x": 0.2, "y": top + 0.8, "text": role, "color": color,
+                       "textfont": {"size": 12, "family": "Arial Black"}})
+        for i, (path, method, tables) in enumerate(endpoints):
+            y = top - i * 1.2
+            parts = path.split("/")
+            name = parts[-1] if len(parts) > 3 else parts[-2] if len(parts) > 2 else "root"
+            points.append({
+                "x": 1, "y": y, "text": f"{method}<br>{name[:10]}", "color": color, "textcolor": "white",
+                "marker": {"size": 20, "line": {"width": 2, "color": "white"}}, "textposition": "middle right",
+                "textfont": {"size": 10}, "hover": f"<b>{role}</b><br>{path}<br><b>{method}</b>",
+            })
+            for table in tables:
+                # fan out edges between the same two rows so they do not overlap
+                edges[y, table_y[table]] = edges.get((y, table_y[table]), 0) + 1
+                offset = 0.1 * edges[y, table_y[table]]
+                segments.append(([2.5, 10.5], [y + offset, table_y[table] + offset],
+                                 dict(METHOD_LINES[method], width=1.5), 0.6))
+    for table, kind, y in TABLES:
+        points.append({
+            "x": 12, "y": y, "text": table.replace("_", "<br>")[:15], "color": TABLE_COLORS[kind],
+            "textcolor": "white", "marker": {"size": 18, "symbol": "square", "line": {"width": 2, "color": "white"}},
+            "textposition": "middle left", "textfont": {"size": 10}, "hover": f"<b>{table}</b><br>Type: {kind}",
+        })
+
+    legend_title = {"color": "black", "textfont": {"size": 12}}
+    points.append(dict(legend_title, x=7, y=23, text="HTTP Methods"))
+    points.append(dict(legend_title, x=14, y=23, text="Table Types"))
+    for i, (method, line) in enumerate(METHOD_LINES.items()):
+        points.append({"x": 6.5, "y": 22 - i * 0.8, "text": f"  {method}", "color": line["color"],
+                       "textposition": "middle right", "textfont": {"size": 11}})
+    for i, (kind, color) in enumerate(TABLE_COLORS.items()):
+        points.append({"x": 13.5, "y": 22 - i * 0.8, "text": f"  {kind.title()}", "color": color,
+                       "marker": {"size": 12, "symbol": "square"}, "textposition": "middle right",
+                       "textfont": {"size": 11}})
+
+    layout = {
+        "title": "EBMS API Endpoints & DB Mapping",
+        "xaxis": dict(_HIDDEN_AXIS, range=[-1, 16]), "yaxis": dict(_HIDDEN_AXIS, range=[0, 25]),
+        "plot_bgcolor": "rgba(248,249,250,0.8)", "paper_bgcolor": "white", "showlegend": False,
+    }
+    return chart(line_traces(segments) + point_traces(points), layout, 1600, 1200)
+
+
+CHARTS = {
+    "ebms_architecture_improved.png": architecture,
+    "ebms_api_database_mapping.png": api_mapping,
+}
@@ -0,0 +1,129 @@
+"""Column types, keys and indexes read from ``database-schema.sql``."""
+
+import re
+from dataclasses import dataclass, field
+
+from .standin import split_statements
+from .tables import SCHEMA_PATH
+
+
+@dataclass
+class Column:
+    name: str
+    type: str
+    args: tuple = ()
+    nullable: bool = True
+
+    @property
+    def kind(self):
+        """Storage kind: ``int``, ``fixed``, ``date``, ``bool`` or ``str``."""
+        if self.type in {"INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT"}:
+            return "int"
+        if self.type in {"DECIMAL", "NUMERIC"}:
+            return "fixed"
+        if self.type == "DATE":
+            return "date"
+        if self.type in {"BOOLEAN", "BOOL"}:
+            return "bool"
+        return "str"
+
+    @property
+    def scale(self):
+        return int(self.args[1]) if self.kind == "fixed" and len(self.args) > 1 else 0
+
+
+@dataclass
+class Table:
+    name: str
+    columns: list = field(default_factory=list)
+    primary_key: list = field(default_factory=list)
+    unique: list = field(default_factory=list)
+    foreign_keys: list = field(default_factory=list)  # (columns, ref_table, ref_columns)
+    checks: list = field(default_factory=list)
+
+    def column(self, name):
+        return next(c for c in self.columns if c.name == name)
+
+
+@dataclass
+class Index:
+    name: str
+    table: str
+    columns: list
+    unique: bool = False
+
+
+def _split_top(body):
+    """Split a parenthesised body on commas that are not nested in parentheses."""
+    parts, depth, buf = [], 0, []
+    for ch in body:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(buf).strip())
+            buf = []
+        else:
+            buf.append(ch)
+    if "".join(buf).strip():
+        parts.append("".join(buf).strip())
+    return parts
+
+
+def _names(text):
+    return [name.strip() for name in text.split(",")]
+
+
+def parse_table(statement):
+    m = re.match(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\((.*)\)\s*$", statement, re.I | re.S)
+    if not m:
+        return None
+    table = Table(m.group(1))
+    for item in _split_top(m.group(2)):
+        upper = item.upper()
+        if upper.startswith("PRIMARY KEY"):
+            table.primary_key = _names(re.search(r"\((.*)\)", item).group(1))
+        elif upper.startswith("FOREIGN KEY"):
+            fk = re.match(r"FOREIGN\s+KEY\s*\(([^)]*)\)\s*REFERENCES\s+(\w+)\s*\(([^)]*)\)", item, re.I)
+            table.foreign_keys.append((_names(fk.group(1)), fk.group(2), _names(fk.group(3))))
+        elif upper.startswith("CHECK"):
+            table.checks.append(re.match(r"CHECK\s*\((.*)\)\s*$", item, re.I | re.S).group(1).strip())
+        elif upper.startswith("UNIQUE"):
+            table.unique.append(_names(re.search(r"\((.*)\)", item).group(1)))
+        else:
+            col = re.match(r"(\w+)\s+(\w+)(?:\s*\(([^)]*)\))?(.*)", item, re.S)
+            rest = col.group(4).upper()
+            table.columns.append(Column(
+                col.group(1), col.group(2).upper(),
+                tuple(a.strip() for a in col.group(3).split(",")) if col.group(3) else (),
+                "NOT NULL" not in rest,
+            ))
+            if re.search(r"\bUNIQUE\b", rest):
+                table.unique.append([col.group(1)])
+            if re.search(r"\bPRIMARY\s+KEY\b", rest):
+                table.primary_key = [col.group(1)]
+    return table
+
+
+def parse_index(statement):
+    m = re.match(r"CREATE\s+(UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)\s*\(([^)]*)\)", statement, re.I)
+    if not m:
+        return None
+    return Index(m.group(2), m.group(3), _names(m.group(4)), bool(m.group(1)))
+
+
+def load_schema(schema_path=SCHEMA_PATH):
+    """``(tables, indexes)``: ``{name: Table}`` in schema order and a list of ``Index``."""
+    with open(schema_path) as f:
+        statements = split_statements(f.read())
+    tables, indexes = {}, []
+    for statement in statements:
+        table = parse_table(statement)
+        if table:
+            tables[table.name] = table
+            continue
+        index = parse_index(statement)
+        if index:
+            indexes.append(index)
+    return tables, indexes
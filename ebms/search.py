@@ -0,0 +1,240 @@
+"""Product search: posting lists per word with a trigram index over the words.
+
+Embedded Query-01 and Simple Query-13 search with ``name LIKE '%...%'``, a
+scan of every product that the ``product_name`` index cannot help with.
+``ProductIndex`` splits names and descriptions into lower-case words and keeps,
+per word and field, the sorted IDs of the products using it.  A query word
+matches every indexed word it occurs in, looked up through a trigram index
+over the vocabulary (words shorter than three letters scan the vocabulary),
+so a name search finds every product ``LIKE '%word%'`` finds; a query of
+several words needs all of them, each anywhere in the name.
+
+Matches are ranked by the sum over the query words of ``log(1 + N / matches)``
+times the field weight (name 3, description 1, both add up) times how the word
+matched (a whole word 1, a prefix 0.75, inside a word 0.5), then by average
+rating and ID, and can be filtered by price and rating.
+
+Supplier edits do not rewrite the posting lists: an edited field of a product
+is masked out of them and its new words go to per-word sets, which
+``compact`` merges back in (by itself once ``compact_at`` products changed).
+
+    index = ProductIndex.from_db(conn)
+    index.search("led strip", k=10, max_price=5000)
+"""
+
+import math
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+Hit = namedtuple("Hit", "productID name price rating score")
+
+FIELDS = {"name": 3.0, "description": 1.0}
+WHOLE, PREFIX, INFIX = 1.0, 0.75, 0.5
+
+_WORD = re.compile(r"\w+")
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+@lru_cache(maxsize=65536)
+def words(text):
+    """The distinct lower-case words of ``text``, in order."""
+    return tuple(dict.fromkeys(_WORD.findall(text.lower()))) if text else ()
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class ProductIndex:
+    def __init__(self, compact_at=10_000):
+        self.compact_at = compact_at
+        self.postings = {field: {} for field in FIELDS}  # word -> sorted productIDs
+        self.delta = {field: {} for field in FIELDS}  # word -> productIDs added since compact()
+        self.masked = {field: set() for field in FIELDS}  # productIDs whose postings are stale
+        self._masked = {}  # field -> sorted array of self.masked[field]
+        self._delta_words = {}  # productID -> {field: words in the delta}
+        self._trigrams = {}  # trigram -> words
+        self.vocabulary = set()
+        self.names = {}
+        self.price = np.full(1, np.nan)
+        self.rating = np.full(1, np.nan)
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """Bulk-build from ``(productID, name, description, price, rating)`` rows."""
+        index = cls(**kwargs)
+        ids = {field: {} for field in FIELDS}
+        for product, name, description, price, rating in rows:
+            index._attributes(product, name, price, rating)
+            for field, text in (("name", name), ("description", description)):
+                for word in words(text):
+                    ids[field].setdefault(word, []).append(product)
+        for field, lists in ids.items():
+            for word, products in lists.items():
+                index.postings[field][word] = np.unique(np.array(products, dtype=np.int64))
+                index._learn(word)
+        return index
+
+    @classmethod
+    def from_db(cls, conn, **kwargs):
+        return cls.from_rows(conn.execute(
+            "SELECT p.productID, p.name, p.product_description, p.price, AVG(pr.rating) FROM product p "
+            "LEFT JOIN product_review pr ON pr.productID = p.productID GROUP BY p.productID"), **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _attributes(self, product, name, price, rating):
+        if product >= len(self.price):
+            size = max(product + 1, 2 * len(self.price))
+            self.price = np.concatenate([self.price, np.full(size - len(self.price), np.nan)])
+            self.rating = np.concatenate([self.rating, np.full(size - len(self.rating), np.nan)])
+        if name is not None:
+            self.names[product] = name
+        if price is not None:
+            self.price[product] = float(price)
+        self.rating[product] = np.nan if rating is None else float(rating)
+
+    def _learn(self, word):
+        if word not in self.vocabulary:
+            self.vocabulary.add(word)
+            for trigram in trigrams(word):
+                self._trigrams.setdefault(trigram, set()).add(word)
+
+    def _replace(self, product, field, text):
+        """Point ``field`` of ``product`` at the words of ``text`` (None: no words)."""
+        self.masked[field].add(product)
+        self._masked.pop(field, None)
+        pending = self._delta_words.setdefault(product, {})
+        for word in pending.get(field, ()):
+            self.delta[field][word].discard(product)
+        pending[field] = words(text) if text is not None else ()
+        for word in pending[field]:
+            self.delta[field].setdefault(word, set()).add(product)
+            self._learn(word)
+        if len(self._delta_words) >= self.compact_at:
+            self.compact()
+
+    def add(self, product, name, description, price, rating=None):
+        """Index a new product (or replace every field of an existing one)."""
+        self._attributes(product, name, price, rating)
+        self._replace(product, "name", name)
+        self._replace(product, "description", description)
+
+    def update(self, product, name=None, description=None, price=None, rating=None):
+        """Apply a supplier edit or a new average rating; fields left at None keep their value."""
+        if product not in self.names:
+            raise KeyError(product)
+        self._attributes(product, name, price, rating if rating is not None else self.rating[product])
+        if name is not None:
+            self._replace(product, "name", name)
+        if description is not None:
+            self._replace(product, "description", description)
+
+    def delete(self, product):
+        if self.names.pop(product, None) is None:
+            raise KeyError(product)
+        self.price[product] = self.rating[product] = np.nan
+        for field in FIELDS:
+            self._replace(product, field, None)
+
+    def compact(self):
+        """Merge the edits back into the posting lists."""
+        for field in FIELDS:
+            masked = self._masked_ids(field)
+            postings, delta = self.postings[field], self.delta[field]
+            for word in set(postings) | set(delta):
+                ids = postings.get(word, _EMPTY)
+                if len(masked):
+                    ids = ids[~np.isin(ids, masked, assume_unique=True)]
+                if delta.get(word):
+                    ids = np.union1d(ids, np.fromiter(delta[word], np.int64))
+                if len(ids):
+                    postings[word] = ids
+                else:
+                    postings.pop(word, None)
+            delta.clear()
+            self.masked[field].clear()
+        self._masked.clear()
+        self._delta_words.clear()
+
+    def _masked_ids(self, field):
+        if field not in self._masked:
+            self._masked[field] = np.array(sorted(self.masked[field]), dtype=np.int64)
+        return self._masked[field]
+
+    def _containing(self, word):
+        """The indexed words ``word`` occurs in."""
+        if len(word) < 3:
+            return [w for w in self.vocabulary if word in w]
+        candidates = sorted((self._trigrams.get(t, set()) for t in trigrams(word)), key=len)
+        return [w for w in set.intersection(*candidates) if word in w]
+
+    def _field_matches(self, field, word):
+        """``(productIDs, match weights)`` of the products whose ``field`` contains ``word``."""
+        masked = self._masked_ids(field)
+        ids, weights = [], []
+        for term in self._containing(word):
+            weight = WHOLE if term == word else PREFIX if term.startswith(word) else INFIX
+            found = self.postings[field].get(term, _EMPTY)
+            if len(masked) and len(found):
+                found = found[~np.isin(found, masked, assume_unique=True)]
+            if self.delta[field].get(term):
+                found = np.concatenate([found, np.fromiter(self.delta[field][term], np.int64)])
+            ids.append(found)
+            weights.append(np.full(len(found), weight))
+        if not ids:
+            return _EMPTY, np.zeros(0)
+        ids, weights = np.concatenate(ids), np.concatenate(weights)
+        order = np.lexsort((-weights, ids))
+        ids, weights = ids[order], weights[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = ids[1:] != ids[:-1]
+        return ids[first], weights[first]
+
+    def match(self, query, fields=tuple(FIELDS)):
+        """``(productIDs, scores)`` of every product matching all the words of ``query``."""
+        ids = scores = None
+        for word in words(query):
+            found = [self._field_matches(field, word) for field in fields]
+            all_ids = np.concatenate([f[0] for f in found])
+            all_weights = np.concatenate([FIELDS[field] * f[1] for field, f in zip(fields, found)])
+            if not len(all_ids):
+                return _EMPTY, np.zeros(0)
+            word_ids, inverse = np.unique(all_ids, return_inverse=True)
+            word_scores = np.bincount(inverse, all_weights, len(word_ids))
+            word_scores *= math.log(1 + len(self) / max(len(word_ids), 1))
+            if ids is None:
+                ids, scores = word_ids, word_scores
+            else:
+                ids, a, b = np.intersect1d(ids, word_ids, assume_unique=True, return_indices=True)
+                scores = scores[a] + word_scores[b]
+            if not len(ids):
+                break
+        if ids is None:
+            return _EMPTY, np.zeros(0)
+        return ids, scores
+
+    def search(self, query, k=10, min_price=None, max_price=None, min_rating=None, fields=tuple(FIELDS)):
+        """The ``k`` best ``Hit``s for ``query`` (all of them for ``k=None``)."""
+        ids, scores = self.match(query, fields)
+        keep = np.ones(len(ids), dtype=bool)
+        if min_price is not None:
+            keep &= self.price[ids] >= min_price
+        if max_price is not None:
+            keep &= self.price[ids] <= max_price
+        if min_rating is not None:
+            keep &= self.rating[ids] >= min_rating
+        ids, scores = ids[keep], scores[keep]
+        if k is not None and len(ids) > k:
+            # Everything scoring at least the k-th best score, then the exact order on those.
+            cut = np.partition(scores, len(scores) - k)[len(scores) - k]
+            ids, scores = ids[scores >= cut], scores[scores >= cut]
+        rating = np.nan_to_num(self.rating[ids], nan=0.0)
+        order = np.lexsort((ids, -rating, -scores))[:k]
+        return [Hit(int(p), self.names[p], float(self.price[p]),
+                    None if np.isnan(self.rating[p]) else float(self.rating[p]), float(s))
+                for p, s in zip(ids[order].tolist(), scores[order].tolist())]
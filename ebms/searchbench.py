@@ -0,0 +1,129 @@
+"""Catalogue search latency: ``ebms.search`` against Embedded Query-01's ``LIKE`` scan.
+
+``--products`` products are generated as the generator makes them (catalogue
+names and their model variants, the sample descriptions) into a SQLite
+stand-in, with one review on every other product so the ratings are
+populated; the rest of the dataset is not needed.  Query words are drawn
+from the product names, half of them whole words and half a piece of one.
+
+Each query runs as the searching statement of Embedded Query-01 (``LIKE``,
+the join to ``product_review`` and all) and through ``ProductIndex``
+restricted to names, which must return every product the ``LIKE`` does, and
+as a ranked top-10 over names and descriptions with a price filter.
+Supplier edits are timed too, as is the ``compact`` that folds them in.
+
+    python -m ebms.searchbench --products 1000000 --queries 200
+"""
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from . import queryfiles, standin
+from .generator import Generator
+from .search import ProductIndex, words
+from .tables import QUERIES_DIR
+
+
+def like_query():
+    """Embedded Query-01's search statement, with ``{search}`` left to bind."""
+    return next(q.sql for q in queryfiles.read_queries(QUERIES_DIR / "embedded-queries.sql")
+                if "{search}" in q.sql)
+
+
+def load(conn, products, seed=42):
+    """Generate ``products`` products and a review on every other one into ``conn``."""
+    generator = Generator(products / 200, seed)
+    columns = generator.product_shard(0, 1, products + 1)["product"]
+    conn.executemany("INSERT INTO product VALUES (?, ?, ?, ?, ?, ?)",
+                     zip(*(np.asarray(c).tolist() for c in columns)))
+    rng = np.random.default_rng(seed)
+    reviewed = np.arange(1, products + 1, 2)
+    conn.executemany("INSERT INTO product_review VALUES (?, ?, ?, NULL, '2024-01-01')",
+                     zip(range(1, len(reviewed) + 1), reviewed.tolist(),
+                         rng.integers(1, 6, len(reviewed)).tolist()))
+    conn.commit()
+
+
+def sample_queries(conn, n, seed=42):
+    rng = random.Random(seed)
+    names = [name for name, in conn.execute("SELECT name FROM product WHERE productID <= 200")]
+    queries = []
+    while len(queries) < n:
+        word = rng.choice(words(rng.choice(names)))
+        if len(word) > 3 and rng.random() < 0.5:
+            start = rng.randrange(len(word) - 2)
+            word = word[start:start + rng.randint(3, len(word) - start)]
+        queries.append(word)
+    return queries
+
+
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def _summary(seconds):
+    ms = 1000 * np.array(seconds)
+    return {"runs": len(ms), **{f"p{p}_ms": float(np.percentile(ms, p)) for p in (50, 95, 99)}}
+
+
+def run(products, queries=200, like_queries=20, edits=2000, seed=42):
+    conn = standin.connect()
+    load(conn, products, seed)
+    build, index = _timed(ProductIndex.from_db, conn)
+    sample = sample_queries(conn, queries, seed)
+    like = like_query()
+
+    report = {"products": products, "build_s": build, "vocabulary": len(index.vocabulary)}
+    like_times, missed = [], 0
+    for word in sample[:like_queries]:
+        elapsed, rows = _timed(lambda: conn.execute(queryfiles.bind(like, {"search": word})).fetchall())
+        like_times.append(elapsed)
+        missed += len({r[0] for r in rows} - set(index.match(word, ("name",))[0].tolist()))
+    report["like"] = _summary(like_times)
+    report["missed"] = missed
+    report["index_name"] = _summary([_timed(index.match, w, ("name",))[0] for w in sample])
+    report["index_top10"] = _summary([_timed(index.search, w, 10, max_price=10_000)[0] for w in sample])
+
+    rng = random.Random(seed)
+    edit_times = [_timed(index.update, rng.randint(1, products), name=f"{rng.choice(sample).title()} Edition {i}",
+                         price=rng.randint(100, 10_000))[0] for i in range(edits)]
+    report["edit"] = _summary(edit_times)
+    report["index_top10_after_edits"] = _summary([_timed(index.search, w, 10)[0] for w in sample])
+    report["compact_s"] = _timed(index.compact)[0]
+    conn.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--like-queries", type=int, default=20, help="queries also run as LIKE (slow)")
+    parser.add_argument("--edits", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    r = run(args.products, args.queries, args.like_queries, args.edits, args.seed)
+    print(f"{r['products']} products, {r['vocabulary']} words indexed in {r['build_s']:.1f} s; "
+          f"compact after {args.edits} edits {1000 * r['compact_s']:.0f} ms; "
+          f"LIKE matches missed by the index: {r['missed']}")
+    print(f"{'':<26}{'runs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for key, label in (("like", "Query-01 LIKE"), ("index_name", "index, names, all IDs"),
+                       ("index_top10", "index, top 10, price cap"), ("edit", "supplier edit"),
+                       ("index_top10_after_edits", "index, top 10, edited")):
+        s = r[key]
+        print(f"{label:<26}{s['runs']:>6}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['p99_ms']:>10.3f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
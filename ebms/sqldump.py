@@ -0,0 +1,305 @@
+"""Streaming reader for SQL dumps such as ``data-population.sql``.
+
+The dump is read in fixed-size blocks and scanned with a few regular
+expressions: ``CREATE TABLE`` statements are parsed into table definitions
+(with ``ebms.schema``), every tuple of an ``INSERT ... VALUES`` statement is
+yielded as soon as it is complete, and anything else (``USE``, ``CREATE
+INDEX``, comments) is skipped.  Memory stays at a few blocks however large the
+dump or its multi-row ``INSERT`` statements are (a single tuple may be up to
+``MAX_ROW`` characters).
+
+Rows are typed from the table definitions found in the dump, falling back to
+``database-schema.sql``: ``INT`` to ``int``, ``DECIMAL`` to ``Decimal``, ``DATE``
+to ``datetime.date``, ``BOOLEAN`` to ``bool`` and ``NULL`` to ``None``.
+
+    python -m ebms.sqldump --dump generated/sf-100/Data-Population/data-population.sql --to csv --out dump-csv
+    python -m ebms.sqldump --dump Database-Generation/data-population.sql --to columnar --out dump-columnar
+"""
+
+import argparse
+import csv
+import datetime
+import os
+import re
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from . import columnar
+from .schema import load_schema, parse_table
+from .tables import TABLES
+
+BLOCK_SIZE = 1 << 16
+MAX_ROW = 1 << 24  # longest tuple (or other statement) the reader will buffer
+
+_SPACE = re.compile(r"(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/|#[^\n]*(?:\n|$))*", re.S)
+_INSERT = re.compile(r"INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\)\s*)?VALUES?\s*", re.I)
+_CREATE = re.compile(r"CREATE\s+TABLE\b", re.I)
+# Quoted strings are written "unrolled" (runs of plain characters between escapes) for speed.
+_SQ = r"'[^'\\]*(?:(?:''|\\.)[^'\\]*)*'"
+_DQ = r'"[^"\\]*(?:(?:""|\\.)[^"\\]*)*"'
+_VALUE = r"%s|%s|[^\s,()'\";]+" % (_SQ, _DQ)
+# One group per kind of value (single-quoted text, double-quoted text, bare
+# word) and one for the "; INSERT INTO t VALUES" between single-row statements.
+_FIELDS = re.compile(r"'([^'\\]*(?:(?:''|\\.)[^'\\]*)*)'|\"([^\"\\]*(?:(?:\"\"|\\.)[^\"\\]*)*)\"|([^\s,()'\";]+)|(;[^(]*)",
+                     re.S)
+_AFTER_ROWS = re.compile(r"\s*([,;])\s*")
+# Up to the next ';' outside quotes (and the ';' itself, when present).
+_STATEMENT = re.compile(r"(?:[^;'\"`]+|%s|%s|`[^`]*`)*;?" % (_SQ, _DQ), re.S)
+_ESCAPE = {q: re.compile(r"\\(.)|" + q * 2, re.S) for q in "'\""}
+_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+BARE_TEXT = {"NULL": "", "null": "", "TRUE": "true", "true": "true", "FALSE": "false", "false": "false"}
+BARE_TYPED = {"NULL": None, "null": None, "TRUE": "true", "true": "true", "FALSE": "false", "false": "false"}
+
+
+class DumpError(ValueError):
+    pass
+
+
+def rows_pattern(n, table=None):
+    """A run of tuples of exactly ``n`` values.
+
+    Tuples are separated by commas and, when ``table`` is given, also by
+    ``; INSERT INTO <table> VALUES`` so that a file of single-row statements
+    is read in runs like a multi-row one.
+    """
+    row = r"\(\s*(?:%s)(?:\s*,\s*(?:%s)){%d}\s*\)" % (_VALUE, _VALUE, n - 1)
+    sep = r"\s*,\s*"
+    if table:
+        sep = r"\s*(?:,|;\s*(?i:INSERT\s+INTO\s+`?%s`?\s+VALUES))\s*" % re.escape(table)
+    return re.compile(r"(?:%s%s)*%s" % (row, sep, row), re.S)
+
+
+def _unescape(text, quote):
+    """Resolve backslash escapes and doubled quotes in one pass."""
+    return _ESCAPE[quote].sub(lambda m: quote if m.group(1) is None else _ESCAPES.get(m.group(1), m.group(1)), text)
+
+
+def field_values(text, bare=BARE_TEXT):
+    """Every value in a run of tuples: quoted strings unescaped, bare words mapped through ``bare``."""
+    fields = _FIELDS.findall(text)
+    if "\\" in text or '"' in text:
+        return [bare.get(b, b) if b else _unescape(d, '"') if d else _unescape(q, "'")
+                for q, d, b, h in fields if not h]
+    return [bare.get(b, b) if b else q.replace("''", "'") if "''" in q else q for q, _, b, h in fields if not h]
+
+
+def _converter(kind):
+    if kind == "int":
+        return int
+    if kind == "fixed":
+        return Decimal
+    if kind == "date":
+        return datetime.date.fromisoformat
+    if kind == "bool":
+        return lambda text: text.lower() in {"true", "1"}
+    return str
+
+
+class Tokenizer:
+    """A window over the dump that refills from the file when a match runs into its end."""
+
+    def __init__(self, f, block_size=BLOCK_SIZE):
+        self.f = f
+        self.block_size = block_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.consumed = 0  # characters dropped from the front of the buffer
+
+    def fill(self):
+        if self.eof:
+            return False
+        block = self.f.read(self.block_size)
+        if not block:
+            self.eof = True
+            return False
+        self.consumed += self.pos
+        self.buf = self.buf[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def match(self, pattern):
+        """Match ``pattern`` at the cursor, reading more input while the match could still grow.
+
+        A failed match with ``MAX_ROW`` characters of input ahead is final, so
+        a malformed dump is reported instead of being read into memory.
+        """
+        while True:
+            if self.pos >= len(self.buf) and not self.fill():
+                return None
+            m = pattern.match(self.buf, self.pos)
+            if m and (m.end() < len(self.buf) or self.eof):
+                self.pos = m.end()
+                return m
+            if not m and len(self.buf) - self.pos >= max(self.block_size, MAX_ROW):
+                return None
+            if not self.fill():
+                if m:
+                    self.pos = m.end()
+                return m
+
+    def peek(self, pattern, need=64):
+        """Match ``pattern`` at the cursor without consuming it."""
+        while len(self.buf) - self.pos < need and self.fill():
+            pass
+        return pattern.match(self.buf, self.pos)
+
+    def at_end(self):
+        self.match(_SPACE)
+        return self.pos >= len(self.buf) and not self.fill()
+
+    def error(self, message):
+        snippet = self.buf[self.pos:self.pos + 60].replace("\n", " ")
+        return DumpError(f"{message} at character {self.consumed + self.pos}: {snippet!r}")
+
+
+class DumpReader:
+    """Iterate over ``(table, row)`` pairs of a SQL dump.
+
+    ``typed=False`` yields the fields as CSV text instead (what the CSV and
+    columnar writers consume), which skips the per-value conversions.
+    ``batches()`` yields ``(table, rows)`` for runs of rows at a time.
+    """
+
+    def __init__(self, path, typed=True, block_size=BLOCK_SIZE):
+        self.path = path
+        self.typed = typed
+        self.block_size = block_size
+        self.tables, _ = load_schema()
+        self.columns = {}  # table -> column names of the last INSERT into it
+        self._patterns = {}
+
+    def __iter__(self):
+        for table, rows in self.batches():
+            for row in rows:
+                yield table, row
+
+    def batches(self):
+        with open(self.path, encoding="utf-8", newline="") as f:
+            tokens = Tokenizer(f, self.block_size)
+            while not tokens.at_end():
+                m = tokens.peek(_INSERT, need=4096)
+                if m:
+                    tokens.pos = m.end()
+                    yield from self._insert(tokens, m)
+                    continue
+                create = tokens.peek(_CREATE)
+                statement = tokens.match(_STATEMENT)
+                if not statement or not statement.group():
+                    raise tokens.error("unterminated statement")
+                if create:
+                    table = parse_table(statement.group().rstrip(";").strip())
+                    if table:
+                        self.tables[table.name] = table
+
+    def _columns(self, table, column_list):
+        if column_list:
+            return [name.strip(" `") for name in column_list.split(",")]
+        if table not in self.tables:
+            raise DumpError(f"INSERT into {table}, which has no CREATE TABLE in the dump or the schema")
+        return [c.name for c in self.tables[table].columns]
+
+    def _typed(self, table, names, rows):
+        if table not in self.tables:
+            raise DumpError(f"INSERT into {table}, which has no CREATE TABLE in the dump or the schema")
+        converters = [_converter(self.tables[table].column(name).kind) for name in names]
+        return [tuple(None if value is None else convert(value) for convert, value in zip(converters, row))
+                for row in rows]
+
+    def _insert(self, tokens, m):
+        table = m.group(1)
+        names = self.columns[table] = self._columns(table, m.group(2))
+        n = len(names)
+        key = (n, None if m.group(2) else table)
+        if key not in self._patterns:
+            self._patterns[key] = rows_pattern(*key)
+        bare = BARE_TYPED if self.typed else BARE_TEXT
+        while True:
+            run = tokens.match(self._patterns[key])
+            if not run:
+                raise tokens.error(f"malformed row or not {n} values in INSERT INTO {table}")
+            values = field_values(run.group(), bare)
+            rows = [values[i:i + n] for i in range(0, len(values), n)]
+            yield table, self._typed(table, names, rows) if self.typed else rows
+            after = tokens.match(_AFTER_ROWS)
+            if after is None or after.group(1) == ";":
+                return
+
+
+def csv_header(table, names):
+    """The CSV header for ``names``, using the repo's CSV column names where they differ."""
+    schema_names = [c.name for c in load_schema()[0][table].columns] if table in TABLES else None
+    return TABLES[table] if names == schema_names else names
+
+
+def to_csv(path, out_dir, block_size=BLOCK_SIZE):
+    """Write ``<table>.csv`` for every table in the dump; returns ``{table: rows}``."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    files, writers, counts = {}, {}, {}
+    reader = DumpReader(path, typed=False, block_size=block_size)
+    try:
+        for table, rows in reader.batches():
+            if table not in writers:
+                files[table] = open(out_dir / f"{table}.csv", "w", newline="")
+                writers[table] = csv.writer(files[table])
+                writers[table].writerow(csv_header(table, reader.columns[table]))
+                counts[table] = 0
+            writers[table].writerows(rows)
+            counts[table] += len(rows)
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+def to_columnar(path, out_dir, block_size=BLOCK_SIZE):
+    """Write a columnar snapshot (see ``ebms.columnar``) of every table in the dump; returns the manifest."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    writers, chunks = {}, {}
+    reader = DumpReader(path, typed=False, block_size=block_size)
+    for table, rows in reader.batches():
+        if table not in writers:
+            writers[table] = columnar.TableWriter(out_dir, table, reader.tables[table], reader.columns[table])
+            chunks[table] = []
+        chunk = chunks[table]
+        chunk.extend(rows)
+        if len(chunk) >= columnar.CHUNK_ROWS:
+            writers[table].append(chunk)
+            chunk.clear()
+    for table, chunk in chunks.items():
+        writers[table].append(chunk)
+    return columnar.write_manifest(out_dir, {table: writer.finish() for table, writer in writers.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dump", required=True, help="SQL dump to read")
+    parser.add_argument("--to", choices=("rows", "csv", "columnar"), default="rows",
+                        help="rows only parses (typed) and counts rows")
+    parser.add_argument("--out", help="output directory for --to csv/columnar")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    args = parser.parse_args(argv)
+    if args.to != "rows" and not args.out:
+        parser.error(f"--to {args.to} needs --out")
+
+    t0 = time.perf_counter()
+    if args.to == "csv":
+        counts = to_csv(args.dump, args.out, args.block_size)
+    elif args.to == "columnar":
+        counts = {t: e["rows"] for t, e in to_columnar(args.dump, args.out, args.block_size)["tables"].items()}
+    else:
+        counts = {}
+        for table, rows in DumpReader(args.dump, block_size=args.block_size).batches():
+            counts[table] = counts.get(table, 0) + len(rows)
+    elapsed = time.perf_counter() - t0
+    for table, rows in counts.items():
+        print(f"Parsed {table} ({rows} rows)")
+    mb = os.path.getsize(args.dump) / 1e6
+    print(f"Read {mb:.1f} MB in {elapsed:.2f}s ({mb / elapsed:.1f} MB/s, --to {args.to})")
+
+
+if __name__ == "__main__":
+    main()
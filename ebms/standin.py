@@ -0,0 +1,114 @@
+"""SQLite stand-in for the MySQL EBMS database.
+
+Translates ``database-schema.sql`` into SQLite DDL so that the tooling can load
+generated data and run queries locally without a MySQL server.
+"""
+
+import csv
+import re
+import sqlite3
+import warnings
+from pathlib import Path
+
+from . import instrument
+from .tables import LOAD_ORDER, SCHEMA_PATH, TABLES
+
+
+def split_statements(sql):
+    """Split SQL text on semicolons outside of quotes and ``--`` comments."""
+    statements, buf, quote, i = [], [], None, 0
+    while i < len(sql):
+        ch = sql[i]
+        if quote:
+            buf.append(ch)
+            if ch == quote:
+                if sql.startswith(quote, i + 1):
+                    buf.append(quote)
+                    i += 1
+                else:
+                    quote = None
+        elif ch in "'\"`":
+            quote = ch
+            buf.append(ch)
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = len(sql) if end < 0 else end
+            continue
+        elif ch == ";":
+            statement = "".join(buf).strip()
+            if statement:
+                statements.append(statement)
+            buf = []
+        else:
+            buf.append(ch)
+        i += 1
+    statement = "".join(buf).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def mysql_to_sqlite(statement):
+    """Rewrite one MySQL DDL statement for SQLite, or return None to skip it."""
+    if re.match(r"(CREATE\s+DATABASE|USE)\b", statement, re.I):
+        return None
+    # An INTEGER primary key is SQLite's rowid, which numbers new rows like AUTO_INCREMENT.
+    statement = re.sub(r"\bINT(\s+NOT\s+NULL)?\s+AUTO_INCREMENT\b", r"INTEGER\1", statement, flags=re.I)
+    # MySQL index names are per table; SQLite shares one namespace with tables.
+    m = re.match(r"(CREATE\s+(?:UNIQUE\s+)?INDEX\s+)(\w+)(\s+ON\b.*)", statement, re.I | re.S)
+    if m and m.group(2) in TABLES:
+        statement = f"{m.group(1)}{m.group(2)}_idx{m.group(3)}"
+    return statement
+
+
+def schema_statements(schema_path=SCHEMA_PATH):
+    """``(tables, indexes)`` statement lists of the schema, translated for SQLite."""
+    with open(schema_path) as f:
+        statements = [mysql_to_sqlite(s) for s in split_statements(f.read())]
+    statements = [s for s in statements if s]
+    indexes = [s for s in statements if re.match(r"CREATE\s+(UNIQUE\s+)?INDEX", s, re.I)]
+    return [s for s in statements if s not in indexes], indexes
+
+
+def create_indexes(conn, indexes):
+    with instrument.stage("load.indexes"):
+        for statement in indexes:
+            try:
+                conn.execute(statement)
+            except sqlite3.OperationalError as e:
+                warnings.warn(f"skipped index ({e}): {statement}")
+
+
+def connect(path=":memory:", schema_path=SCHEMA_PATH, indexes=True):
+    """Open a SQLite database with the EBMS tables (and optionally indexes) created."""
+    conn = sqlite3.connect(path)
+    tables, index_statements = schema_statements(schema_path)
+    for statement in tables:
+        conn.execute(statement)
+    if indexes:
+        create_indexes(conn, index_statements)
+    conn.commit()
+    return conn
+
+
+def csv_rows(path):
+    """Rows of a table CSV as SQLite parameters: empty fields become NULL, booleans 1/0."""
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            yield [None if v == "" else {"true": 1, "false": 0}.get(v.casefold(), v) for v in row]
+
+
+def load_csv_file(conn, path, table):
+    placeholders = ", ".join("?" * len(TABLES[table]))
+    with instrument.stage("load", table=table) as s, conn:
+        s.add_rows(conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", csv_rows(path)).rowcount)
+
+
+def load_csv_dir(conn, data_dir, tables=LOAD_ORDER):
+    """Load every ``<table>.csv`` found in ``data_dir`` with ``executemany``."""
+    for table in tables:
+        path = Path(data_dir) / f"{table}.csv"
+        if path.exists():
+            load_csv_file(conn, path, table)
@@ -0,0 +1,40 @@
+"""Table layout shared by the EBMS tooling.
+
+Column names follow the CSV headers in ``Database-Generation/Data`` (which
+match the column order of ``database-schema.sql``), and ``LOAD_ORDER`` is the
+``order_of_execution`` list used by ``generator.ipynb``.
+"""
+
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+GENERATION_DIR = REPO_ROOT / "Database-Generation"
+DATA_DIR = GENERATION_DIR / "Data"
+SCHEMA_PATH = GENERATION_DIR / "database-schema.sql"
+QUERIES_DIR = REPO_ROOT / "Sql Queries"
+
+TABLES = {
+    "address": ["addressID", "street_name", "apt_number", "city", "state", "zip", "country"],
+    "phone_number": ["phoneID", "num"],
+    "admin": ["adminID", "username", "pwd"],
+    "supplier": ["supplierID", "first_name", "middle_initial", "last_name", "addressID", "email", "password"],
+    "customer": ["customerID", "first_name", "middle_initial", "last_name", "addressID", "age", "phoneID", "email", "password"],
+    "delivery_agent": ["daID", "first_name", "middle_initial", "last_name", "availability", "phoneID", "email", "password"],
+    "product": ["productID", "name", "supplierID", "price", "quantity", "product_description"],
+    "orders": ["orderID", "customerID", "daID", "order_date", "delivery_date"],
+    "wallet": ["customerID", "balance", "upiID"],
+    "product_review": ["customerID", "productID", "rating", "content", "review_date"],
+    "da_review": ["customerID", "daID", "rating", "content", "review_date"],
+    "cart": ["customerID", "productID", "quantity"],
+    "order_product": ["orderID", "productID", "quantity"],
+}
+
+LOAD_ORDER = list(TABLES)
+
+# CSV headers that differ from the schema's column names.
+COLUMN_ALIASES = {"password": "pwd"}
+
+
+def sql_columns(table):
+    """Schema column names of ``table`` in CSV column order."""
+    return [COLUMN_ALIASES.get(column, column) for column in TABLES[table]]
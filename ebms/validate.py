@@ -0,0 +1,298 @@
+"""Check the table CSVs against every constraint of ``database-schema.sql`` before loading them.
+
+A broken row in the generated data otherwise shows up as a failed ``INSERT``
+somewhere in the middle of ``data-population.sql``.  ``validate`` reads each
+CSV once per column type with NumPy's C parser, in ``LOAD_ORDER``, and checks:
+
+* ``NOT NULL`` columns and values that do not parse as the column's type
+* ``PRIMARY KEY`` and ``UNIQUE`` keys, by sorting and comparing neighbours
+  (strings compare case-insensitively, as under MySQL's default collation;
+  NULLs never collide)
+* ``FOREIGN KEY``s, by binary search in the sorted referenced keys
+* ``CHECK``s, which are conjunctions of comparisons between a column and a
+  column or a literal; as in SQL a comparison with NULL does not fail
+
+Offending rows are reported by CSV line number (the header is line 1).
+
+    python -m ebms.validate --data generated/sf-100
+    python -m ebms.validate --data generated/sf-100 --show 20 --json violations.json
+"""
+
+import argparse
+import json
+import re
+import time
+from collections import namedtuple
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from .csvio import header
+from .schema import load_schema
+from .tables import LOAD_ORDER, sql_columns
+
+Violation = namedtuple("Violation", ["table", "constraint", "columns", "lines", "values"])
+
+PARSE_DTYPES = {"int": np.int64, "fixed": np.float64, "date": "datetime64[D]", "bool": object, "str": object}
+CHECK_TERM = re.compile(r"^\s*(\w+)\s*(>=|<=|<>|!=|=|>|<)\s*(\w+|'[^']*'|-?\d+(?:\.\d+)?)\s*$")
+COMPARE = {">=": np.greater_equal, "<=": np.less_equal, ">": np.greater, "<": np.less, "=": np.equal,
+           "<>": np.not_equal, "!=": np.not_equal}
+
+
+def _parse_value(value, kind):
+    if kind == "int":
+        return int(value)
+    if kind == "fixed":
+        return float(value)
+    return date.fromisoformat(value)
+
+
+def _load(path, usecols, dtype):
+    return np.loadtxt(path, delimiter=",", quotechar='"', skiprows=1, usecols=usecols, dtype=dtype,
+                      ndmin=2, encoding="utf-8")
+
+
+def read_table(path, table, columns):
+    """Read the named schema columns of a CSV; returns ``({column: values}, {column: null mask}, {column: bad})``.
+
+    ``bad`` holds, for the columns with values that do not parse, the mask of
+    those rows and the column's text.
+
+    Each column type is one ``np.loadtxt`` pass.  A pass only falls back to
+    parsing value by value when one of its columns holds an empty field or a
+    value of the wrong type.
+    """
+    positions = {c: i for i, c in enumerate(sql_columns(table))}
+    if len(header(path)) != len(positions):
+        raise ValueError(f"{path} has {len(header(path))} columns, {table} has {len(positions)}")
+    values, nulls, bad = {}, {}, {}
+    by_kind = {}
+    for column in columns:
+        by_kind.setdefault(column.kind, []).append(column)
+    for kind, group in by_kind.items():
+        usecols = [positions[c.name] for c in group]
+        try:
+            data = _load(path, usecols, PARSE_DTYPES[kind])
+            for i, column in enumerate(group):
+                values[column.name] = data[:, i]
+                if kind == "date":
+                    nulls[column.name] = np.isnat(data[:, i])
+                elif kind in {"str", "bool"}:
+                    nulls[column.name] = data[:, i] == ""
+                else:
+                    nulls[column.name] = np.zeros(len(data), dtype=bool)
+        except ValueError:
+            data = _load(path, usecols, object)
+            for i, column in enumerate(group):
+                raw = data[:, i]
+                nulls[column.name] = raw == ""
+                parsed, wrong = [], []
+                for v in raw.tolist():
+                    try:
+                        parsed.append(_parse_value(v, kind) if v else None)
+                        wrong.append(False)
+                    except ValueError:
+                        parsed.append(None)
+                        wrong.append(True)
+                fill = {"int": 0, "fixed": np.nan, "date": None}[kind]
+                values[column.name] = np.array([fill if p is None else p for p in parsed],
+                                               dtype=PARSE_DTYPES[kind])
+                if any(wrong):
+                    bad[column.name] = np.array(wrong, dtype=bool), raw
+    return values, nulls, bad
+
+
+def row_keys(columns):
+    """One ``int64`` code per row for a composite key (a single column is returned as is).
+
+    Integer columns are packed arithmetically when their ranges fit in 62 bits,
+    anything else is factorized column by column.
+    """
+    if len(columns) == 1:
+        return columns[0]
+    code = np.zeros(len(columns[0]), dtype=np.int64)
+    if all(c.dtype.kind in "iu" for c in columns):
+        spans = [(int(c.min()), int(c.max()) - int(c.min()) + 1) if len(c) else (0, 1) for c in columns]
+        if np.prod([float(span) for _, span in spans]) < 2 ** 62:
+            for column, (lo, span) in zip(columns, spans):
+                code = code * span + (column - lo)
+            return code
+    for column in columns:
+        uniques, inverse = np.unique(column, return_inverse=True)
+        code = code * len(uniques) + inverse
+    return code
+
+
+def duplicates(keys):
+    """Positions of the rows whose key equals an earlier row's."""
+    order = np.argsort(keys, kind="stable")
+    ordered = keys[order]
+    return np.sort(order[1:][ordered[1:] == ordered[:-1]])
+
+
+class KeySet:
+    """Membership in a key column: a bitmap over the key range when the keys are
+    fairly dense integers (as generated IDs are), else binary search in the sorted keys."""
+
+    DENSITY = 1 / 8  # fewest keys per bitmap slot
+
+    def __init__(self, keys):
+        self.lo = self.bitmap = None
+        if keys.dtype.kind in "iu" and len(keys):
+            lo, hi = int(keys.min()), int(keys.max())
+            if len(keys) >= (hi - lo + 1) * self.DENSITY:
+                self.lo = lo
+                self.bitmap = np.zeros(hi - lo + 1, dtype=bool)
+                self.bitmap[keys - lo] = True
+                return
+        self.sorted = np.unique(keys)
+
+    def missing(self, probe):
+        """Positions of the ``probe`` values that are not keys."""
+        if self.bitmap is not None:
+            at = probe - self.lo
+            found = (at >= 0) & (at < len(self.bitmap))
+            found[found] = self.bitmap[at[found]]
+        else:
+            at = np.searchsorted(self.sorted, probe)
+            found = at < len(self.sorted)
+            found[found] = self.sorted[at[found]] == probe[found]
+        return np.flatnonzero(~found)
+
+
+def parse_check(check, column_kinds):
+    """``[(column, operator, column name or literal)]`` for a conjunction of comparisons."""
+    terms = []
+    for text in re.split(r"\s+AND\s+", check, flags=re.I):
+        m = CHECK_TERM.match(text)
+        if not m or m.group(1) not in column_kinds:
+            raise ValueError(f"unsupported CHECK ({check})")
+        column, operator, operand = m.groups()
+        if operand not in column_kinds:
+            operand = np.datetime64(operand.strip("'"), "D") if column_kinds[column] == "date" else float(operand)
+        terms.append((column, operator, operand))
+    return terms
+
+
+def check_fails(terms, values, nulls):
+    """Rows where some comparison is false; a comparison with a NULL operand is unknown, not false."""
+    fails = np.zeros(len(next(iter(values.values()))), dtype=bool)
+    for column, operator, operand in terms:
+        known = ~nulls[column]
+        right = operand
+        if isinstance(operand, str):
+            known &= ~nulls[operand]
+            right = values[operand]
+        with np.errstate(invalid="ignore"):
+            fails |= known & ~COMPARE[operator](values[column], right)
+    return fails
+
+
+def _violation(table, constraint, columns, rows, values, nulls):
+    return Violation(table, constraint, columns, rows + 2,
+                     [["NULL" if nulls[c][r] else values[c][r] for c in columns] for r in rows])
+
+
+def validate(data_dir, tables=LOAD_ORDER, schema_path=None):
+    """Every violation in ``<data_dir>/<table>.csv``; returns ``(violations, {table: rows}, skipped, checked)``.
+
+    ``skipped`` lists the foreign keys whose referenced CSV is missing and
+    ``checked`` counts the constraints that were checked (column types
+    included).
+    """
+    schema, _ = load_schema(schema_path) if schema_path else load_schema()
+    referenced = {(ref, tuple(refcols)) for t in schema.values() for _, ref, refcols in t.foreign_keys}
+    parent_keys, key_sets, violations, counts, skipped = {}, {}, [], {}, []
+    checked = 0
+    for name in tables:
+        path = Path(data_dir) / f"{name}.csv"
+        if not path.exists():
+            continue
+        table = schema[name]
+        values, nulls, bad = read_table(path, name, table.columns)
+        counts[name] = len(next(iter(values.values())))
+        kinds = {c.name: c.kind for c in table.columns}
+        checked += len(table.columns) + sum(not c.nullable for c in table.columns)
+
+        for column in table.columns:
+            if column.name in bad:
+                wrong, text = bad[column.name]
+                violations.append(_violation(name, f"{column.type} {column.name}", [column.name],
+                                             np.flatnonzero(wrong), {column.name: text}, nulls))
+            if not column.nullable and nulls[column.name].any():
+                violations.append(_violation(name, f"{column.name} NOT NULL", [column.name],
+                                             np.flatnonzero(nulls[column.name]), values, nulls))
+        # unparsable values take no part in the checks below, like NULLs
+        nulls = {c: mask | bad[c][0] if c in bad else mask for c, mask in nulls.items()}
+
+        keys = ([("PRIMARY KEY", table.primary_key)] if table.primary_key else []) + \
+            [("UNIQUE", columns) for columns in table.unique]
+        checked += len(keys) + len(table.checks)
+        for label, columns in keys:
+            present = np.flatnonzero(~np.any([nulls[c] for c in columns], axis=0))
+            parts = [np.char.lower(values[c][present].astype(str)) if kinds[c] == "str" else values[c][present] for c in columns]
+            dup = present[duplicates(row_keys(parts))]
+            if len(dup):
+                violations.append(_violation(name, f"{label} ({', '.join(columns)})", columns, dup, values, nulls))
+
+        for columns, ref, refcols in table.foreign_keys:
+            constraint = f"FOREIGN KEY ({', '.join(columns)}) REFERENCES {ref}({', '.join(refcols)})"
+            if (ref, tuple(refcols)) not in parent_keys and ref != name:
+                skipped.append((name, constraint))
+                continue
+            checked += 1
+            present = np.flatnonzero(~np.any([nulls[c] for c in columns], axis=0))
+            probe = [values[c][present] for c in columns]
+            parent = parent_keys.get((ref, tuple(refcols))) or [values[c] for c in refcols]
+            if len(columns) == 1:
+                if (ref, tuple(refcols)) not in key_sets:
+                    key_sets[ref, tuple(refcols)] = KeySet(parent[0])
+                orphans = present[key_sets[ref, tuple(refcols)].missing(probe[0])]
+            else:
+                # composite keys are coded together, so that equal keys get equal codes on both sides
+                codes = row_keys([np.concatenate([p, k]) for p, k in zip(parent, probe)])
+                orphans = present[KeySet(codes[:len(parent[0])]).missing(codes[len(parent[0]):])]
+            if len(orphans):
+                violations.append(_violation(name, constraint, columns, orphans, values, nulls))
+
+        for check in table.checks:
+            fails = np.flatnonzero(check_fails(parse_check(check, kinds), values, nulls))
+            if len(fails):
+                columns = [c for c in kinds if re.search(rf"\b{c}\b", check)]
+                violations.append(_violation(name, f"CHECK ({check})", columns, fails, values, nulls))
+
+        for ref, refcols in referenced:
+            if ref == name:
+                parent_keys[ref, refcols] = [values[c] for c in refcols]
+    return violations, counts, skipped, checked
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", required=True, help="directory with <table>.csv files")
+    parser.add_argument("--show", type=int, default=5, help="offending rows to print per constraint")
+    parser.add_argument("--json", help="also write every offending line number to this file")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    violations, counts, skipped, checked = validate(args.data)
+    elapsed = time.perf_counter() - t0
+    for v in violations:
+        print(f"{v.table}: {v.constraint}: {len(v.lines)} rows")
+        for line, row in list(zip(v.lines.tolist(), v.values))[:args.show]:
+            print(f"    {v.table}.csv:{line}  " + ", ".join(f"{c}={x}" for c, x in zip(v.columns, row)))
+    for table, constraint in skipped:
+        print(f"{table}: {constraint}: not checked, the referenced CSV is missing")
+    print(f"{sum(counts.values())} rows in {len(counts)} tables checked in {elapsed:.2f} s, "
+          f"{sum(len(v.lines) for v in violations)} violations in {len(violations)} of {checked} constraints")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"table": v.table, "constraint": v.constraint, "lines": v.lines.tolist()}
+                       for v in violations], f, indent=1)
+    if violations:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
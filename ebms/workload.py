@@ -0,0 +1,495 @@
+"""Replay a role and endpoint mix against the SQLite stand-in, with asyncio.
+
+The workload model is the API map of ``ebms.reportcharts``: every endpoint
+of every role, with the tables it touches.  Each endpoint runs the SQL the
+backend would run for it.  The reports reuse the ``Sql Queries`` statements:
+Query-03 and Query-05 for the admin dashboard, Query-04 for analytics, and
+Query-01's search for the customer catalogue.  ``POST /api/customer/orders``
+is ``ebms.checkout`` itself.  Writes take the write lock the way checkout
+does, so the time spent waiting for it is measured.
+
+Orders are placed for customers with a non-empty cart: the ones holding a
+cart when the run starts, and those who add to theirs during it.  The
+generated carts cost far more than the wallets hold, so ``prepare`` tops up
+every wallet to twice its cart and the stock to cover the carts.  A checkout
+the application still turns down (empty cart, out of stock, no free agent)
+is counted as ``rejected``, apart from the placed orders and from errors.
+
+Requests arrive as a Poisson process at ``--rate`` per second.  Roles are
+drawn with the ``--roles`` weights, and endpoints within a role with the
+``--endpoints`` weights (1 when not given).  An asyncio scheduler dispatches
+each request on time to a pool of ``--concurrency`` threads, each with its
+own connection.  A request's latency runs from its scheduled arrival, so
+queueing behind a slow database counts (no coordinated omission).
+
+The report gives the throughput, p50/p99 latency per endpoint and, per
+table, how long the requests touching it ran (rejected requests left out).  For written tables it also
+gives how long their writers held and waited for the write lock: SQLite
+has a single write lock, and the tables whose writers hold it longest are
+where contention comes from.
+
+    python -m ebms.workload --scale-factor 10 --rate 200 --seconds 10 --roles customer=6,supplier=2,delivery=1.5,admin=0.5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from . import checkout, queryfiles, reportcharts
+from . import checkoutbench
+from .generator import Generator
+from .searchbench import like_query
+from .tables import QUERIES_DIR
+
+Endpoint = namedtuple("Endpoint", "role method path tables writes handler")
+Outcome = namedtuple("Outcome", "endpoint latency service lock_wait error rejected")
+
+ROLES = {"customer": 6, "supplier": 2, "delivery": 1.5, "admin": 0.5}
+
+HANDLERS = {}  # (method, path) -> (handler, tables written)
+
+
+def handles(method, path, writes=()):
+    def register(fn):
+        HANDLERS[method, path] = (fn, tuple(writes))
+        return fn
+    return register
+
+
+def _embedded(*labels):
+    return [queryfiles.to_sqlite(q.sql) for q in queryfiles.read_queries(QUERIES_DIR / "embedded-queries.sql")
+            if q.label.split(".")[0] in labels]
+
+
+class Rejected(Exception):
+    """A request the application turned down, e.g. a checkout of a cart it could not place."""
+
+    def __init__(self, reason, lock_wait=0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.lock_wait = lock_wait
+
+
+class Shoppers:
+    """Customers with a non-empty cart: checkouts draw them without replacement, cart adds put them back."""
+
+    def __init__(self, customers):
+        self._customers = list(customers)
+        self._at = {c: i for i, c in enumerate(self._customers)}
+        self._lock = threading.Lock()
+
+    def add(self, customer):
+        with self._lock:
+            if customer not in self._at:
+                self._at[customer] = len(self._customers)
+                self._customers.append(customer)
+
+    def take(self, rng):
+        with self._lock:
+            if not self._customers:
+                return None
+            i = rng.randrange(len(self._customers))
+            customer, last = self._customers[i], self._customers.pop()
+            if last != customer:
+                self._customers[i] = last
+                self._at[last] = i
+            del self._at[customer]
+            return customer
+
+
+class Ids:
+    """ID ranges and search words of the loaded dataset, for drawing request parameters."""
+
+    def __init__(self, conn):
+        self.customers, self.suppliers, self.agents, self.products = conn.execute(
+            "SELECT (SELECT MAX(customerID) FROM customer), (SELECT MAX(supplierID) FROM supplier), "
+            "(SELECT MAX(daID) FROM delivery_agent), (SELECT MAX(productID) FROM product)").fetchone()
+        self.words = sorted({w for name, in conn.execute("SELECT name FROM product WHERE productID <= 200")
+                             for w in name.split() if len(w) > 2})
+        self.dashboard = _embedded("Query-03", "Query-05")
+        self.top_customers, = _embedded("Query-04")
+        self.search = like_query()
+        self.shoppers = Shoppers(c for c, in conn.execute("SELECT DISTINCT customerID FROM cart"))
+
+
+def _write(conn, statements):
+    """Run ``(sql, args)`` statements in one write transaction; returns the lock wait."""
+    wait = checkout.begin(conn)
+    with conn:
+        for sql, args in statements:
+            conn.execute(sql, args)
+    return wait
+
+
+# Admin
+
+@handles("GET", "/api/admin/dashboard")
+def admin_dashboard(conn, ids, rng):
+    for sql in ids.dashboard:
+        conn.execute(sql).fetchall()
+
+
+@handles("GET", "/api/admin/users/:role")
+def admin_users(conn, ids, rng):
+    table, key, count = rng.choice([("customer", "customerID", ids.customers), ("supplier", "supplierID", ids.suppliers),
+                                    ("delivery_agent", "daID", ids.agents)])
+    conn.execute(f"SELECT {key}, first_name, last_name, email FROM {table} ORDER BY {key} LIMIT 50 OFFSET ?",
+                 [rng.randrange(max(count - 50, 1))]).fetchall()
+
+
+@handles("GET", "/api/admin/analytics")
+def admin_analytics(conn, ids, rng):
+    conn.execute(ids.top_customers).fetchall()
+    conn.execute("SELECT a.country, COUNT(DISTINCT o.orderID), SUM(op.quantity * p.price) FROM orders o "
+                 "JOIN customer c ON c.customerID = o.customerID JOIN address a ON a.addressID = c.addressID "
+                 "JOIN order_product op ON op.orderID = o.orderID JOIN product p ON p.productID = op.productID "
+                 "WHERE o.order_date >= date((SELECT MAX(order_date) FROM orders), '-30 days') "
+                 "GROUP BY a.country").fetchall()
+
+
+@handles("GET", "/api/admin/orders")
+def admin_orders(conn, ids, rng):
+    conn.execute("SELECT o.orderID, c.first_name, c.last_name, o.order_date, o.delivery_date, "
+                 "SUM(op.quantity * p.price) FROM orders o JOIN customer c ON c.customerID = o.customerID "
+                 "JOIN order_product op ON op.orderID = o.orderID JOIN product p ON p.productID = op.productID "
+                 "WHERE o.orderID > (SELECT MAX(orderID) - 50 FROM orders) GROUP BY o.orderID "
+                 "ORDER BY o.orderID DESC").fetchall()
+
+
+# Supplier
+
+@handles("GET", "/api/supplier/products")
+def supplier_products(conn, ids, rng):
+    conn.execute("SELECT p.productID, p.name, p.price, p.quantity, AVG(pr.rating) FROM product p "
+                 "LEFT JOIN product_review pr ON pr.productID = p.productID WHERE p.supplierID = ? "
+                 "GROUP BY p.productID", [rng.randint(1, ids.suppliers)]).fetchall()
+
+
+@handles("POST", "/api/supplier/products", writes=["product"])
+def supplier_add_product(conn, ids, rng):
+    return _write(conn, [(
+        "INSERT INTO product SELECT MAX(productID) + 1, ?, ?, ?, ?, ? FROM product",
+        [f"{rng.choice(ids.words)} Listing", rng.randint(1, ids.suppliers), rng.randint(100, 100_000) / 100,
+         rng.randint(1, 500), "Added by the workload replayer."])])
+
+
+@handles("PUT", "/api/supplier/products/:id", writes=["product"])
+def supplier_edit_product(conn, ids, rng):
+    return _write(conn, [("UPDATE product SET price = ROUND(price * ?, 2) WHERE productID = ?",
+                          [rng.uniform(0.9, 1.1), rng.randint(1, ids.products)])])
+
+
+@handles("DELETE", "/api/supplier/products/:id", writes=["product"])
+def supplier_delete_product(conn, ids, rng):
+    # only listings added during the run, which no cart or order refers to
+    return _write(conn, [("DELETE FROM product WHERE productID = (SELECT MAX(productID) FROM product) "
+                          "AND productID > ?", [ids.products])])
+
+
+@handles("GET", "/api/supplier/analytics")
+def supplier_analytics(conn, ids, rng):
+    conn.execute("SELECT strftime('%Y-%m', o.order_date) AS month, SUM(op.quantity), SUM(op.quantity * p.price) "
+                 "FROM product p JOIN order_product op ON op.productID = p.productID "
+                 "JOIN orders o ON o.orderID = op.orderID WHERE p.supplierID = ? GROUP BY month",
+                 [rng.randint(1, ids.suppliers)]).fetchall()
+
+
+@handles("GET", "/api/supplier/inventory")
+def supplier_inventory(conn, ids, rng):
+    conn.execute("SELECT productID, name, quantity FROM product WHERE supplierID = ? ORDER BY quantity",
+                 [rng.randint(1, ids.suppliers)]).fetchall()
+
+
+# Customer
+
+@handles("GET", "/api/customer/products")
+def customer_products(conn, ids, rng):
+    conn.execute(queryfiles.bind(ids.search, {"search": rng.choice(ids.words)}) + " LIMIT 50").fetchall()
+
+
+@handles("GET", "/api/customer/cart")
+def customer_cart(conn, ids, rng):
+    conn.execute("SELECT c.productID, p.name, c.quantity, p.price FROM cart c "
+                 "JOIN product p ON p.productID = c.productID WHERE c.customerID = ?",
+                 [rng.randint(1, ids.customers)]).fetchall()
+
+
+@handles("POST", "/api/customer/cart", writes=["cart"])
+def customer_add_to_cart(conn, ids, rng):
+    product, customer = rng.randint(1, ids.products), rng.randint(1, ids.customers)
+    conn.execute("SELECT quantity FROM product WHERE productID = ?", [product]).fetchone()
+    wait = _write(conn, [("INSERT INTO cart VALUES (?, ?, ?) ON CONFLICT (customerID, productID) "
+                          "DO UPDATE SET quantity = quantity + excluded.quantity",
+                          [customer, product, rng.randint(1, 3)])])
+    ids.shoppers.add(customer)
+    return wait
+
+
+@handles("POST", "/api/customer/orders",
+         writes=["orders", "order_product", "cart", "product", "wallet", "delivery_agent"])
+def customer_place_order(conn, ids, rng):
+    customer = ids.shoppers.take(rng)
+    if customer is None:
+        raise Rejected("no customer with a cart")
+    result = checkout.checkout(conn, [customer])
+    if result.rejected:
+        raise Rejected(result.rejected[customer], result.lock_wait)
+    return result.lock_wait
+
+
+@handles("GET", "/api/customer/orders")
+def customer_orders(conn, ids, rng):
+    conn.execute("SELECT o.orderID, o.order_date, o.delivery_date, SUM(op.quantity * p.price) FROM orders o "
+                 "JOIN order_product op ON op.orderID = o.orderID JOIN product p ON p.productID = op.productID "
+                 "WHERE o.customerID = ? GROUP BY o.orderID ORDER BY o.order_date DESC",
+                 [rng.randint(1, ids.customers)]).fetchall()
+
+
+@handles("GET", "/api/customer/wallet")
+def customer_wallet(conn, ids, rng):
+    conn.execute("SELECT balance, upiID FROM wallet WHERE customerID = ?", [rng.randint(1, ids.customers)]).fetchone()
+
+
+@handles("POST", "/api/customer/reviews", writes=["product_review"])
+def customer_review(conn, ids, rng):
+    return _write(conn, [("INSERT INTO product_review VALUES (?, ?, ?, ?, ?) ON CONFLICT (customerID, productID) "
+                          "DO UPDATE SET rating = excluded.rating, content = excluded.content, "
+                          "review_date = excluded.review_date",
+                          [rng.randint(1, ids.customers), rng.randint(1, ids.products), rng.randint(1, 5),
+                           "Posted by the workload replayer.", date.today().isoformat()])])
+
+
+# Delivery
+
+@handles("GET", "/api/delivery/orders")
+def delivery_orders(conn, ids, rng):
+    conn.execute("SELECT o.orderID, o.order_date, c.first_name, a.street_name, a.city FROM orders o "
+                 "JOIN customer c ON c.customerID = o.customerID JOIN address a ON a.addressID = c.addressID "
+                 "WHERE o.daID = ? AND o.delivery_date IS NULL", [rng.randint(1, ids.agents)]).fetchall()
+
+
+@handles("PUT", "/api/delivery/orders/:id/status", writes=["orders", "delivery_agent"])
+def delivery_status(conn, ids, rng):
+    """Deliver the oldest outstanding order; its agent is free again once it has no other."""
+    wait = checkout.begin(conn)
+    with conn:
+        row = conn.execute("UPDATE orders SET delivery_date = ? WHERE orderID = "
+                           "(SELECT MIN(orderID) FROM orders WHERE delivery_date IS NULL) RETURNING daID",
+                           [date.today().isoformat()]).fetchone()
+        if row is not None:
+            conn.execute("UPDATE delivery_agent SET availability = 1 WHERE daID = ? AND NOT EXISTS "
+                         "(SELECT 1 FROM orders WHERE daID = ? AND delivery_date IS NULL)", [row[0], row[0]])
+    return wait
+
+
+@handles("GET", "/api/delivery/performance")
+def delivery_performance(conn, ids, rng):
+    agent = rng.randint(1, ids.agents)
+    conn.execute("SELECT COUNT(*), AVG(julianday(delivery_date) - julianday(order_date)) FROM orders "
+                 "WHERE daID = ? AND delivery_date IS NOT NULL", [agent]).fetchone()
+    conn.execute("SELECT COUNT(*), AVG(rating) FROM da_review WHERE daID = ?", [agent]).fetchone()
+
+
+@handles("PUT", "/api/delivery/availability", writes=["delivery_agent"])
+def delivery_availability(conn, ids, rng):
+    return _write(conn, [("UPDATE delivery_agent SET availability = ? WHERE daID = ?",
+                          [int(rng.random() < 0.8), rng.randint(1, ids.agents)])])
+
+
+def endpoints():
+    """Every endpoint of the API map, with its handler; tables written are added to the tables touched."""
+    found = []
+    for role, _, _, rows in reportcharts.ENDPOINTS:
+        for path, method, tables in rows:
+            handler, writes = HANDLERS[method, path]
+            found.append(Endpoint(role.lower(), method, path, tuple(dict.fromkeys(tables + list(writes))),
+                                  writes, handler))
+    return found
+
+
+def parse_weights(text):
+    """``"a=1,b=2.5"`` -> ``{"a": 1.0, "b": 2.5}``."""
+    pairs = (item.rsplit("=", 1) for item in text.split(",") if item.strip())
+    return {key.strip(): float(value) for key, value in pairs}
+
+
+def mix(roles=ROLES, weights=None):
+    """``(endpoints, probabilities)``; ``weights`` are keyed ``"METHOD /path"``."""
+    weights = weights or {}
+    chosen = [e for e in endpoints() if roles.get(e.role, 0) > 0]
+    unknown = set(weights) - {f"{e.method} {e.path}" for e in chosen}
+    if unknown:
+        raise ValueError(f"unknown endpoints in the mix: {', '.join(sorted(unknown))}")
+    per_endpoint = np.array([weights.get(f"{e.method} {e.path}", 1.0) for e in chosen])
+    role_totals = {role: sum(w for e, w in zip(chosen, per_endpoint) if e.role == role) for role in roles}
+    p = np.array([roles[e.role] * w / role_totals[e.role] if role_totals[e.role] else 0.0
+                  for e, w in zip(chosen, per_endpoint)])
+    return chosen, p / p.sum()
+
+
+class Replayer:
+    def __init__(self, db_path, concurrency=8):
+        self.db_path = str(db_path)
+        self.concurrency = concurrency
+        self._local = threading.local()
+        conn = sqlite3.connect(self.db_path)
+        self.ids = Ids(conn)
+        conn.close()
+
+    def _connection(self):
+        if not hasattr(self._local, "conn"):
+            self._local.conn = checkout.connect(self.db_path)
+            queryfiles.register_functions(self._local.conn)
+        return self._local.conn
+
+    def _call(self, endpoint, seed):
+        conn = self._connection()
+        t0 = time.perf_counter()
+        wait, error, rejected = 0.0, None, None
+        try:
+            wait = endpoint.handler(conn, self.ids, random.Random(seed)) or 0.0
+        except Rejected as e:
+            wait, rejected = e.lock_wait, e.reason
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.rollback()
+            error = f"{type(e).__name__}: {e}"
+        return time.perf_counter() - t0, wait, error, rejected
+
+    async def run(self, roles=ROLES, weights=None, rate=200.0, seconds=10.0, seed=42):
+        """Replay the mix for ``seconds``; returns the outcomes and the elapsed time."""
+        chosen, p = mix(roles, weights)
+        rng = np.random.default_rng(seed)
+        arrivals = np.cumsum(rng.exponential(1 / rate, int(rate * seconds * 1.5) + 10))
+        arrivals = arrivals[arrivals < seconds]
+        picks = rng.choice(len(chosen), len(arrivals), p=p)
+        loop = asyncio.get_running_loop()
+
+        async def request(endpoint, due, i):
+            service, wait, error, rejected = await loop.run_in_executor(pool, self._call, endpoint, seed + i)
+            return Outcome(endpoint, loop.time() - due, service, wait, error, rejected)
+
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            start = loop.time()
+            tasks = []
+            for i, (at, pick) in enumerate(zip(arrivals.tolist(), picks.tolist())):
+                delay = start + at - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.ensure_future(request(chosen[pick], start + at, i)))
+            outcomes = await asyncio.gather(*tasks)
+            return outcomes, loop.time() - start
+
+
+def _ms(values, q):
+    return float(1000 * np.percentile(values, q)) if len(values) else 0.0
+
+
+def prepare(data_dir, db_path):
+    """Load the stand-in as ``ebms.checkoutbench`` does, with wallets and stock topped up for the carts."""
+    checkoutbench.prepare(data_dir, db_path)
+    conn = sqlite3.connect(str(db_path))
+    with conn:
+        conn.execute("UPDATE wallet SET balance = ROUND(balance + 2 * t.total, 2) FROM "
+                     "(SELECT c.customerID, SUM(c.quantity * p.price) AS total FROM cart c "
+                     "JOIN product p ON p.productID = c.productID GROUP BY c.customerID) t "
+                     "WHERE wallet.customerID = t.customerID")
+        conn.execute("UPDATE product SET quantity = quantity + t.n FROM "
+                     "(SELECT productID, SUM(quantity) AS n FROM cart GROUP BY productID) t "
+                     "WHERE product.productID = t.productID")
+    conn.close()
+
+
+def summarize(outcomes, elapsed, rate):
+    rejected = [o for o in outcomes if o.rejected is not None]
+    outcomes = [o for o in outcomes if o.rejected is None]
+    ok = [o for o in outcomes if o.error is None]
+    report = {"offered_rate": rate, "requests": len(outcomes) + len(rejected), "rejected": len(rejected),
+              "errors": len(outcomes) - len(ok),
+              "elapsed_s": elapsed, "throughput": len(ok) / elapsed if elapsed else 0.0,
+              "latency_p50_ms": _ms([o.latency for o in ok], 50), "latency_p99_ms": _ms([o.latency for o in ok], 99),
+              "endpoints": [], "tables": []}
+    for e in sorted({o.endpoint for o in outcomes + rejected}, key=lambda e: (e.role, e.path, e.method)):
+        mine = [o for o in outcomes if o.endpoint == e]
+        done = [o for o in mine if o.error is None]
+        turned_down = [o.rejected for o in rejected if o.endpoint == e]
+        report["endpoints"].append({
+            "endpoint": f"{e.method} {e.path}", "role": e.role, "requests": len(mine) + len(turned_down),
+            "rejected": len(turned_down), "rejected_reasons": {r: turned_down.count(r) for r in sorted(set(turned_down))},
+            "errors": len(mine) - len(done),
+            "p50_ms": _ms([o.latency for o in done], 50), "p99_ms": _ms([o.latency for o in done], 99),
+            "service_p99_ms": _ms([o.service for o in done], 99),
+            "first_error": next((o.error for o in mine if o.error), None),
+        })
+    tables = sorted({t for o in outcomes for t in o.endpoint.tables})
+    for table in tables:
+        touching = [o for o in outcomes if table in o.endpoint.tables]
+        writing = [o for o in touching if table in o.endpoint.writes]
+        report["tables"].append({
+            "table": table, "requests": len(touching), "writes": len(writing),
+            "busy_s": sum(o.service for o in touching),
+            "lock_held_s": sum(o.service - o.lock_wait for o in writing),
+            "lock_wait_s": sum(o.lock_wait for o in writing),
+        })
+    report["tables"].sort(key=lambda t: (-t["lock_held_s"] - t["lock_wait_s"], -t["busy_s"]))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--data", help="directory with <table>.csv files (default: generate one)")
+    parser.add_argument("--scale-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rate", type=float, default=200.0, help="requests per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight (threads)")
+    parser.add_argument("--roles", default=",".join(f"{r}={w}" for r, w in ROLES.items()))
+    parser.add_argument("--endpoints", default="", help='weights within a role, e.g. "POST /api/customer/orders=3"')
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = Path(work_dir) / "data"
+            Generator(args.scale_factor, args.seed).write_csv(data_dir)
+        db_path = Path(work_dir) / "workload.db"
+        prepare(data_dir, db_path)
+        replayer = Replayer(db_path, args.concurrency)
+        outcomes, elapsed = asyncio.run(replayer.run(parse_weights(args.roles), parse_weights(args.endpoints),
+                                                     args.rate, args.seconds, args.seed))
+    r = summarize(outcomes, elapsed, args.rate)
+
+    print(f"{r['requests']} requests in {r['elapsed_s']:.1f} s: {r['throughput']:.0f}/s of {args.rate:.0f}/s offered, "
+          f"{r['rejected']} rejected, {r['errors']} errors; p50 {r['latency_p50_ms']:.2f} ms, p99 {r['latency_p99_ms']:.2f} ms")
+    print(f"\n{'endpoint':<42}{'requests':>9}{'rejected':>9}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'service p99':>13}")
+    for e in r["endpoints"]:
+        print(f"{e['endpoint']:<42}{e['requests']:>9}{e['rejected']:>9}{e['errors']:>8}{e['p50_ms']:>10.2f}"
+              f"{e['p99_ms']:>10.2f}{e['service_p99_ms']:>13.2f}")
+    print(f"\n{'table':<16}{'requests':>9}{'writes':>8}{'busy s':>9}{'lock held s':>13}{'lock wait s':>13}")
+    for t in r["tables"]:
+        print(f"{t['table']:<16}{t['requests']:>9}{t['writes']:>8}{t['busy_s']:>9.2f}{t['lock_held_s']:>13.2f}"
+              f"{t['lock_wait_s']:>13.2f}")
+    for e in r["endpoints"]:
+        if e["rejected_reasons"]:
+            print(f"{e['endpoint']} rejected: " + ", ".join(f"{reason} {n}" for reason, n in e["rejected_reasons"].items()))
+        if e["first_error"]:
+            print(f"{e['endpoint']}: {e['first_error']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(r, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -364,15 +364,32 @@ function loadDashboard() {
     }
 }
 
+// Precomputed chart data written by `python -m ebms.dashboard`; the sample data above is the fallback.
+const SNAPSHOT_DIR = 'snapshots';
+
+async function fetchSnapshot(name) {
+    try {
+        const response = await fetch(`${SNAPSHOT_DIR}/${name}`);
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        console.log(`No ${name} snapshot, using sample data`);
+        return null;
+    }
+}
+
 // Admin Dashboard
-function loadAdminDashboard() {
+async function loadAdminDashboard() {
     console.log('Loading admin dashboard');
     
+    const [revenue, categories, roles] = await Promise.all(
+        ['revenue.json', 'categories.json', 'roles.json'].map(fetchSnapshot)
+    );
+    
     // Calculate statistics
-    const totalUsers = Object.values(sampleData.users).flat().length;
-    const totalOrders = sampleData.orders.length;
-    const monthlyRevenue = sampleData.analytics.monthly_revenue[11].revenue; // December
-    const activeSuppliers = sampleData.users.suppliers.length;
+    const totalUsers = roles ? roles.admin.users : Object.values(sampleData.users).flat().length;
+    const totalOrders = roles ? roles.admin.orders : sampleData.orders.length;
+    const monthlyRevenue = roles ? roles.admin.monthly_revenue : sampleData.analytics.monthly_revenue[11].revenue; // December
+    const activeSuppliers = roles ? roles.admin.active_suppliers : sampleData.users.suppliers.length;
     
     // Update stat cards
     const totalUsersEl = document.getElementById('total-users');
@@ -387,25 +404,30 @@ function loadAdminDashboard() {
     
     // Load charts and table
     setTimeout(() => {
-        loadRevenueChart();
-        loadCategoryChart();
+        loadRevenueChart(revenue);
+        loadCategoryChart(categories);
         loadUsersTable();
     }, 100);
 }
 
-function loadRevenueChart() {
+function loadRevenueChart(revenue) {
     const chartCanvas = document.getElementById('revenue-chart');
     if (!chartCanvas) return;
     
+    // The snapshot's daily series is already downsampled to a fixed number of points
+    const labels = revenue ? revenue.daily.date : sampleData.analytics.monthly_revenue.map(item => item.month);
+    const values = revenue ? revenue.daily.revenue : sampleData.analytics.monthly_revenue.map(item => item.revenue);
+    
     try {
         const ctx = chartCanvas.getContext('2d');
         new Chart(ctx, {
             type: 'line',
             data: {
-                labels: sampleData.analytics.monthly_revenue.map(item => item.month),
+                labels: labels,
                 datasets: [{
                     label: 'Revenue',
-                    data: sampleData.analytics.monthly_revenue.map(item => item.revenue),
+                    data: values,
+                    pointRadius: revenue ? 0 : 3,
                     borderColor: '#1FB8CD',
                     backgroundColor: 'rgba(31, 184, 205, 0.1)',
                     fill: true,
@@ -438,19 +460,21 @@ function loadRevenueChart() {
     }
 }
 
-function loadCategoryChart() {
+function loadCategoryChart(categories) {
     const chartCanvas = document.getElementById('category-chart');
     if (!chartCanvas) return;
     
+    const shares = categories ? categories.categories : sampleData.analytics.top_categories;
+    
     try {
         const ctx = chartCanvas.getContext('2d');
         new Chart(ctx, {
             type: 'doughnut',
             data: {
-                labels: sampleData.analytics.top_categories.map(item => item.category),
+                labels: shares.map(item => item.category),
                 datasets: [{
-                    data: sampleData.analytics.top_categories.map(item => item.percentage),
-                    backgroundColor: ['#1FB8CD', '#FFC185', '#B4413C', '#ECEBD5']
+                    data: shares.map(item => item.percentage),
+                    backgroundColor: ['#1FB8CD', '#FFC185', '#B4413C', '#ECEBD5', '#5D878F', '#DB4545']
                 }]
             },
             options: {